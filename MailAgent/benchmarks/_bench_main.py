@@ -0,0 +1,49 @@
+"""
+Child process entry point used by run_benchmark.py.
+
+Runs the app's main() in the current directory and writes wall time, peak
+RSS and file I/O counters to the path in MAILAGENT_BENCH_RESULT.
+"""
+import json
+import os
+import resource
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "backend")
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+
+def _io_counters():
+    """Reads /proc/self/io (Linux only); rchar/wchar include page-cache hits"""
+    try:
+        with open("/proc/self/io", 'r', encoding='utf-8') as file:
+            return {name: int(value) for name, value in (line.split(": ") for line in file)}
+    except OSError:
+        return None
+
+
+def run():
+    started = time.perf_counter()
+    error = None
+    try:
+        import main as app
+        app.main()
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        with open(os.environ["MAILAGENT_BENCH_RESULT"], 'w', encoding='utf-8') as file:
+            json.dump({
+                "wall_seconds": time.perf_counter() - started,
+                "cpu_user_seconds": usage.ru_utime,
+                "cpu_system_seconds": usage.ru_stime,
+                # ru_maxrss is in kilobytes on Linux and bytes on macOS
+                "peak_rss_mb": usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+                "io": _io_counters(),
+                "error": error
+            }, file)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,224 @@
+"""
+Fake OpenAI chat completions server for benchmarks.
+
+Answers /v1/chat/completions for every MailAgent call site (extraction,
+planning, reply drafting and the function-calling agent) with canned but
+well-formed responses, including usage and x-ratelimit-* headers. Latency,
+jitter and the share of 429 / 500 answers are configurable. Point the app
+at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python benchmarks/fake_openai.py --port 8090 --latency 0.4 --jitter 0.2 --rate-limit-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from generate_inbox import INTENTS
+
+SUBJECT_INTENTS = {subject: intent for intent, _, subjects, _ in INTENTS for subject in subjects}
+FIELD_RE = re.compile(r"^(From|Subject|Date): (.*)$", re.MULTILINE)
+
+
+def _completion(model, message, prompt_chars, finish_reason="stop"):
+    prompt_tokens = prompt_chars // 4 + 8
+    completion_tokens = len(json.dumps(message)) // 4 + 1
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def _tool_call(name, arguments):
+    return {
+        "id": f"call_{uuid.uuid4().hex[:24]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)}
+    }
+
+
+def _email_fields(messages):
+    for message in messages:
+        if message.get("role") == "user":
+            return dict(FIELD_RE.findall(message.get("content") or ""))
+    return {}
+
+
+def respond(body):
+    """Builds a plausible completion for one request body"""
+    messages = body.get("messages", [])
+    model = body.get("model", "gpt-4o")
+    prompt_chars = sum(len(str(message.get("content") or "")) for message in messages)
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    fields = _email_fields(messages)
+    intent = SUBJECT_INTENTS.get(fields.get("Subject", ""), "General Inquiry")
+
+    if body.get("tools"):
+        if any(message.get("role") == "tool" for message in messages):
+            reply = f"Thank you for your message regarding '{intent}'. We will take care of it."
+            message = {"role": "assistant", "content": None, "tool_calls": [_tool_call("send_email", {
+                "to": fields.get("From", ""),
+                "subject": "Re: Your Inquiry",
+                "html_content": f"<p>{reply}</p>",
+                "text_content": reply
+            })]}
+        else:
+            message = {"role": "assistant", "content": None, "tool_calls": [
+                _tool_call("record_extraction", {"email": fields.get("From", ""), "date": fields.get("Date", ""), "intent": intent}),
+                _tool_call("read_knowledgebase", {"keyword": intent, "top_k": 3}),
+                _tool_call("get_available_slots", {"after_date": fields.get("Date", ""), "count": 3}),
+            ]}
+        return _completion(model, message, prompt_chars, "tool_calls")
+
+    if "returns a JSON object" in system:
+        content = json.dumps({"email": fields.get("From", ""), "date": fields.get("Date", ""), "intent": intent})
+    elif "execution plan" in system:
+        content = json.dumps({"steps": [
+            {"id": "kb", "tool": "read_knowledgebase", "arguments": {"keyword": "$query", "top_k": 3}, "depends_on": []},
+            {"id": "slots", "tool": "get_available_slots", "arguments": {"after_date": "$email.date", "count": 3},
+             "depends_on": []},
+            {"id": "day", "tool": "get_appointments", "arguments": {"date": "$steps.slots.appointments.0.date"},
+             "depends_on": ["slots"]},
+        ]})
+    else:
+        content = (
+            "Dear customer,\n\nThank you for reaching out. We have checked our schedule and "
+            "company information and are happy to help. Please reply to confirm.\n\nBest regards"
+        )
+    return _completion(model, {"role": "assistant", "content": content}, prompt_chars)
+
+
+class FakeOpenAI:
+    """Threaded fake of the chat completions endpoint"""
+
+    def __init__(self, host="127.0.0.1", port=8090, latency=0.0, jitter=0.0, rate_limit_rate=0.0,
+                 error_rate=0.0, rpm_limit=10000, tpm_limit=2000000):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.stats = {"calls": 0, "rate_limited": 0, "errors": 0, "tokens": 0}
+        self._lock = threading.Lock()
+        self._window = (0, 0, 0)  # minute, requests, tokens
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _ratelimit_headers(self, tokens):
+        minute = int(time.time() // 60)
+        with self._lock:
+            window_minute, requests, used = self._window
+            if window_minute != minute:
+                requests, used = 0, 0
+            self._window = (minute, requests + 1, used + tokens)
+        reset = f"{60 - time.time() % 60:.0f}s"
+        return {
+            "x-ratelimit-limit-requests": str(self.rpm_limit),
+            "x-ratelimit-remaining-requests": str(max(0, self.rpm_limit - requests - 1)),
+            "x-ratelimit-reset-requests": reset,
+            "x-ratelimit-limit-tokens": str(self.tpm_limit),
+            "x-ratelimit-remaining-tokens": str(max(0, self.tpm_limit - used - tokens)),
+            "x-ratelimit-reset-tokens": reset,
+        }
+
+    def handle(self, body):
+        """Returns (status, headers, payload) for one request"""
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        roll = random.random()
+        with self._lock:
+            self.stats["calls"] += 1
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 429, {"retry-after-ms": "500"}, {"error": {
+                    "message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"
+                }}
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return 500, {}, {"error": {"message": "Internal error", "type": "server_error"}}
+        payload = respond(body)
+        tokens = payload["usage"]["total_tokens"]
+        with self._lock:
+            self.stats["tokens"] += tokens
+        return 200, self._ratelimit_headers(tokens), payload
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    status, headers, payload = 404, {}, {"error": {"message": "Not found"}}
+                else:
+                    status, headers, payload = fake.handle(json.loads(raw or b"{}"))
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.host, args.port, args.latency, args.jitter, args.rate_limit_rate, args.error_rate)
+    print(f"Fake OpenAI listening on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Fake OpenAI stats: {fake.stats}")
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
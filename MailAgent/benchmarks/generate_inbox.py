@@ -0,0 +1,135 @@
+"""
+Synthetic inbox generator for benchmarks.
+
+Writes files in the customer_req/incoming_emails.json shape with a weighted
+mix of intents, plus the schedule and knowledge base the tools read, so a
+benchmark run exercises every stage of the pipeline.
+
+    python benchmarks/generate_inbox.py --size 10000 --out /tmp/inbox.json
+"""
+import argparse
+import json
+import random
+from datetime import date, timedelta
+
+# (intent, weight, subjects, bodies); weights roughly follow a support inbox
+INTENTS = [
+    ("Schedule Appointment", 40, [
+        "Inquiry about scheduling a new appointment",
+        "Booking request",
+        "Can I come in next week?",
+    ], [
+        "Hello, I'd like to schedule a new appointment next week. Please let me know which dates are available.",
+        "Hi, do you have any free slots on {day}? Mornings work best for me.",
+        "I need to book a consultation as soon as possible. What times do you have?",
+    ]),
+    ("Reschedule Appointment", 15, [
+        "Need to move my appointment",
+        "Reschedule request",
+    ], [
+        "Something came up and I can't make it on {day}. Could we move my appointment to later that week?",
+        "Please reschedule my appointment to any afternoon next week.",
+    ]),
+    ("Cancel Appointment", 10, [
+        "Cancel my appointment",
+        "Cancellation",
+    ], [
+        "Please cancel my appointment on {day}. Thanks.",
+        "I won't be able to attend, please cancel.",
+    ]),
+    ("Pricing Question", 20, [
+        "Question about prices",
+        "How much does it cost?",
+        "Quote request",
+    ], [
+        "How much does a standard consultation cost? Do you offer any discounts?",
+        "Could you send me your current price list for appointments?",
+    ]),
+    ("General Inquiry", 10, [
+        "Opening hours",
+        "Quick question",
+    ], [
+        "What are your opening hours on weekends?",
+        "Where is your office located and is there parking nearby?",
+    ]),
+    ("Complaint", 5, [
+        "Unhappy with my last visit",
+        "Complaint",
+    ], [
+        "I waited over an hour at my last appointment on {day}. This is not acceptable.",
+        "I was charged twice for the same appointment. Please fix this.",
+    ]),
+]
+
+FIRST_NAMES = ["anna", "ben", "chloe", "david", "emma", "felix", "grace", "henry", "ivy", "jack", "kate", "liam"]
+DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "example.org", "proton.me"]
+
+
+def generate_emails(count, seed=42, start_id=1, start_date=date(2024, 12, 1)):
+    """Returns `count` emails with sequential ids and a weighted intent mix"""
+    rng = random.Random(seed)
+    weights = [weight for _, weight, _, _ in INTENTS]
+    emails = []
+    for offset in range(count):
+        _, _, subjects, bodies = rng.choices(INTENTS, weights=weights)[0]
+        day = start_date + timedelta(days=rng.randrange(30))
+        sender = f"{rng.choice(FIRST_NAMES)}{rng.randrange(1000)}@{rng.choice(DOMAINS)}"
+        emails.append({
+            "id": start_id + offset,
+            "from": sender,
+            "date": (start_date + timedelta(days=offset * 30 // max(count, 1))).isoformat(),
+            "subject": rng.choice(subjects),
+            "body": rng.choice(bodies).format(day=day.isoformat())
+        })
+    return emails
+
+
+def generate_schedule(days=60, seed=42, start_date=date(2024, 12, 1)):
+    rng = random.Random(seed)
+    appointments = []
+    for offset in range(days):
+        day = (start_date + timedelta(days=offset)).isoformat()
+        for hour in range(9, 17):
+            appointments.append({
+                "date": day,
+                "time": f"{hour:02d}:00",
+                "status": "booked" if rng.random() < 0.6 else "available"
+            })
+    return {"appointments": appointments}
+
+
+KNOWLEDGEBASE = """# Company Information
+
+## Opening Hours
+We are open Monday to Friday from 9:00 to 17:00 and on Saturdays from 10:00 to 14:00.
+
+## Pricing
+A standard consultation costs 80 EUR. Follow-up appointments cost 50 EUR.
+Students and seniors receive a 15% discount.
+
+## Appointments
+Appointments can be scheduled, rescheduled or cancelled by email up to 24 hours in advance.
+Cancellations with less notice are charged 50% of the appointment price.
+
+## Location
+Our office is at Main Street 12. Free parking is available behind the building.
+
+## Complaints
+We take every complaint seriously and respond within two business days.
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic MailAgent inbox")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="incoming_emails.json")
+    args = parser.parse_args()
+
+    with open(args.out, 'w', encoding='utf-8') as file:
+        json.dump({"emails": generate_emails(args.size, args.seed), "last_processed_id": 0}, file)
+    print(f"Wrote {args.size} emails to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
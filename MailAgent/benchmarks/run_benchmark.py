@@ -0,0 +1,220 @@
+"""
+Throughput benchmark for MailAgent.
+
+Builds a throwaway working directory with a synthetic inbox, schedule and
+knowledge base, starts the fake OpenAI and Mailgun servers in this process
+and runs the app's main() in a child process against them. The result
+(emails/sec, per-stage latency percentiles, LLM and Mailgun call counts,
+peak RSS and file I/O) is saved as JSON under benchmarks/results/, and can
+be compared against an earlier result with --baseline.
+
+    python benchmarks/run_benchmark.py --size 1000 --workers 8 --openai-latency 0.3 --label baseline
+    python benchmarks/run_benchmark.py --size 1000 --workers 8 --openai-latency 0.3 \\
+        --baseline benchmarks/results/<file>.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "src", "backend"))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_openai import FakeOpenAI  # noqa: E402
+from generate_inbox import KNOWLEDGEBASE, generate_emails, generate_schedule  # noqa: E402
+from mailgun_stub import MailgunStub  # noqa: E402
+
+# Histograms reported per run, in pipeline order
+REPORTED_HISTOGRAMS = ("email_seconds", "stage_seconds", "tool_seconds", "llm_call_seconds")
+# Numbers compared against a baseline; higher is better only for throughput
+COMPARED = (
+    ("throughput", "emails_per_second"),
+    ("resources", "wall_seconds"),
+    ("resources", "peak_rss_mb"),
+    ("resources", "write_mb"),
+)
+
+
+def prepare_workdir(workdir, size, seed):
+    os.makedirs(os.path.join(workdir, "customer_req"))
+    os.makedirs(os.path.join(workdir, "src", "data"))
+    os.makedirs(os.path.join(workdir, "docs"))
+    with open(os.path.join(workdir, "customer_req", "incoming_emails.json"), 'w', encoding='utf-8') as file:
+        json.dump({"emails": generate_emails(size, seed), "last_processed_id": 0}, file)
+    with open(os.path.join(workdir, "src", "data", "schedule.json"), 'w', encoding='utf-8') as file:
+        json.dump(generate_schedule(seed=seed), file)
+    with open(os.path.join(workdir, "docs", "company_secrets.md"), 'w', encoding='utf-8') as file:
+        file.write(KNOWLEDGEBASE)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _last_metrics(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            lines = [line for line in file if line.strip()]
+        return json.loads(lines[-1]) if lines else None
+    except FileNotFoundError:
+        return None
+
+
+def _stage_table(metrics):
+    table = {}
+    for name in REPORTED_HISTOGRAMS:
+        for entry in metrics["histograms"].get(name, []):
+            labels = ",".join(f"{k}={v}" for k, v in entry["labels"].items())
+            key = f"{name}[{labels}]" if labels else name
+            table[key] = {k: entry[k] for k in ("count", "sum", "p50", "p95", "p99", "max")}
+    return table
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="mailagent_bench_")
+    prepare_workdir(workdir, args.size, args.seed)
+
+    fake_openai = FakeOpenAI(
+        port=0, latency=args.openai_latency, jitter=args.openai_jitter,
+        rate_limit_rate=args.openai_429_rate, error_rate=args.openai_error_rate
+    ).start()
+    mailgun = MailgunStub(
+        port=0, latency=args.mailgun_latency, error_rate=args.mailgun_error_rate
+    ).start()
+
+    result_path = os.path.join(workdir, "bench_result.json")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": fake_openai.url,
+        "MAILGUN_API_BASE": mailgun.url,
+        "MAILGUN_API_KEY": "bench",
+        "MAILGUN_DOMAIN": "bench.example.com",
+        "MAILAGENT_MODE": args.mode,
+        "MAILAGENT_MAX_WORKERS": str(args.workers),
+        "MAILAGENT_BATCH_BACKEND": "local",
+        "MAILAGENT_BATCH_POLL": "0",
+        "MAILAGENT_LOG_LEVEL": args.log_level,
+        "MAILAGENT_METRICS_FORMAT": "jsonl",
+        "MAILAGENT_METRICS_PATH": os.path.join(workdir, "logs", "metrics.jsonl"),
+        "MAILAGENT_BENCH_RESULT": result_path,
+    }
+    # Client-side quotas would otherwise cap throughput well below the fake server
+    env.setdefault("MAILAGENT_OPENAI_RPM", "100000")
+    env.setdefault("MAILAGENT_OPENAI_TPM", "100000000")
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+
+    print(f"Running {args.size} emails in {args.mode} mode with {args.workers} workers (workdir {workdir})")
+    started = time.perf_counter()
+    with open(os.path.join(workdir, "bench_output.log"), 'w', encoding='utf-8') as output:
+        process = subprocess.run(
+            [sys.executable, os.path.join(BENCH_DIR, "_bench_main.py")],
+            cwd=workdir, env=env, stdout=output, stderr=subprocess.STDOUT
+        )
+    elapsed = time.perf_counter() - started
+    fake_openai.stop()
+    mailgun.stop()
+
+    with open(result_path, 'r', encoding='utf-8') as file:
+        child = json.load(file)
+    metrics = _last_metrics(env["MAILAGENT_METRICS_PATH"]) or {"histograms": {}, "counters": {}, "summary": None}
+    summary = metrics.get("summary") or {}
+    succeeded = summary.get("succeeded", 0)
+    io = child.get("io") or {}
+
+    result = {
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("baseline", "keep_workdir")},
+        "exit_code": process.returncode,
+        "error": child.get("error"),
+        "throughput": {
+            "emails": args.size,
+            "succeeded": succeeded,
+            "failed": summary.get("failed", 0),
+            "emails_per_second": round(succeeded / child["wall_seconds"], 3) if child["wall_seconds"] else None,
+        },
+        "resources": {
+            "wall_seconds": round(child["wall_seconds"], 3),
+            "process_seconds": round(elapsed, 3),
+            "cpu_user_seconds": round(child["cpu_user_seconds"], 3),
+            "cpu_system_seconds": round(child["cpu_system_seconds"], 3),
+            "peak_rss_mb": round(child["peak_rss_mb"], 1),
+            "read_mb": round(io.get("rchar", 0) / 1e6, 3),
+            "write_mb": round(io.get("wchar", 0) / 1e6, 3),
+            "disk_write_mb": round(io.get("write_bytes", 0) / 1e6, 3),
+        },
+        "stages": _stage_table(metrics),
+        "cache_hit_rates": metrics.get("cache_hit_rates"),
+        "servers": {"openai": fake_openai.stats, "mailgun": mailgun.stats},
+    }
+
+    if args.keep_workdir:
+        print(f"Kept workdir {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def compare(result, baseline):
+    print(f"\nCompared with {baseline.get('label') or 'baseline'} ({baseline.get('git_commit')}):")
+    for section, key in COMPARED:
+        new, old = result[section].get(key), baseline.get(section, {}).get(key)
+        if new is None or not old:
+            continue
+        print(f"  {key:<20} {old:>12} -> {new:<12} ({(new - old) / old * 100:+.1f}%)")
+    for stage, entry in result["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if old and old.get("p95"):
+            print(f"  {stage + ' p95':<40} {old['p95']:.4f} -> {entry['p95']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MailAgent throughput benchmark")
+    parser.add_argument("--size", type=int, default=1000, help="Number of synthetic emails (e.g. 1000, 10000, 100000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", default="pipeline", choices=("pipeline", "agent", "bulk"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--openai-latency", type=float, default=0.2)
+    parser.add_argument("--openai-jitter", type=float, default=0.1)
+    parser.add_argument("--openai-429-rate", type=float, default=0.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--mailgun-latency", type=float, default=0.05)
+    parser.add_argument("--mailgun-error-rate", type=float, default=0.0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--env", action="append", default=[], help="Extra KEY=VALUE for the app process")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--results-dir", default=os.path.join(BENCH_DIR, "results"))
+    parser.add_argument("--baseline", help="Earlier result JSON to compare against")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    result = run(args)
+    os.makedirs(args.results_dir, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d_%H%M%S')}_{args.mode}_{args.size}{'_' + args.label if args.label else ''}.json"
+    path = os.path.join(args.results_dir, name)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=2)
+
+    print(json.dumps({k: result[k] for k in ("throughput", "resources", "error")}, indent=2))
+    print(f"Saved result to {path}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            compare(result, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import json
+import logging
+
+from engine import EmailCancelled
+from llm import chat_completion
+from metrics import span
+from prompts import MODEL, email_messages
+from prompt_builder import compact_json
+from plan_executor import LOOKUP_TOOLS
+from tools import send_email
+from tools_schema import (
+    get_appointments_schema,
+    get_available_slots_schema,
+    read_knowledgebase_schema,
+    record_extraction_schema,
+    send_email_schema,
+)
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are a customer support agent answering one customer email.\n"
+    "1. Call 'record_extraction' with the sender's email address, the date (YYYY-MM-DD) and the customer's intent.\n"
+    "2. In the same turn, call any lookup tools you need: 'get_appointments' or 'get_available_slots' "
+    "for scheduling questions, 'read_knowledgebase' with a focused keyword for company information.\n"
+    "3. Once you have what you need, call 'send_email' exactly once with a concise, friendly reply "
+    "to the customer (both HTML and plain text).\n"
+    "Call independent tools in parallel to finish in as few turns as possible."
+)
+
+OPENAI_TOOLS = [
+    {"type": "function", "function": schema}
+    for schema in (
+        record_extraction_schema,
+        get_appointments_schema,
+        get_available_slots_schema,
+        read_knowledgebase_schema,
+        send_email_schema,
+    )
+]
+
+
+class AgentError(Exception):
+    """Raised when the agent loop cannot produce a reply"""
+
+
+def _tool_message(call_id, result):
+    content = result if isinstance(result, str) else compact_json(result)
+    return {"role": "tool", "tool_call_id": call_id, "content": content}
+
+
+def run_agent(email, save_extraction=None, cancel_event=None, max_steps=4, model=MODEL, send=send_email):
+    """
+    Handles one email with a native function-calling loop.
+
+    Extraction, lookups and the reply are all tool calls, so a typical email
+    takes two completions: one that records the intent and runs lookups in
+    parallel, and one that sends the reply. The reply always goes to the
+    original sender, whatever address the model supplies, and is delivered
+    through `send` (send_email by default). Returns a dict with the
+    extracted data, the reply text and the number of model calls.
+    """
+    messages = email_messages("agent", SYSTEM_PROMPT, email, model)
+    extracted = None
+    recipient = email.get("from", "customer@example.com")
+
+    for step in range(1, max_steps + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise EmailCancelled(f"Agent for email ID {email.get('id')} was cancelled")
+
+        response = chat_completion(
+            "agent",
+            model=model,
+            messages=messages,
+            tools=OPENAI_TOOLS,
+            parallel_tool_calls=True
+        )
+        message = response.choices[0].message
+        messages.append(message.model_dump(exclude_none=True))
+
+        if not message.tool_calls:
+            # The model answered in prose instead of calling send_email
+            if not message.content:
+                raise AgentError(f"Model returned neither tool calls nor text at step {step}")
+            reply = message.content
+            send({
+                "to": recipient,
+                "subject": "Re: Your Inquiry",
+                "html_content": f"<p>{reply}</p>",
+                "text_content": reply
+            })
+            return {"extracted": extracted, "reply": reply, "steps": step}
+
+        reply = None
+        for call in message.tool_calls:
+            name = call.function.name
+            try:
+                arguments = json.loads(call.function.arguments or "{}")
+            except json.JSONDecodeError as e:
+                messages.append(_tool_message(call.id, {"error": f"Invalid JSON arguments: {str(e)}"}))
+                continue
+            logger.info("Agent step %d: calling %s", step, name)
+
+            if name == "record_extraction":
+                extracted = arguments
+                if save_extraction is not None:
+                    save_extraction(arguments)
+                messages.append(_tool_message(call.id, {"status": "recorded"}))
+            elif name == "send_email":
+                if reply is not None:
+                    messages.append(_tool_message(call.id, {"error": "Reply already sent"}))
+                    continue
+                if cancel_event is not None and cancel_event.is_set():
+                    raise EmailCancelled(f"Agent for email ID {email.get('id')} was cancelled")
+                reply = arguments.get("text_content", "")
+                result = send({**arguments, "to": recipient})
+                messages.append(_tool_message(call.id, result))
+            elif name in LOOKUP_TOOLS:
+                try:
+                    with span("tool", tool=name):
+                        result = LOOKUP_TOOLS[name][1](arguments)
+                except Exception as e:
+                    logger.error("Tool %s failed: %s", name, e)
+                    result = {"error": str(e)}
+                messages.append(_tool_message(call.id, result))
+            else:
+                messages.append(_tool_message(call.id, {"error": f"Unknown tool: {name}"}))
+
+        if reply is not None:
+            return {"extracted": extracted, "reply": reply, "steps": step}
+
+    raise AgentError(f"No reply sent for email ID {email.get('id')} after {max_steps} steps")
@@ -0,0 +1,93 @@
+import bisect
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AppointmentIndex:
+    """
+    In-memory, date-keyed view of a schedule.json file.
+
+    The file is parsed once and re-parsed only when its mtime or size changes,
+    so repeated lookups cost a single os.stat(). Appointments for each date are
+    kept sorted by time, and the dates themselves are kept sorted for range and
+    "next available" queries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        # (appointments by date, sorted dates) swapped in as one object so
+        # readers never see a half-built index
+        self._snapshot = ({}, [])
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as file:
+            schedule_data = json.load(file)
+
+        by_date = {}
+        for appt in schedule_data.get("appointments", []):
+            by_date.setdefault(appt.get("date"), []).append(appt)
+        for appointments in by_date.values():
+            appointments.sort(key=lambda appt: appt.get("time", ""))
+
+        dates = sorted(date for date in by_date if date)
+        self._snapshot = (by_date, dates)
+        logger.debug("Indexed %d schedule dates from %s", len(dates), self.path)
+
+    def _refresh(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._load()
+                    self._signature = signature
+        return self._snapshot
+
+    def invalidate(self):
+        """Forces a reload on the next lookup"""
+        self._signature = None
+
+    def for_date(self, date_str):
+        """Returns the appointments for one date, sorted by time"""
+        by_date, _ = self._refresh()
+        return list(by_date.get(date_str, []))
+
+    def between(self, start_date, end_date):
+        """Returns {date: appointments} for start_date <= date <= end_date"""
+        by_date, dates = self._refresh()
+        start = bisect.bisect_left(dates, start_date)
+        end = bisect.bisect_right(dates, end_date)
+        return {date: list(by_date[date]) for date in dates[start:end]}
+
+    def next_available(self, after_date, after_time="", count=5):
+        """Returns up to `count` available slots at or after the given date and time"""
+        by_date, dates = self._refresh()
+        slots = []
+        for date in dates[bisect.bisect_left(dates, after_date):]:
+            for appt in by_date[date]:
+                if date == after_date and appt.get("time", "") < after_time:
+                    continue
+                if appt.get("status") == "available":
+                    slots.append(appt)
+                    if len(slots) >= count:
+                        return slots
+        return slots
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path):
+    """Returns the shared index for a schedule file"""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = AppointmentIndex(path)
+        return _indexes[key]
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from engine import email_ids
+from prompts import MODEL, PLAN_RESPONSE_FORMAT, extraction_messages, finalize_messages, plan_messages
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("extract", "plan", "finalize")
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_FAILURES = ("failed", "expired", "cancelled")
+
+
+def _write_jsonl(path, rows):
+    with open(path, 'w', encoding='utf-8') as file:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def _read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class OpenAIBatchBackend:
+    """Submits request files to the OpenAI Batch API"""
+
+    def __init__(self, client, completion_window="24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, input_path):
+        with open(input_path, 'rb') as file:
+            uploaded = self.client.files.create(file=file, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        return self.client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id, output_path):
+        batch = self.client.batches.retrieve(batch_id)
+        with open(output_path, 'w', encoding='utf-8') as file:
+            # Failed requests land in a separate error file with the same line format
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    file.write(self.client.files.content(file_id).text)
+
+
+class LocalBatchBackend:
+    """
+    Local stand-in for the Batch API.
+
+    Every request line is answered synchronously by `responder(body)`, which
+    returns a chat completion as a dict, and the results are written in the
+    Batch API output format. Useful for tests and small replays.
+    """
+
+    def __init__(self, responder, directory):
+        self.responder = responder
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _output_path(self, batch_id):
+        return os.path.join(self.directory, f"{batch_id}_output.jsonl")
+
+    def submit(self, input_path):
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        rows = []
+        for request in _read_jsonl(input_path):
+            row = {"id": f"req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+            try:
+                row["response"] = {"status_code": 200, "body": self.responder(request["body"])}
+                row["error"] = None
+            except Exception as e:
+                row["response"] = None
+                row["error"] = {"code": type(e).__name__, "message": str(e)}
+            rows.append(row)
+        _write_jsonl(self._output_path(batch_id), rows)
+        return batch_id
+
+    def status(self, batch_id):
+        return "completed" if os.path.exists(self._output_path(batch_id)) else "failed"
+
+    def download(self, batch_id, output_path):
+        with open(self._output_path(batch_id), 'r', encoding='utf-8') as src, \
+                open(output_path, 'w', encoding='utf-8') as dst:
+            dst.write(src.read())
+
+
+class BulkJob:
+    """
+    Resumable three-stage bulk run over many emails.
+
+    Extraction, planning and reply drafting are each submitted as batch
+    files; between planning and drafting the plan tools run locally. Plans
+    are requested once per distinct intent. All progress lives in
+    `workdir/state.json` (plus an append-only sent log), so an interrupted
+    job resumes where it stopped and never sends a reply twice.
+    """
+
+    def __init__(self, workdir, backend, poll_interval=30.0, max_requests_per_batch=50000):
+        self.workdir = workdir
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.max_requests_per_batch = max_requests_per_batch
+        self.state_path = os.path.join(workdir, "state.json")
+        self.sent_log_path = os.path.join(workdir, "sent.log")
+        os.makedirs(workdir, exist_ok=True)
+        self.state = self._load_state()
+        if self.state is not None and self.state["stage"] == "done":
+            # Keep the finished job for inspection and start a fresh one
+            archived = f"{workdir}-{time.strftime('%Y%m%d_%H%M%S')}"
+            os.replace(workdir, archived)
+            os.makedirs(workdir)
+            logger.info("Archived finished bulk job to %s", archived)
+            self.state = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+            logger.info("Resuming bulk job in %s at stage '%s'", self.workdir, state['stage'])
+            return state
+        except FileNotFoundError:
+            return None
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file)
+        os.replace(tmp_path, self.state_path)
+
+    def _sent_ids(self):
+        try:
+            with open(self.sent_log_path, 'r', encoding='utf-8') as file:
+                return {line.strip() for line in file if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def _start(self, emails):
+        self.state = {
+            "stage": STAGES[0],
+            "emails": {f"email-{email['id']}": email for email in emails},
+            "batches": {},
+            "results": {stage: {} for stage in STAGES},
+            "tool_results": {},
+            "errors": {}
+        }
+        self._save_state()
+
+    def _requests_for(self, stage):
+        state = self.state
+        pending = [cid for cid in state["emails"] if cid not in state["errors"]]
+        if stage == "extract":
+            return [
+                {"custom_id": cid, "body": {"model": MODEL, "messages": extraction_messages(state["emails"][cid])}}
+                for cid in pending
+            ]
+        if stage == "plan":
+            intents = {state["results"]["extract"][cid].get("intent", "") for cid in pending}
+            return [
+                {
+                    "custom_id": self._plan_id(intent),
+                    "body": {"model": MODEL, "messages": plan_messages(intent), "response_format": PLAN_RESPONSE_FORMAT}
+                }
+                for intent in sorted(intents)
+            ]
+        return [
+            {
+                "custom_id": cid,
+                "body": {
+                    "model": MODEL,
+                    "messages": finalize_messages(
+                        state["results"]["extract"][cid].get("intent", ""),
+                        state["tool_results"][cid]
+                    )
+                }
+            }
+            for cid in pending
+        ]
+
+    @staticmethod
+    def _plan_id(intent):
+        return "plan-" + hashlib.sha1(intent.encode("utf-8")).hexdigest()[:16]
+
+    def _submit_stage(self, stage):
+        requests = self._requests_for(stage)
+        batch_ids = self.state["batches"].get(stage, [])
+        for part, start in enumerate(range(0, len(requests), self.max_requests_per_batch)):
+            if part < len(batch_ids):
+                # Already submitted before an interruption
+                continue
+            input_path = os.path.join(self.workdir, f"{stage}_{part}_input.jsonl")
+            _write_jsonl(input_path, [
+                {"custom_id": r["custom_id"], "method": "POST", "url": BATCH_ENDPOINT, "body": r["body"]}
+                for r in requests[start:start + self.max_requests_per_batch]
+            ])
+            batch_ids.append(self.backend.submit(input_path))
+            # Persist each id as soon as it exists so a crash never resubmits it
+            self.state["batches"][stage] = batch_ids
+            self._save_state()
+        logger.info("Submitted %d '%s' requests in %d batches", len(requests), stage, len(batch_ids))
+
+    def _collect_stage(self, stage):
+        results = self.state["results"][stage]
+        for part, batch_id in enumerate(self.state["batches"].get(stage, [])):
+            while True:
+                status = self.backend.status(batch_id)
+                if status == "completed":
+                    break
+                if status in TERMINAL_FAILURES:
+                    raise RuntimeError(f"Batch {batch_id} for stage '{stage}' ended with status '{status}'")
+                logger.info("Batch %s is %s, waiting %ss", batch_id, status, self.poll_interval)
+                time.sleep(self.poll_interval)
+
+            output_path = os.path.join(self.workdir, f"{stage}_{part}_output.jsonl")
+            self.backend.download(batch_id, output_path)
+            for row in _read_jsonl(output_path):
+                response = row.get("response") or {}
+                if row.get("error") or response.get("status_code") != 200:
+                    results[row["custom_id"]] = {"error": row.get("error") or response.get("body")}
+                    continue
+                results[row["custom_id"]] = {"content": response["body"]["choices"][0]["message"]["content"]}
+
+    def _apply_stage(self, stage, execute_plan, save_extraction):
+        """Turns raw batch results for a stage into per-email results or errors"""
+        state = self.state
+        raw = state["results"][stage]
+        for cid, email in state["emails"].items():
+            if cid in state["errors"]:
+                continue
+            key = self._plan_id(state["results"]["extract"][cid].get("intent", "")) if stage == "plan" else cid
+            result = raw.get(key)
+            if result is None or "error" in result:
+                state["errors"][cid] = f"{stage} failed: {result['error'] if result else 'missing result'}"
+                continue
+            try:
+                if stage == "extract":
+                    extracted = json.loads(result["content"])
+                    raw[cid] = extracted
+                    save_extraction(extracted, email)
+                elif stage == "plan":
+                    intent = state["results"]["extract"][cid].get("intent", "")
+                    query = f"{intent} {email.get('subject', '')}"
+                    state["tool_results"][cid] = execute_plan(result["content"], query, email, intent)
+            except Exception as e:
+                state["errors"][cid] = f"{stage} failed: {str(e)}"
+
+    def track(self, emails, watermark):
+        """
+        Registers on `watermark` the ids the next run() will settle and
+        returns {unit id: member ids} for them. A resumed job only runs the
+        emails saved when it started; newer emails are left for the next
+        run, so the watermark is then not marked exhausted and the
+        checkpoint stops below them.
+        """
+        emails = list(emails)
+        deferred = []
+        if self.state is not None:
+            saved = {email["id"] for email in self.state["emails"].values()}
+            deferred = [email["id"] for email in emails if email["id"] not in saved]
+            if deferred:
+                logger.info("Resuming bulk job; %d newer emails wait for the next run", len(deferred))
+            emails = list(self.state["emails"].values())
+        units = {email["id"]: email_ids(email) for email in emails}
+        for ids in units.values():
+            for email_id in ids:
+                watermark.track(email_id)
+        if not deferred:
+            watermark.mark_exhausted()
+        return units
+
+    def run(self, emails, execute_plan, save_extraction, send):
+        """
+        Runs (or resumes) the job. Returns {email_id: None on success or an
+        error message}. `send(email, extracted, text)` delivers one reply.
+        """
+        if self.state is None:
+            self._start(emails)
+
+        while self.state["stage"] in STAGES:
+            stage = self.state["stage"]
+            self._submit_stage(stage)
+            self._collect_stage(stage)
+            self._apply_stage(stage, execute_plan, save_extraction)
+            next_index = STAGES.index(stage) + 1
+            self.state["stage"] = STAGES[next_index] if next_index < len(STAGES) else "send"
+            self._save_state()
+
+        sent = self._sent_ids()
+        outcome = {}
+        with open(self.sent_log_path, 'a', encoding='utf-8') as sent_log:
+            for cid, email in self.state["emails"].items():
+                if cid in self.state["errors"]:
+                    outcome[email["id"]] = self.state["errors"][cid]
+                    continue
+                if cid not in sent:
+                    try:
+                        send(email, self.state["results"]["extract"][cid], self.state["results"]["finalize"][cid]["content"])
+                    except Exception as e:
+                        outcome[email["id"]] = f"send failed: {str(e)}"
+                        continue
+                    sent_log.write(cid + "\n")
+                    sent_log.flush()
+                outcome[email["id"]] = None
+
+        self.state["stage"] = "done"
+        self._save_state()
+        return outcome
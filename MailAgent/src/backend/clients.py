@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Pool sizes and timeouts, shared by every agent in this process
+HTTP_POOL_SIZE = int(os.getenv("MAILAGENT_HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("MAILAGENT_HTTP_TIMEOUT", "30"))
+OPENAI_TIMEOUT = float(os.getenv("MAILAGENT_OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("MAILAGENT_OPENAI_MAX_RETRIES", "2"))
+MAILGUN_API_BASE = os.getenv("MAILGUN_API_BASE", "https://api.mailgun.net/v3")
+
+_lock = threading.Lock()
+_openai_client = None
+_async_openai_clients = weakref.WeakKeyDictionary()
+_mailgun_session = None
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=60
+    )
+
+
+def get_openai_client():
+    """
+    Returns the process-wide OpenAI client.
+
+    The client owns one keep-alive connection pool, so TCP and TLS handshakes
+    are paid once per connection instead of once per completion. It is safe
+    to share between threads.
+    """
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            _openai_client = openai.OpenAI(
+                timeout=OPENAI_TIMEOUT,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.Client(limits=_limits(), timeout=OPENAI_TIMEOUT)
+            )
+            logger.debug("Created pooled OpenAI client (pool size %s)", HTTP_POOL_SIZE)
+        return _openai_client
+
+
+def get_async_openai_client():
+    """
+    Returns the AsyncOpenAI client for the running event loop.
+
+    Async connection pools are tied to the loop they were created on, so one
+    client is kept per loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_openai_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                timeout=OPENAI_TIMEOUT,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=OPENAI_TIMEOUT)
+            )
+            _async_openai_clients[loop] = client
+        return client
+
+
+def get_mailgun_session():
+    """
+    Returns the process-wide requests.Session used for Mailgun.
+
+    The mounted adapter keeps up to HTTP_POOL_SIZE keep-alive connections,
+    which lets concurrent workers share one pool. Callers pass auth and
+    timeout per request, so no per-request state lives on the session.
+    """
+    global _mailgun_session
+    with _lock:
+        if _mailgun_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _mailgun_session = session
+        return _mailgun_session
+
+
+def mailgun_url(domain, endpoint="messages"):
+    return f"{MAILGUN_API_BASE}/{domain}/{endpoint}"
+
+
+def close_clients():
+    """Closes pooled connections; used on shutdown"""
+    global _openai_client, _mailgun_session
+    with _lock:
+        if _openai_client is not None:
+            _openai_client.close()
+            _openai_client = None
+        if _mailgun_session is not None:
+            _mailgun_session.close()
+            _mailgun_session = None
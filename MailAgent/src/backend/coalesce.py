@@ -0,0 +1,132 @@
+import logging
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from intent_classifier import parse_sender
+
+logger = logging.getLogger(__name__)
+
+SUBJECT_PREFIX_RE = re.compile(r"^\s*((re|fwd?|aw|wg|sv|antw)\s*(\[\d+\])?\s*:\s*|\[[^\]]*\]\s*)+", re.IGNORECASE)
+
+
+def normalize_subject(subject):
+    """Strips reply/forward prefixes and list tags: 'Re: Fwd: [x] Hello' -> 'hello'"""
+    return " ".join(SUBJECT_PREFIX_RE.sub("", subject or "").lower().split())
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class _Group:
+    def __init__(self, email, sender, when):
+        self.emails = [email]
+        self.sender = sender
+        self.subjects = {normalize_subject(email.get("subject"))}
+        self.message_ids = {email["message_id"]} if email.get("message_id") else set()
+        self.last_seen = when
+
+    def accepts(self, email):
+        if email.get("in_reply_to") and email["in_reply_to"] in self.message_ids:
+            return True
+        subject = normalize_subject(email.get("subject"))
+        return bool(subject) and subject in self.subjects
+
+    def add(self, email, when):
+        self.emails.append(email)
+        self.subjects.add(normalize_subject(email.get("subject")))
+        if email.get("message_id"):
+            self.message_ids.add(email["message_id"])
+        if when is not None:
+            self.last_seen = max(self.last_seen or when, when)
+
+
+def merge(emails):
+    """
+    Turns a group of emails from one sender into a single unit. The unit
+    keeps the lowest id as its own, lists every member in `ids`, and
+    presents the messages oldest first so the model sees the whole exchange.
+    """
+    if len(emails) == 1:
+        return emails[0]
+    latest = emails[-1]
+    parts = []
+    for number, email in enumerate(emails, 1):
+        parts.append(
+            f"--- Message {number} of {len(emails)} "
+            f"(date: {email.get('date', '')}, subject: {email.get('subject', '')}) ---\n"
+            f"{email.get('body', '')}"
+        )
+    merged = {
+        **latest,
+        "id": min(email["id"] for email in emails),
+        "ids": sorted(email["id"] for email in emails),
+        "subject": latest.get("subject", ""),
+        "body": "\n\n".join(parts),
+    }
+    return merged
+
+
+def coalesce(emails, window=1800.0, max_group_size=10, max_open_groups=10000, on_merge=None):
+    """
+    Groups a stream of emails (ascending id, roughly chronological) into
+    per-sender units. An email joins its sender's open group only when it
+    replies to a message in it (In-Reply-To / Message-ID) or shares its
+    normalized subject; an unrelated email from the same sender emits the
+    group and starts a new one. Groups idle for more than `window` seconds
+    are emitted as the stream advances, so memory stays bounded by
+    `max_open_groups` and only bursts are merged.
+
+    Yields plain emails for singletons and merged units (with `ids`) for
+    groups. `on_merge(unit)` is called for every merged unit.
+    """
+    open_groups = OrderedDict()
+    latest = None
+
+    def _emit(group):
+        unit = merge(group.emails)
+        if on_merge is not None and "ids" in unit:
+            on_merge(unit)
+        return unit
+
+    for email in emails:
+        sender = parse_sender(email.get("from")) or email.get("from") or f"unknown-{email['id']}"
+        sender = sender.lower()
+        when = _timestamp(email.get("date"))
+        if when is not None:
+            latest = when if latest is None else max(latest, when)
+
+        group = open_groups.get(sender)
+        if group is not None and len(group.emails) < max_group_size and group.accepts(email):
+            group.add(email, when)
+            open_groups.move_to_end(sender)
+        else:
+            if group is not None:
+                del open_groups[sender]
+                yield _emit(group)
+            open_groups[sender] = _Group(email, sender, when)
+
+        # Groups idle for longer than the window are finished
+        while open_groups:
+            oldest_sender, oldest = next(iter(open_groups.items()))
+            expired = latest is not None and oldest.last_seen is not None and latest - oldest.last_seen > window
+            if not expired and len(open_groups) <= max_open_groups:
+                break
+            del open_groups[oldest_sender]
+            yield _emit(oldest)
+
+    for group in open_groups.values():
+        yield _emit(group)
@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class EmailCancelled(Exception):
+    """Raised inside a worker when its email was cancelled or timed out"""
+
+
+# Yielded by an open-ended email source (see service.py) when nothing is
+# waiting, so the engine keeps collecting results instead of blocking on it
+IDLE = object()
+
+
+def email_ids(email):
+    """Ids covered by a work item: a merged unit lists them in `ids`"""
+    return email.get("ids") or [email["id"]]
+
+
+class Watermark:
+    """
+    Tracks which email ids are done so the checkpoint never skips a failure.
+
+    `last_processed_id` only advances over a contiguous run of completed ids.
+    Ids that finished above a gap (a failed or still in-flight email) are kept
+    in `processed_ids` so the next run neither skips the gap nor re-sends them.
+    An id given up on with `dead_letter()` counts as done for the checkpoint
+    and is listed in `dead_letters` instead, so it stops holding the others back.
+    All methods are expected to be called from the engine's coordinating thread.
+    """
+
+    def __init__(self, last_processed_id=0, processed_ids=(), dead_letter_ids=()):
+        self._base = last_processed_id
+        self._done = {i for i in processed_ids if i > last_processed_id}
+        self._pending = set()
+        self._in_flight = set()
+        self._failed = set()
+        self._dead = set(dead_letter_ids)
+        self._seen_max = last_processed_id
+        self._exhausted = False
+
+    def is_done(self, email_id):
+        return email_id <= self._base or email_id in self._done
+
+    def track(self, email_id):
+        """Registers an id that this run is responsible for"""
+        self._pending.add(email_id)
+        self._seen_max = max(self._seen_max, email_id)
+
+    def start(self, email_id):
+        self._in_flight.add(email_id)
+
+    def succeed(self, email_id):
+        self._pending.discard(email_id)
+        self._in_flight.discard(email_id)
+        self._failed.discard(email_id)
+        self._done.add(email_id)
+
+    def fail(self, email_id):
+        self._in_flight.discard(email_id)
+        self._failed.add(email_id)
+
+    def dead_letter(self, email_id):
+        """Gives up on a failed id: it no longer blocks the checkpoint"""
+        self.succeed(email_id)
+        self._dead.add(email_id)
+
+    def mark_exhausted(self):
+        """Signals that every unprocessed email has been tracked"""
+        self._exhausted = True
+
+    @property
+    def in_flight(self):
+        return sorted(self._in_flight)
+
+    @property
+    def failed(self):
+        return sorted(self._failed)
+
+    @property
+    def dead_letters(self):
+        return sorted(self._dead)
+
+    def checkpoint(self):
+        """
+        Returns (last_processed_id, processed_ids) safe to persist, and
+        compacts the watermark to that point so `processed_ids` only ever
+        holds the ids above the lowest unfinished one.
+        """
+        # Emails that were never read may sit above the highest tracked id,
+        # so only an exhausted run may advance past it.
+        limit = None if self._exhausted else self._seen_max
+        blocking = min(self._pending) if self._pending else None
+
+        last_processed_id = self._base
+        for email_id in sorted(self._done):
+            if limit is not None and email_id > limit:
+                break
+            if blocking is not None and email_id > blocking:
+                break
+            last_processed_id = email_id
+
+        processed_ids = sorted(i for i in self._done if i > last_processed_id)
+        self._base = last_processed_id
+        self._done = set(processed_ids)
+        return last_processed_id, processed_ids
+
+
+class ProcessingEngine:
+    """
+    Runs a handler over emails on a bounded worker pool.
+
+    handler(email, cancel_event) is called for each email. Workers are expected
+    to check `cancel_event` between stages and raise EmailCancelled; an email
+    that exceeds `timeout` seconds has its event set and is recorded as failed
+    unless it still completes successfully. A merged unit (see coalesce.py)
+    is one handler call whose outcome is recorded for every id in `ids`.
+    """
+
+    def __init__(self, handler, max_workers=4, timeout=None, poll_interval=0.5):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.handler = handler
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._shutdown = threading.Event()
+
+    def cancel(self):
+        """Stops submitting new emails and cancels the ones in flight"""
+        self._shutdown.set()
+
+    def run(self, emails, watermark, on_checkpoint=None, checkpoint_every=50, checkpoint_interval=None,
+            on_result=None):
+        """
+        Processes `emails` (any iterable, consumed lazily in ascending id order)
+        and records every outcome on `watermark`. Returns a summary dict.
+        The iterable may yield IDLE to hand control back while it waits for
+        more emails; the run ends when it is exhausted.
+
+        `on_checkpoint(watermark)` is called after every `checkpoint_every`
+        finished emails, or `checkpoint_interval` seconds after the first
+        email finished since the last one, so long runs can persist progress
+        as they go. `on_result(email, outcome)` is called for every finished
+        email with "succeeded", "failed", "timed_out" or "cancelled".
+        """
+        summary = {"succeeded": 0, "failed": 0, "timed_out": 0, "cancelled": 0}
+        finished_since_checkpoint = 0
+        last_checkpoint = time.monotonic()
+        email_iter = iter(emails)
+        running = {}
+        # Start times are written by worker threads; a plain dict is fine for
+        # single-key assignments under the GIL.
+        started_at = {}
+        # Emails already counted as timed out, so their cancellation is not counted twice
+        timed_out = set()
+
+        def _run(email, cancel_event):
+            started_at[email["id"]] = time.monotonic()
+            if cancel_event.is_set():
+                raise EmailCancelled(f"Email {email['id']} cancelled before start")
+            return self.handler(email, cancel_event)
+
+        def _fill(executor):
+            # Keep at most one queued email per worker so cancellation is cheap
+            # and the input iterator is not drained ahead of the pool.
+            while not self._shutdown.is_set() and len(running) < self.max_workers * 2:
+                email = next(email_iter, None)
+                if email is None:
+                    watermark.mark_exhausted()
+                    return False
+                if email is IDLE:
+                    return True
+                cancel_event = threading.Event()
+                for email_id in email_ids(email):
+                    watermark.track(email_id)
+                future = executor.submit(_run, email, cancel_event)
+                running[future] = (email, cancel_event)
+            return True
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="email-worker")
+        try:
+            more = _fill(executor)
+            while running or more:
+                # wait() on nothing would sleep the full timeout; an idle
+                # source paces the loop itself
+                done = set()
+                if running:
+                    done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    email, cancel_event = running.pop(future)
+                    email_id = email["id"]
+                    ids = email_ids(email)
+                    started_at.pop(email_id, None)
+                    try:
+                        future.result()
+                        outcome, mark = "succeeded", watermark.succeed
+                    except (EmailCancelled, CancelledError) as e:
+                        logger.warning("Email %s cancelled: %s", email_id, str(e) or 'not started')
+                        outcome, mark = "cancelled", watermark.fail
+                    except Exception as e:
+                        logger.error("Error processing email %s: %s", email_id, e)
+                        outcome, mark = "failed", watermark.fail
+                    for unit_id in ids:
+                        mark(unit_id)
+                    if email_id in timed_out:
+                        timed_out.discard(email_id)
+                        if outcome == "succeeded":
+                            # Finished after all; it is no longer a timeout
+                            summary["timed_out"] -= len(ids)
+                        else:
+                            outcome = "timed_out"
+                    if outcome != "timed_out":
+                        summary[outcome] += len(ids)
+                    if on_result is not None:
+                        on_result(email, outcome)
+
+                finished_since_checkpoint += len(done)
+                now = time.monotonic()
+                due = finished_since_checkpoint >= checkpoint_every or (
+                    finished_since_checkpoint
+                    and checkpoint_interval is not None
+                    and now - last_checkpoint >= checkpoint_interval
+                )
+                if on_checkpoint is not None and due:
+                    on_checkpoint(watermark)
+                    finished_since_checkpoint = 0
+                    last_checkpoint = now
+
+                for future, (email, cancel_event) in running.items():
+                    email_id = email["id"]
+                    if email_id in started_at:
+                        for unit_id in email_ids(email):
+                            watermark.start(unit_id)
+                    if (
+                        self.timeout is not None
+                        and not cancel_event.is_set()
+                        and email_id in started_at
+                        and now - started_at[email_id] > self.timeout
+                    ):
+                        logger.warning("Email %s exceeded %ss timeout, cancelling", email_id, self.timeout)
+                        cancel_event.set()
+                        timed_out.add(email_id)
+                        for unit_id in email_ids(email):
+                            watermark.fail(unit_id)
+                        summary["timed_out"] += len(email_ids(email))
+
+                if self._shutdown.is_set():
+                    more = False
+                    for future, (email, cancel_event) in running.items():
+                        cancel_event.set()
+                        future.cancel()
+                elif more:
+                    more = _fill(executor)
+        except BaseException:
+            # KeyboardInterrupt and friends: cancel everything that has not
+            # finished so the caller can persist a consistent checkpoint.
+            self.cancel()
+            for future, (email, cancel_event) in running.items():
+                cancel_event.set()
+                future.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+        summary["in_flight"] = watermark.in_flight
+        summary["failed_ids"] = watermark.failed
+        return summary
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_id INTEGER,
+    sender TEXT,
+    date TEXT,
+    intent TEXT,
+    subject TEXT,
+    data TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_extractions_sender ON extractions (sender);
+CREATE INDEX IF NOT EXISTS idx_extractions_date ON extractions (date);
+CREATE INDEX IF NOT EXISTS idx_extractions_intent ON extractions (intent);
+CREATE INDEX IF NOT EXISTS idx_extractions_email_id ON extractions (email_id);
+"""
+
+
+class ExtractionStore:
+    """
+    SQLite-backed store for structured data extracted from emails.
+
+    Records are buffered and committed in batches (every `batch_size` records
+    or `flush_interval` seconds, whichever comes first). The database runs in
+    WAL mode so several processes can write while readers query by sender,
+    date or intent without loading the whole history.
+
+    An email id holds at most one record: saving it again (a retried email,
+    a resumed bulk job) replaces the earlier one.
+    """
+
+    def __init__(self, path="data/extractions.db", batch_size=50, flush_interval=2.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def add(self, structured_data, email_id=None, subject=None):
+        """Buffers one extraction record, committing the batch when it is due"""
+        row = (
+            email_id,
+            structured_data.get("email"),
+            structured_data.get("date"),
+            structured_data.get("intent"),
+            subject,
+            json.dumps(structured_data, ensure_ascii=False),
+            datetime.now().isoformat(timespec="seconds")
+        )
+        with self._lock:
+            self._buffer.append(row)
+            due = (
+                len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+            if due:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            # The last record buffered for an email id wins
+            latest = {}
+            for position, row in enumerate(self._buffer):
+                latest[row[0] if row[0] is not None else ("anonymous", position)] = row
+            self._buffer = list(latest.values())
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM extractions WHERE email_id = ?",
+                    [(row[0],) for row in self._buffer if row[0] is not None]
+                )
+                self._conn.executemany(
+                    "INSERT INTO extractions (email_id, sender, date, intent, subject, data, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self._buffer
+                )
+            logger.debug("Committed %d extraction records", len(self._buffer))
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def query(self, sender=None, date=None, intent=None, since=None, until=None, limit=None):
+        """
+        Returns extracted records (newest first) filtered on indexed columns.
+        `since`/`until` bound the extracted date (YYYY-MM-DD, inclusive).
+        """
+        clauses = []
+        params = []
+        for column, value in (("sender", sender), ("date", date), ("intent", intent)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("date >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("date <= ?")
+            params.append(until)
+
+        sql = "SELECT email_id, subject, data, created_at FROM extractions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                "email_id": row["email_id"],
+                "subject": row["subject"],
+                "created_at": row["created_at"],
+                **json.loads(row["data"])
+            }
+            for row in rows
+        ]
+
+    def count_by_intent(self):
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT intent, COUNT(*) AS n FROM extractions GROUP BY intent ORDER BY n DESC"
+            ).fetchall()
+        return {row["intent"]: row["n"] for row in rows}
+
+    def training_examples(self, limit=None, exclude_source=None):
+        """
+        Returns (subject, intent) pairs, newest first, for training a local
+        classifier. Records whose data has `source == exclude_source` are
+        skipped so a model never learns from its own predictions.
+        """
+        sql = "SELECT subject, intent FROM extractions WHERE subject IS NOT NULL AND intent IS NOT NULL"
+        params = []
+        if exclude_source is not None:
+            sql += " AND COALESCE(json_extract(data, '$.source'), '') != ?"
+            params.append(exclude_source)
+        sql += " ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        self.flush()
+        with self._lock:
+            return [(row["subject"], row["intent"]) for row in self._conn.execute(sql, params)]
+
+    def import_json(self, file_path):
+        """One-time import of the legacy data.json ({"structured_data": [...]}) file"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            records = json.load(f).get("structured_data", [])
+        for record in records:
+            self.add(record)
+        self.flush()
+        logger.info("Imported %d records from %s", len(records), file_path)
+        return len(records)
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialised within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Each index entry is (email id, byte offset of its line in the log)
+INDEX_ENTRY = struct.Struct("<QQ")
+
+
+class InboxStore:
+    """
+    Append-only inbox log with an id-to-offset index and a separate checkpoint.
+
+    Layout inside `directory`:
+      inbox.jsonl      one email per line, ids strictly increasing
+      inbox.idx        fixed-width (id, offset) entries, binary searchable
+      checkpoint.json  {"last_processed_id": ..., "processed_ids": [...],
+                        "dead_letter_ids": [...]}
+      inbox.lock       flock()ed while appending, so several processes
+                       (webhook service, workers, imports) can share the log
+
+    Reading new mail seeks straight to the first unprocessed id, so the cost
+    of a run grows with the number of new emails rather than the inbox size.
+    """
+
+    def __init__(self, directory="customer_req"):
+        self.directory = directory
+        self.log_path = os.path.join(directory, "inbox.jsonl")
+        self.index_path = os.path.join(directory, "inbox.idx")
+        self.checkpoint_path = os.path.join(directory, "checkpoint.json")
+        self.lock_path = os.path.join(directory, "inbox.lock")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._locked():
+            self._recover()
+
+    @contextmanager
+    def _locked(self):
+        """Holds the thread lock and, where available, an exclusive lock on inbox.lock"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def exists(self):
+        return os.path.exists(self.log_path) and os.path.getsize(self.log_path) > 0
+
+    def _index_count(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+
+    def _read_entry(self, index_file, position):
+        index_file.seek(position * INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack(index_file.read(INDEX_ENTRY.size))
+
+    def _recover(self):
+        """Re-indexes log lines written after the last index entry (e.g. after a crash)"""
+        if not os.path.exists(self.log_path):
+            return
+        count = self._index_count()
+        # Drop a torn trailing index entry, if any
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) != count * INDEX_ENTRY.size:
+            with open(self.index_path, 'r+b') as index_file:
+                index_file.truncate(count * INDEX_ENTRY.size)
+
+        start = 0
+        if count:
+            with open(self.index_path, 'rb') as index_file:
+                _, last_offset = self._read_entry(index_file, count - 1)
+            with open(self.log_path, 'rb') as log_file:
+                log_file.seek(last_offset)
+                log_file.readline()
+                start = log_file.tell()
+
+        if start >= os.path.getsize(self.log_path):
+            return
+
+        logger.warning("Re-indexing inbox log from offset %s", start)
+        torn_at = None
+        with open(self.log_path, 'rb') as log_file, open(self.index_path, 'ab') as index_file:
+            log_file.seek(start)
+            while True:
+                offset = log_file.tell()
+                line = log_file.readline()
+                if not line:
+                    break
+                if not line.endswith(b"\n"):
+                    torn_at = offset
+                    break
+                email = json.loads(line)
+                index_file.write(INDEX_ENTRY.pack(email["id"], offset))
+
+        if torn_at is not None:
+            logger.warning("Discarding torn inbox record at offset %s", torn_at)
+            with open(self.log_path, 'r+b') as log_file:
+                log_file.truncate(torn_at)
+
+    def last_id(self):
+        count = self._index_count()
+        if not count:
+            return 0
+        with open(self.index_path, 'rb') as index_file:
+            return self._read_entry(index_file, count - 1)[0]
+
+    def append(self, email):
+        """Appends an email, assigning the next id if it has none. Returns the id."""
+        return self.extend([email])[0]
+
+    def extend(self, emails):
+        """
+        Appends emails in order with a single fsync. Returns their ids.
+        Reading the last id and writing the index happen under the inbox
+        lock, so concurrent writers never assign the same id.
+        """
+        with self._locked():
+            # Index whatever a writer that crashed mid-append left behind
+            self._recover()
+            last_id = self.last_id()
+            ids = []
+            lines = []
+            for email in emails:
+                email = dict(email)
+                email.setdefault("id", last_id + 1)
+                if email["id"] <= last_id:
+                    raise ValueError(f"Email id {email['id']} is not greater than last id {last_id}")
+                last_id = email["id"]
+                ids.append(last_id)
+                lines.append((json.dumps(email, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+
+            entries = []
+            with open(self.log_path, 'ab') as log_file:
+                offset = log_file.tell()
+                for email_id, line in zip(ids, lines):
+                    entries.append(INDEX_ENTRY.pack(email_id, offset))
+                    offset += len(line)
+                log_file.write(b"".join(lines))
+                log_file.flush()
+                os.fsync(log_file.fileno())
+            # The log is the source of truth; a missing index entry is
+            # rebuilt by _recover() on the next open.
+            with open(self.index_path, 'ab') as index_file:
+                index_file.write(b"".join(entries))
+            return ids
+
+    def _first_position_after(self, index_file, count, email_id):
+        """Binary search for the first index entry with id > email_id"""
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if self._read_entry(index_file, mid)[0] <= email_id:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def count_after(self, email_id):
+        count = self._index_count()
+        if not count:
+            return 0
+        with open(self.index_path, 'rb') as index_file:
+            return count - self._first_position_after(index_file, count, email_id)
+
+    def iter_after(self, email_id):
+        """
+        Yields emails with id > email_id in id order, reading lazily from the log.
+        Only the emails indexed when the call starts are read, so a record
+        another process is still appending is never parsed half-written.
+        """
+        count = self._index_count()
+        if not count:
+            return
+        with open(self.index_path, 'rb') as index_file:
+            position = self._first_position_after(index_file, count, email_id)
+            if position >= count:
+                return
+            _, offset = self._read_entry(index_file, position)
+
+        remaining = count - position
+        with open(self.log_path, 'rb') as log_file:
+            log_file.seek(offset)
+            for line in log_file:
+                if not remaining or not line.endswith(b"\n"):
+                    return
+                if line.strip():
+                    remaining -= 1
+                    yield json.loads(line)
+
+    def get(self, email_id):
+        """Returns the email with `email_id`, or None"""
+        email = next(self.iter_after(email_id - 1), None)
+        return email if email is not None and email["id"] == email_id else None
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as file:
+                checkpoint = json.load(file)
+        except FileNotFoundError:
+            checkpoint = {}
+        return {
+            "last_processed_id": checkpoint.get("last_processed_id", 0),
+            "processed_ids": checkpoint.get("processed_ids", []),
+            "dead_letter_ids": checkpoint.get("dead_letter_ids", [])
+        }
+
+    def save_checkpoint(self, last_processed_id, processed_ids=(), dead_letter_ids=None):
+        """
+        Atomically replaces the checkpoint file. `dead_letter_ids` lists
+        emails given up on; None keeps the ones already recorded.
+        """
+        if dead_letter_ids is None:
+            dead_letter_ids = self.load_checkpoint()["dead_letter_ids"]
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({
+                "last_processed_id": last_processed_id,
+                "processed_ids": list(processed_ids),
+                "dead_letter_ids": list(dead_letter_ids)
+            }, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def migrate_from_json(json_path, store):
+    """
+    One-time import of the legacy incoming_emails.json layout into `store`.
+    The legacy file is left untouched.
+    """
+    if store.exists():
+        raise ValueError(f"Inbox store in {store.directory} is not empty, refusing to migrate")
+
+    logger.info("Migrating legacy inbox %s into %s", json_path, store.directory)
+    with open(json_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    emails = sorted(data.get("emails", []), key=lambda x: x["id"])
+    store.extend(emails)
+    store.save_checkpoint(data.get("last_processed_id", 0), data.get("processed_ids", []))
+    logger.info("Migrated %d emails", len(emails))
+    return len(emails)
+
+
+def open_inbox(directory="customer_req", legacy_path=None):
+    """Opens the inbox store, migrating from the legacy JSON file on first use"""
+    store = InboxStore(directory)
+    if legacy_path is None:
+        legacy_path = os.path.join(directory, "incoming_emails.json")
+    if not store.exists() and os.path.exists(legacy_path):
+        migrate_from_json(legacy_path, store)
+    return store
@@ -0,0 +1,220 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+from collections import Counter, defaultdict
+from datetime import date
+from email.utils import parseaddr, parsedate_to_datetime
+
+from knowledgebase import tokenize
+
+logger = logging.getLogger(__name__)
+
+SOURCE = "classifier"
+
+
+def parse_sender(value):
+    """Returns the bare address from 'Name <addr>' or 'addr', or None"""
+    address = parseaddr(value or "")[1].strip()
+    return address if "@" in address else None
+
+
+def parse_date(value):
+    """Normalises ISO or RFC 2822 dates to YYYY-MM-DD, or returns None"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10]).isoformat()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def features(text):
+    """Stemmed unigrams plus bigrams"""
+    tokens = tokenize(text or "")
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def intent_key(label):
+    return re.sub(r"[^a-z0-9]+", " ", label.lower()).strip()
+
+
+class IntentClassifier:
+    """
+    TF-IDF weighted multinomial naive Bayes over email subjects.
+
+    Trained from past LLM extractions; `predict` returns the most likely
+    intent with its posterior probability, and `classify` only answers when
+    that probability reaches `threshold`, so uncertain emails still go to
+    the LLM.
+    """
+
+    def __init__(self, labels, log_priors, log_probs, log_unseen, idf, threshold=0.9, stats=None):
+        self.labels = labels
+        self.log_priors = log_priors
+        self.log_probs = log_probs
+        self.log_unseen = log_unseen
+        self.idf = idf
+        self.threshold = threshold
+        self.stats = stats or {}
+
+    @classmethod
+    def train(cls, examples, threshold=0.9, min_per_label=5, alpha=0.1, holdout=0.1, seed=0):
+        """
+        Trains on (subject, intent) pairs. Intent spellings that differ only in
+        case or punctuation are merged under their most common form; intents
+        with fewer than `min_per_label` examples are left to the LLM.
+        Returns None if fewer than two intents have enough data.
+        """
+        spellings = defaultdict(Counter)
+        for _, intent in examples:
+            spellings[intent_key(intent)][intent] += 1
+        canonical = {key: counts.most_common(1)[0][0] for key, counts in spellings.items()}
+        data = [(subject, canonical[intent_key(intent)]) for subject, intent in examples if subject]
+        label_counts = Counter(label for _, label in data)
+        data = [(subject, label) for subject, label in data if label_counts[label] >= min_per_label]
+        if len({label for _, label in data}) < 2:
+            return None
+
+        rng = random.Random(seed)
+        rng.shuffle(data)
+        split = int(len(data) * holdout) if len(data) >= 50 else 0
+        model = cls._fit(data[split:], threshold, alpha)
+        if split:
+            model.stats = model.evaluate(data[:split])
+            # Ship a model trained on everything; the holdout only measured it
+            stats = model.stats
+            model = cls._fit(data, threshold, alpha)
+            model.stats = stats
+        model.stats["examples"] = len(data)
+        return model
+
+    @classmethod
+    def _fit(cls, data, threshold, alpha):
+        documents = [(Counter(features(subject)), label) for subject, label in data]
+        df = Counter(feature for counts, _ in documents for feature in counts)
+        n = len(documents)
+        idf = {feature: math.log((1 + n) / (1 + count)) + 1 for feature, count in df.items()}
+
+        weight_sums = defaultdict(Counter)
+        label_counts = Counter()
+        for counts, label in documents:
+            label_counts[label] += 1
+            for feature, tf in counts.items():
+                weight_sums[label][feature] += (1 + math.log(tf)) * idf[feature]
+
+        vocabulary = len(idf)
+        labels = sorted(label_counts)
+        log_priors = {label: math.log(label_counts[label] / n) for label in labels}
+        log_probs = {}
+        log_unseen = {}
+        for label in labels:
+            total = sum(weight_sums[label].values()) + alpha * vocabulary
+            log_probs[label] = {f: math.log((w + alpha) / total) for f, w in weight_sums[label].items()}
+            log_unseen[label] = math.log(alpha / total)
+        return cls(labels, log_priors, log_probs, log_unseen, idf, threshold)
+
+    def predict(self, text):
+        """Returns (intent, probability); (None, 0.0) when no known feature is present"""
+        counts = Counter(f for f in features(text) if f in self.idf)
+        if not counts:
+            return None, 0.0
+        scores = {}
+        for label in self.labels:
+            probs, unseen = self.log_probs[label], self.log_unseen[label]
+            scores[label] = self.log_priors[label] + sum(
+                (1 + math.log(tf)) * self.idf[f] * probs.get(f, unseen) for f, tf in counts.items()
+            )
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        total = sum(math.exp(score - top) for score in scores.values())
+        return best, 1.0 / total
+
+    def evaluate(self, data):
+        """Accuracy and coverage at the current threshold on labelled data"""
+        covered = correct = 0
+        for subject, label in data:
+            intent, confidence = self.predict(subject)
+            if confidence >= self.threshold:
+                covered += 1
+                correct += intent == label
+        return {
+            "holdout": len(data),
+            "coverage": round(covered / len(data), 4) if data else 0.0,
+            "accuracy": round(correct / covered, 4) if covered else None,
+        }
+
+    def classify(self, email):
+        """
+        Builds the extraction result locally, or returns None when the sender
+        or date cannot be parsed or the intent is below the threshold.
+        """
+        sender = parse_sender(email.get("from"))
+        sent_on = parse_date(email.get("date"))
+        if sender is None or sent_on is None:
+            return None
+        intent, confidence = self.predict(email.get("subject", ""))
+        if intent is None or confidence < self.threshold:
+            return None
+        return {
+            "email": sender,
+            "date": sent_on,
+            "intent": intent,
+            "source": SOURCE,
+            "confidence": round(confidence, 4)
+        }
+
+    def to_dict(self):
+        return {
+            "labels": self.labels,
+            "log_priors": self.log_priors,
+            "log_probs": self.log_probs,
+            "log_unseen": self.log_unseen,
+            "idf": self.idf,
+            "stats": self.stats
+        }
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, threshold=0.9):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls(
+            data["labels"], data["log_priors"], data["log_probs"], data["log_unseen"], data["idf"],
+            threshold, data.get("stats")
+        )
+
+
+def load_or_train(store, path, threshold=0.9, min_examples=200, max_examples=50000):
+    """
+    Trains a fresh model from the extraction store when it holds at least
+    `min_examples` LLM extractions (saving it to `path`), otherwise loads
+    the last saved model. Returns None when neither is available.
+    """
+    examples = store.training_examples(limit=max_examples, exclude_source=SOURCE)
+    if len(examples) >= min_examples:
+        model = IntentClassifier.train(examples, threshold=threshold)
+        if model is not None:
+            model.save(path)
+            logger.info("Trained intent classifier on %d extractions: %s", len(examples), model.stats)
+            return model
+    if os.path.exists(path):
+        model = IntentClassifier.load(path, threshold)
+        logger.info("Loaded intent classifier from %s: %s", path, model.stats)
+        return model
+    logger.info("Intent classifier disabled until %s extractions are stored (%s so far)", min_examples, len(examples))
+    return None
@@ -0,0 +1,208 @@
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or our "
+    "that the their this to was we what when where which who will with you your".split()
+)
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+
+SUFFIXES = ("ings", "ing", "ed", "es", "s")
+
+
+def stem(token):
+    """Crude suffix stripping so 'appointments'/'appointment' and 'pricing'/'price' match"""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [stem(token) for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def split_sections(markdown):
+    """Splits markdown into (heading path, section text) pairs at every heading"""
+    sections = []
+    path = []
+    lines = []
+
+    def _close():
+        text = "\n".join(lines).strip()
+        if text:
+            sections.append((" > ".join(path), text))
+
+    for line in markdown.splitlines():
+        match = HEADING_RE.match(line)
+        if match:
+            _close()
+            lines = []
+            level = len(match.group(1))
+            path = path[:level - 1] + [match.group(2).strip()]
+        else:
+            lines.append(line)
+    _close()
+    return sections
+
+
+def chunk_section(heading, text):
+    """Splits one section into paragraph chunks with precomputed term counts"""
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        terms = tokenize(f"{heading} {paragraph}")
+        chunks.append({
+            "heading": heading,
+            "text": paragraph,
+            "tf": dict(Counter(terms)),
+            "length": len(terms)
+        })
+    return chunks
+
+
+class KnowledgeBaseIndex:
+    """
+    BM25 index over heading/paragraph chunks of a markdown knowledge base.
+
+    Chunks are persisted next to the source file keyed by a hash of their
+    section, so after an edit only the changed sections are re-tokenized.
+    The source file is re-read only when its mtime or size changes.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or f"{path}.index.json"
+        self._lock = threading.Lock()
+        self._signature = None
+        self._state = None
+
+    def _load_persisted(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"signature": None, "sections": []}
+
+    def _persist(self, signature, sections):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({"signature": list(signature), "sections": sections}, file)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning("Could not persist knowledgebase index: %s", e)
+
+    def _build(self, signature):
+        persisted = self._load_persisted()
+        if persisted.get("signature") == list(signature):
+            sections = persisted["sections"]
+            logger.debug("Loaded knowledgebase index from %s", self.index_path)
+        else:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                markdown = file.read()
+            cached = {section["hash"]: section["chunks"] for section in persisted.get("sections", [])}
+            sections = []
+            rebuilt = 0
+            for heading, text in split_sections(markdown):
+                digest = hashlib.sha1(f"{heading}\n{text}".encode("utf-8")).hexdigest()
+                chunks = cached.get(digest)
+                if chunks is None:
+                    chunks = chunk_section(heading, text)
+                    rebuilt += 1
+                sections.append({"hash": digest, "chunks": chunks})
+            logger.info("Indexed knowledgebase: %d sections, %d rebuilt", len(sections), rebuilt)
+            self._persist(signature, sections)
+
+        chunks = [chunk for section in sections for chunk in section["chunks"]]
+        postings = {}
+        for position, chunk in enumerate(chunks):
+            for term, count in chunk["tf"].items():
+                postings.setdefault(term, []).append((position, count))
+        total_length = sum(chunk["length"] for chunk in chunks)
+        return {
+            "chunks": chunks,
+            "postings": postings,
+            "avg_length": total_length / len(chunks) if chunks else 0.0
+        }
+
+    def _refresh(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._state = self._build(signature)
+                    self._signature = signature
+        return self._state
+
+    def search(self, query, top_k=3):
+        """Returns up to `top_k` chunks ranked by BM25 score for `query`"""
+        state = self._refresh()
+        chunks = state["chunks"]
+        postings = state["postings"]
+        avg_length = state["avg_length"] or 1.0
+        n = len(chunks)
+
+        scores = {}
+        for term in set(tokenize(query)):
+            term_postings = postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (n - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for position, count in term_postings:
+                length = chunks[position]["length"]
+                norm = count * (K1 + 1) / (count + K1 * (1 - B + B * length / avg_length))
+                scores[position] = scores.get(position, 0.0) + idf * norm
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [
+            {"heading": chunks[position]["heading"], "text": chunks[position]["text"], "score": round(score, 4)}
+            for position, score in best
+        ]
+
+    def all_chunks(self):
+        """Returns every chunk in document order, without touching the disk when unchanged"""
+        state = self._refresh()
+        return [{"heading": chunk["heading"], "text": chunk["text"]} for chunk in state["chunks"]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path):
+    """Returns the shared index for a knowledge base file"""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = KnowledgeBaseIndex(path)
+        return _indexes[key]
+
+
+def format_chunks(chunks):
+    """Renders search results as plain text for a prompt or tool result"""
+    return "\n\n".join(
+        f"[{chunk['heading']}]\n{chunk['text']}" if chunk["heading"] else chunk["text"]
+        for chunk in chunks
+    )
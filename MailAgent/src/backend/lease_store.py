@@ -0,0 +1,209 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    email_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires_at REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leases_claimable ON leases (status, lease_expires_at);
+CREATE INDEX IF NOT EXISTS idx_leases_owner ON leases (owner, status);
+CREATE TABLE IF NOT EXISTS sends (
+    email_id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    sent_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class LeaseStore:
+    """
+    Shared SQLite table of per-email leases for sharded workers.
+
+    Any number of worker processes (on one host, or on several hosts that
+    share the file over a filesystem with working locks) import new inbox
+    ids and claim them in id order. A claim is a lease that expires after
+    `lease_seconds` unless its owner renews it, so the emails of a crashed
+    worker are claimed again by the others. Only the current owner can
+    complete or fail a lease. The `sends` table records one reply per email
+    id before it is handed to the outbox, which makes sending at-most-once
+    even when a lease was lost while its email was still being processed.
+    """
+
+    def __init__(self, path="data/leases.db", lease_seconds=120.0, max_attempts=3):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Autocommit mode so every write transaction is an explicit BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Serialises writers across processes: the write lock is taken before anything is read"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _synced_id(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'synced_id'").fetchone()
+        return row[0] if row else None
+
+    def sync(self, store, limit=1000):
+        """
+        Imports up to `limit` new ids from the inbox. The first import starts
+        at the inbox checkpoint, so emails finished by a single-process run
+        are not claimed again. Returns the number of ids imported.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            synced_id = self._synced_id(conn)
+            if synced_id is None:
+                checkpoint = store.load_checkpoint()
+                synced_id = checkpoint["last_processed_id"]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO leases (email_id, status, updated_at) VALUES (?, 'done', ?)",
+                    [(email_id, now) for email_id in checkpoint["processed_ids"]]
+                )
+            ids = []
+            for email in store.iter_after(synced_id):
+                ids.append(email["id"])
+                if len(ids) >= limit:
+                    break
+            conn.executemany(
+                "INSERT OR IGNORE INTO leases (email_id, updated_at) VALUES (?, ?)",
+                [(email_id, now) for email_id in ids]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_id', ?)",
+                (ids[-1] if ids else synced_id,)
+            )
+        return len(ids)
+
+    def claim(self, owner, limit=10):
+        """Leases up to `limit` pending or expired emails to `owner`, lowest ids first. Returns their ids."""
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT email_id, status, owner FROM leases "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_expires_at < ?)) AND attempts < ? "
+                "ORDER BY email_id LIMIT ?",
+                (now, self.max_attempts, limit)
+            ).fetchall()
+            for row in rows:
+                if row["status"] == "leased":
+                    logger.warning("Reclaiming email %s from expired lease of %s", row["email_id"], row["owner"])
+            conn.executemany(
+                "UPDATE leases SET status = 'leased', owner = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE email_id = ?",
+                [(owner, now + self.lease_seconds, now, row["email_id"]) for row in rows]
+            )
+            # Expired leases that used up their attempts are given up on
+            conn.execute(
+                "UPDATE leases SET status = 'failed', last_error = COALESCE(last_error, 'lease expired'), "
+                "updated_at = ? WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+        return [row["email_id"] for row in rows]
+
+    def renew(self, owner):
+        """Extends every lease `owner` holds; returns how many it still holds"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET lease_expires_at = ?, updated_at = ? WHERE owner = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, owner)
+            )
+        return cursor.rowcount
+
+    def complete(self, owner, email_id):
+        """Marks the email done; returns False if `owner` had lost the lease"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET status = 'done', last_error = NULL, updated_at = ? "
+                "WHERE email_id = ? AND owner = ? AND status = 'leased'",
+                (time.time(), email_id, owner)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, owner, email_id, error):
+        """Releases the email for another attempt, or gives up after max_attempts"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, lease_expires_at = 0, last_error = ?, updated_at = ? "
+                "WHERE email_id = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), email_id, owner)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, owner):
+        """Hands back every lease `owner` holds without counting an attempt (graceful shutdown)"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET status = 'pending', owner = NULL, lease_expires_at = 0, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE owner = ? AND status = 'leased'",
+                (time.time(), owner)
+            )
+        return cursor.rowcount
+
+    def guard_send(self, email_id, owner):
+        """Records the reply for `email_id`; returns False if one was already recorded"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO sends (email_id, owner, sent_at) VALUES (?, ?, ?)",
+                (email_id, owner, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM leases GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def write_checkpoint(self, store):
+        """
+        Saves the lease table's progress as the inbox checkpoint, so a later
+        single-process run carries on from it. Held under the write lock
+        because every worker writes the same file.
+        """
+        with self._transaction() as conn:
+            synced_id = self._synced_id(conn) or 0
+            first_open = conn.execute("SELECT MIN(email_id) FROM leases WHERE status != 'done'").fetchone()[0]
+            last_processed_id = first_open - 1 if first_open is not None else synced_id
+            processed_ids = [row[0] for row in conn.execute(
+                "SELECT email_id FROM leases WHERE status = 'done' AND email_id > ? ORDER BY email_id",
+                (last_processed_id,)
+            )]
+            store.save_checkpoint(last_processed_id, processed_ids)
+        return last_processed_id, processed_ids
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import time
+
+from openai.types.chat import ChatCompletion
+
+from clients import get_openai_client
+from llm_cache import LLMCache, make_key
+from metrics import get_metrics
+from rate_limiter import estimate_tokens, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Which call sites go through the response cache by default. Planning and
+# reply drafting see the same few intents over and over; extraction and the
+# agent loop are unique per email, so caching them only costs disk.
+CACHE_POLICY = {
+    "create_handling_plan": True,
+    "finalize_response": True,
+    "get_intent_and_extract_structured_data": False,
+    "agent": False,
+}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide LLM response cache, opening it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                os.getenv("MAILAGENT_LLM_CACHE_PATH", "data/llm_cache.db"),
+                ttl=float(os.getenv("MAILAGENT_LLM_CACHE_TTL", "86400")),
+                max_entries=int(os.getenv("MAILAGENT_LLM_CACHE_ENTRIES", "1024")),
+                max_disk_bytes=int(os.getenv("MAILAGENT_LLM_CACHE_BYTES", str(64 * 1024 * 1024)))
+            )
+        return _cache
+
+
+def cache_enabled(call_site, use_cache=None):
+    if os.getenv("MAILAGENT_LLM_CACHE", "on").lower() in ("0", "off", "false"):
+        return False
+    if use_cache is not None:
+        return use_cache
+    return CACHE_POLICY.get(call_site, False)
+
+
+def _create(client, call_site, params):
+    """Sends one completion through the rate-limit scheduler and records its cost"""
+    # The scheduler owns retries, so the SDK's own 429 retry loop is disabled
+    raw_client = client.with_options(max_retries=0).chat.completions.with_raw_response
+    estimated = estimate_tokens(params.get("messages", []), params.get("max_tokens"))
+    metrics = get_metrics()
+    with metrics.span("llm_call", call_site=call_site):
+        response = get_scheduler().call(lambda: raw_client.create(**params), estimated)
+    metrics.record_usage(call_site, response.usage)
+    return response
+
+
+def chat_completion(call_site, use_cache=None, cache_ttl=None, **params):
+    """
+    Creates a chat completion on behalf of `call_site`.
+
+    Call sites opted into CACHE_POLICY (or passing use_cache=True) are served
+    from the response cache when an identical request was seen before.
+    Everything else goes through the shared rate-limit scheduler.
+    """
+    client = get_openai_client()
+    if not cache_enabled(call_site, use_cache):
+        return _create(client, call_site, params)
+
+    cache = get_cache()
+    key = make_key(**params)
+    cached = cache.get(key, label=call_site)
+    if cached is not None:
+        logger.debug("LLM cache hit for %s", call_site)
+        get_metrics().inc("llm_cache_requests_total", call_site=call_site, result="hit")
+        return ChatCompletion.model_validate_json(cached)
+
+    get_metrics().inc("llm_cache_requests_total", call_site=call_site, result="miss")
+    started = time.monotonic()
+    response = _create(client, call_site, params)
+    latency = time.monotonic() - started
+    tokens = response.usage.total_tokens if response.usage else 0
+    cache.set(key, response.model_dump_json(), ttl=cache_ttl, latency=latency, tokens=tokens)
+    return response
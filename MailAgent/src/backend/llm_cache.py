@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(model, messages, **params):
+    """
+    Returns a stable hash for a completion request.
+
+    Keys in dicts are sorted and leading/trailing whitespace in message
+    content is stripped, so semantically identical requests share an entry.
+    """
+    normalized_messages = []
+    for message in messages:
+        message = dict(message)
+        if isinstance(message.get("content"), str):
+            message["content"] = message["content"].strip()
+        normalized_messages.append(message)
+    payload = json.dumps(
+        {"model": model, "messages": normalized_messages, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-level cache for model responses: an in-memory LRU in front of a
+    SQLite file.
+
+    Values are opaque strings (callers serialize responses themselves), which
+    keeps this module free of any SDK dependency. Entries expire after `ttl`
+    seconds; the memory tier is capped at `max_entries` and the disk tier at
+    `max_disk_bytes`, evicting least recently used entries first. Hit/miss
+    counters and the latency and tokens saved are kept per label.
+    """
+
+    def __init__(self, path="data/llm_cache.db", ttl=86400, max_entries=1024, max_disk_bytes=64 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stats = {}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL, "
+            "latency REAL NOT NULL DEFAULT 0, tokens INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        self._writes = 0
+
+    def _counter(self, label):
+        return self._stats.setdefault(label, {
+            "hits_memory": 0, "hits_disk": 0, "misses": 0,
+            "saved_seconds": 0.0, "saved_tokens": 0
+        })
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key, label="default"):
+        """Returns the cached value or None, updating the hit/miss counters"""
+        now = time.time()
+        with self._lock:
+            counter = self._counter(label)
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                self._memory.move_to_end(key)
+                counter["hits_memory"] += 1
+            else:
+                if entry is not None:
+                    del self._memory[key]
+                row = self._conn.execute(
+                    "SELECT value, expires_at, latency, tokens FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[1] <= now:
+                    counter["misses"] += 1
+                    return None
+                entry = row
+                self._remember(key, entry)
+                with self._conn:
+                    self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                counter["hits_disk"] += 1
+
+            counter["saved_seconds"] += entry[2]
+            counter["saved_tokens"] += entry[3]
+            return entry[0]
+
+    def set(self, key, value, ttl=None, latency=0.0, tokens=0):
+        """Stores a value; `latency` and `tokens` are what a future hit saves"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        entry = (value, expires_at, latency, tokens)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, entry)
+            with self._conn:
+                old = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, last_access, latency, tokens) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, value, size, expires_at, now, latency, tokens)
+                )
+                self._disk_bytes += size - (old[0] if old else 0)
+                self._writes += 1
+                # Expired rows are purged in bulk every so often rather than on each write
+                if self._writes % 100 == 0 or self._disk_bytes > self.max_disk_bytes:
+                    self._evict_locked(now)
+
+    def _evict_locked(self, now):
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall():
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._disk_bytes -= size
+            evicted += 1
+        logger.debug("Evicted %s LLM cache entries to stay under %s bytes", evicted, self.max_disk_bytes)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM llm_cache")
+            self._disk_bytes = 0
+
+    def stats(self):
+        """Returns a copy of the per-label counters plus a combined total"""
+        with self._lock:
+            stats = {label: dict(counter) for label, counter in self._stats.items()}
+        total = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "saved_seconds": 0.0, "saved_tokens": 0}
+        for counter in stats.values():
+            for name in total:
+                total[name] += counter[name]
+        lookups = total["hits_memory"] + total["hits_disk"] + total["misses"]
+        total["hit_rate"] = (total["hits_memory"] + total["hits_disk"]) / lookups if lookups else 0.0
+        stats["total"] = total
+        return stats
@@ -0,0 +1,162 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+# Standard LogRecord attributes; anything else on a record came in via `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class LazyJSON:
+    """
+    Defers json.dumps of a payload until a handler actually renders it.
+
+    Pass it as a %-style argument or as extra={"payload": LazyJSON(...)}; when
+    the level is disabled, or the payload is sampled out, nothing is dumped.
+    """
+
+    __slots__ = ("value", "indent")
+
+    def __init__(self, value, indent=None):
+        self.value = value
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.value, indent=self.indent, default=str, ensure_ascii=False)
+
+    def __repr__(self):
+        return str(self)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, thread, message and extras"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value.value if isinstance(value, LazyJSON) else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class PayloadSampler(logging.Filter):
+    """
+    Keeps the `payload` extra on one in every N records per logger.
+
+    The record itself always passes; sampled-out records just lose their
+    payload, so large dumps (plans, tool results, message bodies) cost
+    nothing most of the time. Rates are per logger name, with `default` for
+    the rest; a rate of 1 keeps every payload.
+    """
+
+    def __init__(self, rates=None, default=1):
+        super().__init__()
+        self.rates = rates or {}
+        self.default = default
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if getattr(record, "payload", None) is None:
+            return True
+        rate = self.rates.get(record.name, self.default)
+        if rate <= 1:
+            return True
+        with self._lock:
+            counter = self._counters.setdefault(record.name, itertools.count())
+            keep = next(counter) % rate == 0
+        if not keep:
+            del record.payload
+            record.payload_sampled_out = True
+        return True
+
+
+def parse_sample_rates(spec):
+    """Parses 'main=10,tools=5' into {'main': 10, 'tools': 5}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = int(rate)
+    return rates
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler renders the message on the calling thread before
+    enqueueing; this one only copies the record, so %-style arguments and
+    LazyJSON payloads are rendered by the listener. Arguments must therefore
+    not be mutated after they are logged.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        if record.exc_info and not record.exc_text:
+            # Tracebacks reference live frames; render them while they still exist
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(log_directory="logs", level=None, max_bytes=None, backup_count=None,
+                      sample_rates=None, default_sample_rate=None):
+    """
+    Routes all logging through an in-memory queue drained by one listener
+    thread, which writes JSON lines to a size-rotated `agent.log` and plain
+    text to the console. Returns the started QueueListener (stopped at exit).
+    """
+    os.makedirs(log_directory, exist_ok=True)
+    level = level or os.getenv("MAILAGENT_LOG_LEVEL", "INFO").upper()
+    max_bytes = max_bytes or int(os.getenv("MAILAGENT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    backup_count = backup_count if backup_count is not None else int(os.getenv("MAILAGENT_LOG_BACKUPS", "5"))
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.getenv("MAILAGENT_LOG_PAYLOAD_SAMPLE", ""))
+    if default_sample_rate is None:
+        default_sample_rate = int(os.getenv("MAILAGENT_LOG_PAYLOAD_SAMPLE_DEFAULT", "10"))
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_directory, "agent.log"),
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonLinesFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(PayloadSampler(sample_rates, default_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener):
+    """Flushes queued records and stops the listener; safe to call twice"""
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,137 @@
+"""
+Local stand-in for the Mailgun messages API.
+
+Point the app at it with MAILGUN_API_BASE=http://127.0.0.1:8025/v3 (any
+MAILGUN_API_KEY / MAILGUN_DOMAIN will do). It accepts both the plain
+`messages` endpoint used by the outbox and the `messages.mime` endpoint used
+by send_email, can inject latency and errors, and keeps every accepted call
+in memory for inspection. Setting `forced_status` answers every call with
+that status instead.
+
+    python mailgun_stub.py --port 8025 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+
+class MailgunStub:
+    """Threaded HTTP server that records Mailgun sends"""
+
+    def __init__(self, host="127.0.0.1", port=8025, latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.forced_status = None
+        self.calls = []
+        self.stats = {"calls": 0, "recipients": 0, "errors": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                if not self.path.startswith("/v3/") or not self.path.rstrip("/").endswith(("/messages", "/messages.mime")):
+                    self._reply(404, {"message": "Not found"})
+                    return
+                status, payload = stub.handle(self.path, self.headers.get("Content-Type", ""), raw)
+                self._reply(status, payload)
+
+        return Handler
+
+    def handle(self, path, content_type, raw):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        roll = random.random()
+        with self._lock:
+            self.stats["calls"] += 1
+            if self.forced_status is not None:
+                self.stats["errors"] += 1
+                return self.forced_status, {"message": f"Forced status {self.forced_status}"}
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 429, {"message": "Too many requests"}
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return 500, {"message": "Internal error"}
+
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            fields = parse_qsl(raw.decode("utf-8"), keep_blank_values=True)
+        else:
+            # messages.mime uploads are multipart; only the size is kept
+            fields = [("mime-bytes", str(len(raw)))]
+        recipients = [value for name, value in fields if name == "to"]
+        message_id = f"<{uuid.uuid4().hex}@stub.mailgun>"
+        with self._lock:
+            self.stats["recipients"] += max(len(recipients), 1)
+            self.calls.append({"path": path, "id": message_id, "fields": fields})
+        return 200, {"id": message_id, "message": "Queued. Thank you."}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mailgun-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Mailgun API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0, help="Base latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    stub = MailgunStub(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    logger.info("Mailgun stub listening on %s", stub.url)
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Mailgun stub stats: %s", stub.stats)
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
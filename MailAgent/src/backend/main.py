@@ -2,31 +2,33 @@ import os
 import json
 import openai
 import logging
-from datetime import datetime
+import threading
 from dotenv import load_dotenv
-from tools import get_appointments, read_knowledgebase, send_email
+from tools import send_email
+from engine import EmailCancelled, ProcessingEngine, Watermark
+from coalesce import coalesce
+from inbox_store import open_inbox
+from extraction_store import ExtractionStore
+from agent import run_agent
+from llm import chat_completion, get_cache
+from clients import close_clients, get_openai_client
+from rate_limiter import get_scheduler
+from batch import BulkJob, LocalBatchBackend, OpenAIBatchBackend
+from prompts import MODEL, PLAN_RESPONSE_FORMAT, extraction_messages, finalize_messages, plan_messages
+from plan_executor import PlanError, default_plan, execute_plan, parse_plan
+from intent_classifier import load_or_train
+from outbox import OutboxDispatcher, get_outbox
+from logging_config import LazyJSON, configure_logging
+from metrics import format_summary, get_metrics, span
 
 # Configure logging
 def setup_logging():
-    """Configure logging with timestamp, level, and message"""
-    log_directory = "logs"
-    if not os.path.exists(log_directory):
-        os.makedirs(log_directory)
-    
-    # Create a timestamp for the log file name
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    log_file = os.path.join(log_directory, f'agent_{timestamp}.log')
-    
-    # Configure logging format and settings
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()  # This will also print to console
-        ]
-    )
-    
+    """
+    Configure non-blocking logging: records are queued and written by a
+    background listener as JSON lines to logs/agent.log (rotated by size)
+    and as plain text to the console.
+    """
+    configure_logging("logs")
     logging.info("Logging initialized")
 
 # Initialize environment and logging
@@ -40,247 +42,406 @@ if not openai.api_key:
     logger.error("OpenAI API key not found in environment variables")
     raise ValueError("OpenAI API key not found")
 
-def load_incoming_emails(file_path='customer_req/incoming_emails.json'):
-    """Loads incoming emails from a JSON file"""
-    logger.info(f"Loading emails from {file_path}")
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            logger.debug(f"Loaded {len(data.get('emails', []))} emails")
-            return data
-    except FileNotFoundError:
-        logger.error(f"Email file not found: {file_path}")
-        raise
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in email file: {file_path}")
-        raise
-
-def save_incoming_emails(data, file_path='customer_req/incoming_emails.json'):
-    """Saves the updated emails data back to file"""
-    logger.info(f"Saving updated emails to {file_path}")
-    try:
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4)
-            logger.debug("Successfully saved emails data")
-    except Exception as e:
-        logger.error(f"Failed to save emails: {str(e)}")
-        raise
-
 def create_handling_plan(intent):
-    """Creates a step-by-step plan based on customer intent"""
-    logger.info(f"Creating handling plan for intent: {intent}")
+    """Creates a structured tool plan (JSON) based on customer intent"""
+    logger.info("Creating handling plan for intent: %s", intent)
     try:
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant that creates a step-by-step plan. "
-                        "ALWAYS include specific tool names in your plan:\n"
-                        "- Use 'get_appointments' to check available times\n"
-                        "- Use 'read_knowledgebase' to check company information\n"
-                        "- Use 'send_email' for responding to customer\n"
-                        "Be explicit about which tools to use."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": f"The intent of the user is: {intent}. Please create a plan."
-                }
-            ]
+        response = chat_completion(
+            "create_handling_plan",
+            model=MODEL,
+            messages=plan_messages(intent),
+            response_format=PLAN_RESPONSE_FORMAT
         )
         plan = response.choices[0].message.content
-        logger.info("Generated Plan:")
-        logger.info("-" * 50)
-        logger.info(f"{plan}")
-        logger.info("-" * 50)
+        logger.debug("Generated plan", extra={"payload": plan})
         return plan
     except Exception as e:
-        logger.error(f"Failed to create handling plan: {str(e)}")
+        logger.error("Failed to create handling plan: %s", e)
         raise
 
-def parse_plan_and_execute(plan):
-    """Parses and executes the handling plan"""
+def parse_plan_and_execute(plan, query="", email=None, intent=None):
+    """
+    Validates the planner's JSON plan and runs it as a DAG of tool steps.
+    `query` drives knowledgebase retrieval; `email` and `intent` fill the
+    $email.* and $intent references.
+    """
     logger.info("Parsing and executing plan")
-    logger.info("Plan received:")
-    logger.info("-" * 50)
-    logger.info(f"{plan}")
-    logger.info("-" * 50)
-    
-    tool_results = {}
+    try:
+        steps = parse_plan(plan)
+    except PlanError as e:
+        logger.warning("Unusable plan, falling back to the default lookups: %s", e)
+        steps = default_plan()
 
+    context = {"email": email or {}, "query": query, "intent": intent if intent is not None else query}
     try:
-        if "read_knowledgebase" in plan.lower():
-            logger.info("Executing knowledgebase tool")
-            kb_info = read_knowledgebase({"keyword": ""})
-            tool_results["knowledgebase"] = kb_info[:200] + "..."
-
-        if "get_appointments" in plan.lower() or "check" in plan.lower():
-            logger.info("Executing appointments tool")
-            appointments_data = get_appointments({"date": "2024-12-11"})
-            tool_results["appointments"] = appointments_data
-            logger.info("Appointments data retrieved:")
-            logger.info("-" * 50)
-            logger.info(json.dumps(appointments_data, indent=2))
-            logger.info("-" * 50)
-
-        if len(tool_results) == 0:
-            logger.warning("No tools were executed based on the plan!")
-        else:
-            logger.info(f"Tools executed: {list(tool_results.keys())}")
-            logger.info("Tool results:")
-            logger.info("-" * 50)
-            logger.info(json.dumps(tool_results, indent=2))
-            logger.info("-" * 50)
-            
-        return tool_results
+        tool_results = execute_plan(
+            steps,
+            context,
+            step_timeout=float(os.getenv("MAILAGENT_PLAN_STEP_TIMEOUT", "10"))
+        )
     except Exception as e:
-        logger.error(f"Error executing plan: {str(e)}")
+        logger.error("Error executing plan: %s", e)
         raise
 
-def get_intent_and_extract_structured_data(email):
-    """Extracts intent and structured data from email"""
-    logger.info("Extracting intent and structured data from email")
+    logger.info("Plan steps executed: %s", [f"{step['id']}:{step['tool']}" for step in steps])
+    logger.debug("Tool results", extra={"payload": LazyJSON(tool_results)})
+    return tool_results
+
+_intent_classifier = None
+
+def load_intent_classifier():
+    """Trains (or loads) the local intent classifier unless MAILAGENT_CLASSIFIER is off"""
+    global _intent_classifier
+    if os.getenv("MAILAGENT_CLASSIFIER", "on").lower() in ("0", "off", "false"):
+        return None
     try:
-        client = openai.OpenAI()
-        
-        email_content = (
-            f"From: {email.get('from', '')}\n"
-            f"Subject: {email.get('subject', '')}\n"
-            f"Date: {email.get('date', '')}\n"
-            f"Body: {email.get('body', '')}"
+        _intent_classifier = load_or_train(
+            get_extraction_store(),
+            os.getenv("MAILAGENT_CLASSIFIER_PATH", "data/intent_model.json"),
+            threshold=float(os.getenv("MAILAGENT_CLASSIFIER_THRESHOLD", "0.9")),
+            min_examples=int(os.getenv("MAILAGENT_CLASSIFIER_MIN_EXAMPLES", "200"))
         )
+    except Exception as e:
+        logger.error("Intent classifier unavailable, using the LLM for every email: %s", e)
+        _intent_classifier = None
+    return _intent_classifier
+
+def get_intent_and_extract_structured_data(email):
+    """
+    Extracts intent and structured data from email. Routine emails are
+    answered by the local classifier; the rest go to the LLM.
+    """
+    if _intent_classifier is not None:
+        data = _intent_classifier.classify(email)
+        if data is not None:
+            get_metrics().inc("extractions_total", source="classifier")
+            logger.debug("Classified locally", extra={"payload": LazyJSON(data)})
+            return data
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant that reads an email and returns a JSON object "
-                        "with 'email', 'date', and 'intent' fields. Example:\n"
-                        '{ "email": "sender@example.com", "date": "2024-01-01", "intent": "Schedule Appointment" }'
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": email_content
-                }
-            ]
+    logger.info("Extracting intent and structured data from email")
+    get_metrics().inc("extractions_total", source="llm")
+    try:
+        response = chat_completion(
+            "get_intent_and_extract_structured_data",
+            model=MODEL,
+            messages=extraction_messages(email)
         )
 
         data = json.loads(response.choices[0].message.content)
-        logger.info(f"Extracted data: {data}")
+        logger.debug("Extracted data", extra={"payload": LazyJSON(data)})
         return data
 
     except json.JSONDecodeError as e:
-        logger.error(f"JSON parsing error: {str(e)}")
+        logger.error("JSON parsing error: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Failed to extract data from email: {str(e)}")
+        logger.error("Failed to extract data from email: %s", e)
         raise
 
-def save_structured_data_to_file(structured_data, file_path=r'D:\Agents\data.json'):
-    """Saves structured data to file"""
-    logger.info(f"Saving structured data to {file_path}")
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        logger.warning(f"Data file not found, creating new one: {file_path}")
-        data = {"structured_data": []}
+_extraction_store = None
+_extraction_store_lock = threading.Lock()
 
-    data["structured_data"].append(structured_data)
+def get_extraction_store():
+    """Returns the process-wide extraction store, opening it on first use"""
+    global _extraction_store
+    with _extraction_store_lock:
+        if _extraction_store is None:
+            _extraction_store = ExtractionStore(
+                os.getenv("MAILAGENT_EXTRACTION_DB", "data/extractions.db"),
+                batch_size=int(os.getenv("MAILAGENT_EXTRACTION_BATCH", "50"))
+            )
+        return _extraction_store
 
+def save_structured_data(structured_data, email=None):
+    """
+    Queues structured data for a batched commit to the extraction store,
+    one record per member email of a coalesced unit
+    """
+    email = email or {}
+    logger.debug("Saving structured data for email ID: %s", email.get('id'))
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-            logger.debug("Successfully saved structured data")
+        for email_id in email.get("ids") or [email.get("id")]:
+            get_extraction_store().add(
+                structured_data,
+                email_id=email_id,
+                subject=email.get("subject")
+            )
     except Exception as e:
-        logger.error(f"Failed to save structured data: {str(e)}")
+        logger.error("Failed to save structured data: %s", e)
         raise
 
-def process_email(email):
+_dispatcher = None
+_send_guard = None
+
+def set_send_guard(guard):
+    """
+    Installs guard(email) -> bool, consulted before every reply is queued;
+    a False answer means a reply for this email was already recorded and
+    nothing is sent. Used by the sharded workers (see worker.py).
+    """
+    global _send_guard
+    _send_guard = guard
+
+def outbox_enabled():
+    return os.getenv("MAILAGENT_OUTBOX", "on").lower() not in ("0", "off", "false")
+
+def send_reply(email, parameters):
+    """
+    Queues a reply in the outbox, keyed by the source email so a retried email
+    never queues a second reply. Sends it immediately when the outbox is off.
+    """
+    if _send_guard is not None and not _send_guard(email):
+        logger.warning("Reply for email ID %s was already sent, skipping", email.get('id'))
+        return {"status": "already sent"}
+    if not outbox_enabled():
+        return send_email(parameters)
+    queued = get_outbox().enqueue(
+        f"email-{email.get('id')}",
+        parameters.get("to"),
+        parameters.get("subject", ""),
+        parameters.get("text_content") or "",
+        parameters.get("html_content") or ""
+    )
+    if _dispatcher is not None:
+        _dispatcher.notify()
+    return {"status": "queued" if queued else "already queued"}
+
+def start_outbox_dispatcher():
+    """Starts the background sender; it also picks up replies left unsent by a previous run"""
+    global _dispatcher
+    if outbox_enabled() and _dispatcher is None:
+        _dispatcher = OutboxDispatcher(
+            get_outbox(),
+            concurrency=int(os.getenv("MAILAGENT_OUTBOX_CONCURRENCY", "4"))
+        ).start()
+    return _dispatcher
+
+def stop_outbox_dispatcher():
+    """Drains due replies for up to MAILAGENT_OUTBOX_DRAIN_TIMEOUT seconds, then stops the sender"""
+    global _dispatcher
+    if _dispatcher is None:
+        return
+    # Replies still pending afterwards stay queued for the next run
+    _dispatcher.stop(drain_timeout=float(os.getenv("MAILAGENT_OUTBOX_DRAIN_TIMEOUT", "60")))
+    logger.info("Outbox stats: %s, queue: %s", _dispatcher.stats, get_outbox().counts())
+    _dispatcher = None
+
+def _check_cancelled(cancel_event, email):
+    """Raises EmailCancelled if the engine asked this email to stop"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise EmailCancelled(f"Processing of email ID {email.get('id')} was cancelled")
+
+def process_email(email, cancel_event=None):
     """Process a single email"""
-    logger.info(f"Processing email ID: {email.get('id')}")
+    logger.info("Processing email ID: %s", email.get('id'))
+    try:
+        with span("email", mode="pipeline"):
+            # Pass the entire email object instead of just the body
+            with span("stage", stage="extract"):
+                extracted_info = get_intent_and_extract_structured_data(email)
+            _check_cancelled(cancel_event, email)
+            with span("stage", stage="save"):
+                save_structured_data(extracted_info, email)
+
+            with span("stage", stage="plan"):
+                plan = create_handling_plan(extracted_info.get("intent", ""))
+            _check_cancelled(cancel_event, email)
+            with span("stage", stage="execute_plan"):
+                tool_results = parse_plan_and_execute(
+                    plan,
+                    f"{extracted_info.get('intent', '')} {email.get('subject', '')}",
+                    email,
+                    extracted_info.get("intent", "")
+                )
+
+            with span("stage", stage="finalize"):
+                final_text = finalize_response(extracted_info.get("intent", ""), tool_results)
+
+            # Last chance to stop: once the reply is queued the email counts as done
+            _check_cancelled(cancel_event, email)
+            with span("stage", stage="send"):
+                send_reply(email, {
+                    "to": extracted_info.get("email", "customer@example.com"),
+                    "subject": "Re: Your Inquiry",
+                    "html_content": f"<p>{final_text}</p>",
+                    "text_content": final_text
+                })
+        logger.info("Successfully processed email ID: %s", email.get('id'))
+    except EmailCancelled:
+        raise
+    except Exception as e:
+        logger.error("Failed to process email ID %s: %s", email.get('id'), e)
+        raise
+
+def process_email_agent(email, cancel_event=None):
+    """Process a single email with the function-calling agent loop"""
+    logger.info("Processing email ID with agent: %s", email.get('id'))
     try:
-        # Pass the entire email object instead of just the body
-        extracted_info = get_intent_and_extract_structured_data(email)
-        save_structured_data_to_file(extracted_info)
-        
-        plan = create_handling_plan(extracted_info.get("intent", ""))
-        tool_results = parse_plan_and_execute(plan)
+        with span("email", mode="agent"):
+            result = run_agent(
+                email,
+                save_extraction=lambda data: save_structured_data(data, email),
+                cancel_event=cancel_event,
+                max_steps=int(os.getenv("MAILAGENT_AGENT_MAX_STEPS", "4")),
+                send=lambda parameters: send_reply(email, parameters)
+            )
+        logger.info("Successfully processed email ID %s in %d model calls", email.get('id'), result['steps'])
+    except EmailCancelled:
+        raise
+    except Exception as e:
+        logger.error("Failed to process email ID %s: %s", email.get('id'), e)
+        raise
 
-        final_text = finalize_response(extracted_info.get("intent", ""), tool_results)
+def run_bulk(emails, watermark):
+    """Processes emails through batch submissions instead of one call at a time"""
+    backend_name = os.getenv("MAILAGENT_BATCH_BACKEND", "openai")
+    workdir = os.getenv("MAILAGENT_BATCH_DIR", "data/bulk")
+    if backend_name == "local":
+        # Answers each request through the regular API; no batch discount
+        backend = LocalBatchBackend(
+            lambda body: chat_completion("bulk_local", **body).model_dump(),
+            f"{workdir}-local"
+        )
+    else:
+        backend = OpenAIBatchBackend(get_openai_client())
 
-        send_email({
-            "to": extracted_info.get("email", "customer@example.com"),
+    def _send(email, extracted, final_text):
+        send_reply(email, {
+            "to": extracted.get("email", "customer@example.com"),
             "subject": "Re: Your Inquiry",
             "html_content": f"<p>{final_text}</p>",
             "text_content": final_text
         })
-        logger.info(f"Successfully processed email ID: {email.get('id')}")
-    except Exception as e:
-        logger.error(f"Failed to process email ID {email.get('id')}: {str(e)}")
-        raise
+
+    job = BulkJob(workdir, backend, poll_interval=float(os.getenv("MAILAGENT_BATCH_POLL", "30")))
+    units = job.track(emails, watermark)
+    outcome = job.run(emails, parse_plan_and_execute, save_structured_data, _send)
+    summary = {"succeeded": 0, "failed": 0}
+    for unit_id, error in outcome.items():
+        ids = units.get(unit_id, [unit_id])
+        if error is not None:
+            logger.error("Bulk processing failed for email %s: %s", unit_id, error)
+        for email_id in ids:
+            (watermark.succeed if error is None else watermark.fail)(email_id)
+        summary["succeeded" if error is None else "failed"] += len(ids)
+    return summary
+
+def coalesce_emails(emails, watermark):
+    """
+    Merges bursts of related emails from one sender into single units.
+    Every email is tracked as soon as it is read, because the coalescer may
+    hold it back while later ids are already being processed.
+    """
+    def _tracked():
+        for mail in emails:
+            watermark.track(mail["id"])
+            yield mail
+
+    def _on_merge(unit):
+        get_metrics().inc("coalesced_emails_total", len(unit["ids"]) - 1)
+        logger.info("Coalesced emails %s from %s into one reply", unit["ids"], unit.get("from"))
+
+    return coalesce(
+        _tracked(),
+        window=float(os.getenv("MAILAGENT_COALESCE_WINDOW", "1800")),
+        max_group_size=int(os.getenv("MAILAGENT_COALESCE_MAX_GROUP", "10")),
+        on_merge=_on_merge
+    )
 
 def finalize_response(intent, tool_results):
     """
     Creates a final user-facing response by summarizing the context from tools
     and the intent, with OpenAI.
     """
-    client = openai.OpenAI()
-    system_prompt = (
-        "You are responding to a customer's request. You have the user's intent and any extra data from tools. "
-        "Provide a concise, friendly response suitable for an email body."
-    )
-    user_content = (
-        f"Intent: {intent}\n\n"
-        f"Tool Results:\n{json.dumps(tool_results, indent=2)}"
-    )
-
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content}
-        ]
+    response = chat_completion(
+        "finalize_response",
+        model=MODEL,
+        messages=finalize_messages(intent, tool_results)
     )
     return response.choices[0].message.content
 
+def write_run_metrics(mode, summary):
+    """Logs the per-stage summary and writes the run's metrics file"""
+    metrics = get_metrics()
+    for name, value in get_scheduler().stats.items():
+        metrics.inc(f"rate_limiter_{name}", value)
+    fmt = os.getenv("MAILAGENT_METRICS_FORMAT", "jsonl")
+    path = os.getenv("MAILAGENT_METRICS_PATH", "logs/metrics.prom" if fmt == "prom" else "logs/metrics.jsonl")
+    try:
+        metrics.write(path, fmt, mode=mode, summary=summary)
+        logger.info("Run metrics written to %s:\n%s", path, format_summary(metrics))
+    except Exception as e:
+        logger.error("Failed to write run metrics: %s", e)
+
 def main():
     """Main execution function"""
     logger.info("Starting email processing")
     try:
-        data = load_incoming_emails()
-        emails = data.get("emails", [])
-        last_processed_id = data.get("last_processed_id", 0)
-
-        new_emails = [mail for mail in emails if mail["id"] > last_processed_id]
-        logger.info(f"Found {len(new_emails)} new emails to process")
-
-        new_emails.sort(key=lambda x: x["id"])
-        
-        for mail in new_emails:
-            try:
-                process_email(mail)
-                last_processed_id = max(last_processed_id, mail["id"])
-            except Exception as e:
-                logger.error(f"Error processing email {mail['id']}: {str(e)}")
-                continue
-
-        data["last_processed_id"] = last_processed_id
-        save_incoming_emails(data)
+        store = open_inbox(
+            os.getenv("MAILAGENT_INBOX_DIR", "customer_req"),
+            legacy_path=os.getenv("MAILAGENT_LEGACY_INBOX", "customer_req/incoming_emails.json")
+        )
+        checkpoint = store.load_checkpoint()
+        watermark = Watermark(checkpoint["last_processed_id"], checkpoint["processed_ids"])
+
+        # Seek straight past the checkpoint; ids finished above a gap are skipped
+        new_emails = (
+            mail for mail in store.iter_after(checkpoint["last_processed_id"])
+            if not watermark.is_done(mail["id"])
+        )
+        pending = store.count_after(checkpoint["last_processed_id"]) - len(checkpoint["processed_ids"])
+        logger.info("Found %s new emails to process", pending)
+
+        if os.getenv("MAILAGENT_COALESCE", "on").lower() not in ("0", "off", "false"):
+            new_emails = coalesce_emails(new_emails, watermark)
+
+        mode = os.getenv("MAILAGENT_MODE", "pipeline")
+        handler = process_email_agent if mode == "agent" else process_email
+        max_workers = int(os.getenv("MAILAGENT_MAX_WORKERS", "4"))
+        timeout = os.getenv("MAILAGENT_EMAIL_TIMEOUT")
+        engine = ProcessingEngine(
+            handler,
+            max_workers=max_workers,
+            timeout=float(timeout) if timeout else None
+        )
+        logger.info("Processing in %s mode with %s workers", mode, max_workers)
+
+        start_outbox_dispatcher()
+
+        if mode == "pipeline":
+            load_intent_classifier()
+
+        summary = None
+        try:
+            if mode == "bulk":
+                summary = run_bulk(list(new_emails), watermark)
+            else:
+                summary = engine.run(
+                    new_emails,
+                    watermark,
+                    on_checkpoint=lambda wm: store.save_checkpoint(*wm.checkpoint())
+                )
+            logger.info("Run summary: %s", summary)
+        finally:
+            # Persist whatever finished, even when interrupted
+            last_processed_id, processed_ids = watermark.checkpoint()
+            get_extraction_store().flush()
+            store.save_checkpoint(last_processed_id, processed_ids)
+            stop_outbox_dispatcher()
+            if watermark.failed:
+                logger.warning("Emails to retry on next run: %s", watermark.failed)
+            logger.info("LLM cache stats: %s", get_cache().stats())
+            logger.info("Rate limiter stats: %s", get_scheduler().stats)
+            write_run_metrics(mode, summary)
+            close_clients()
         logger.info("Email processing completed successfully")
     except Exception as e:
-        logger.error(f"Fatal error in main execution: {str(e)}")
+        logger.error("Fatal error in main execution: %s", e)
         raise
 
 if __name__ == "__main__":
     try:
         main()
     except Exception as e:
-        logger.critical(f"Application failed: {str(e)}")
+        logger.critical("Application failed: %s", e)
         raise 
\ No newline at end of file
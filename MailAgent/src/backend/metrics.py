@@ -0,0 +1,230 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Metric names end in their unit, Prometheus style (`llm_call_seconds`)
+UNITS = {"seconds": "s", "tokens": " tokens", "bytes": " bytes"}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def unit_of(name):
+    """Display suffix for a metric named `<what>_<unit>`, or "" if the unit is unknown"""
+    return UNITS.get(name.rsplit("_", 1)[-1], "")
+
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+
+class Histogram:
+    """
+    Count, sum and a bounded reservoir of observations for percentiles.
+
+    Up to `max_samples` values are kept; beyond that, reservoir sampling
+    keeps a uniform sample so p50/p95/p99 stay representative.
+    """
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < self.max_samples:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.max_samples:
+                self.samples[slot] = value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        return {q: _quantile(ordered, q) for q in QUANTILES}
+
+    def summary(self):
+        quantiles = self.quantiles()
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            **{f"p{int(q * 100)}": value for q, value in quantiles.items()}
+        }
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and histograms, keyed by name and labels.
+
+    Spans time a block into the `<name>_seconds` histogram and count
+    exceptions in `<name>_errors_total`. Everything can be exported as
+    Prometheus text or as one JSON object per run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            key = _label_key(labels)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.inc(f"{name}_errors_total", error=type(e).__name__, **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+    def record_usage(self, call_site, usage):
+        """Adds a completion's token usage to the per-call-site counters"""
+        if usage is None:
+            return
+        self.inc("llm_prompt_tokens_total", usage.prompt_tokens, call_site=call_site)
+        self.inc("llm_completion_tokens_total", usage.completion_tokens, call_site=call_site)
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self.counters.get(name, {}).get(_label_key(labels), 0)
+
+    def snapshot(self):
+        """Plain-dict view: {"counters": {name: [...]}, "histograms": {name: [...]}}"""
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.time() - self.started, 3),
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(key), **histogram.summary()} for key, histogram in series.items()]
+                    for name, series in self.histograms.items()
+                }
+            }
+
+    def cache_hit_rates(self):
+        """Hit rate per call site from llm_cache_requests_total"""
+        rates = {}
+        with self._lock:
+            series = dict(self.counters.get("llm_cache_requests_total", {}))
+        totals = {}
+        for key, value in series.items():
+            labels = dict(key)
+            hits, total = totals.get(labels["call_site"], (0, 0))
+            totals[labels["call_site"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+        for call_site, (hits, total) in totals.items():
+            rates[call_site] = round(hits / total, 4) if total else 0.0
+        return rates
+
+    def to_prometheus(self, prefix="mailagent_"):
+        """Renders all series in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{prefix}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} summary")
+                for key, histogram in series.items():
+                    for q, value in histogram.quantiles().items():
+                        if value is not None:
+                            lines.append(f"{prefix}{name}{_format_labels(key, [('quantile', q)])} {value}")
+                    lines.append(f"{prefix}{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{prefix}{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt="jsonl", **run_info):
+        """
+        Writes the current metrics. 'prom' replaces the file with Prometheus
+        text (suitable for a node_exporter textfile collector); 'jsonl'
+        appends one summary object per run.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if fmt == "prom":
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        else:
+            entry = {"ts": time.time(), **run_info, **self.snapshot(), "cache_hit_rates": self.cache_hit_rates()}
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry, default=str) + "\n")
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Returns the process-wide metrics registry"""
+    return _metrics
+
+
+def span(name, **labels):
+    return _metrics.span(name, **labels)
+
+
+def format_summary(metrics=None):
+    """Short human-readable per-stage summary for the end-of-run log"""
+    metrics = metrics or _metrics
+    snapshot = metrics.snapshot()
+    lines = []
+    for name, series in sorted(snapshot["histograms"].items()):
+        unit = unit_of(name)
+        for entry in series:
+            labels = ",".join(f"{k}={v}" for k, v in entry["labels"].items())
+            lines.append(
+                f"{name}[{labels}] n={entry['count']} sum={entry['sum']:.2f}{unit} "
+                f"p50={entry['p50']:.3f} p95={entry['p95']:.3f} p99={entry['p99']:.3f}"
+            )
+    for name in ("llm_prompt_tokens_total", "llm_completion_tokens_total"):
+        for entry in snapshot["counters"].get(name, []):
+            lines.append(f"{name}[call_site={entry['labels']['call_site']}] {entry['value']}")
+    for call_site, rate in metrics.cache_hit_rates().items():
+        lines.append(f"llm_cache_hit_rate[call_site={call_site}] {rate}")
+    return "\n".join(lines)
@@ -0,0 +1,356 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import HTTP_TIMEOUT, get_mailgun_session, mailgun_url
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    text TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    provider_id TEXT,
+    delivery_status TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+# Mailgun accepts up to 1000 recipients per batch send
+MAX_BATCH_RECIPIENTS = 1000
+
+# Delivery statuses kept from Mailgun events. A transient status never
+# replaces a final one, since webhooks can arrive out of order.
+TRANSIENT_DELIVERY_STATUSES = ("accepted", "deferred")
+FINAL_DELIVERY_STATUSES = ("delivered", "failed", "rejected", "complained", "unsubscribed")
+
+
+class PermanentSendError(RuntimeError):
+    """Raised when Mailgun refuses a message in a way a retry cannot fix"""
+
+
+def delivery_status(event_data):
+    """
+    Maps Mailgun webhook `event-data` to (outbox id, delivery status), or
+    None for events that are not about one of our messages or its delivery.
+    """
+    outbox_id = (event_data.get("user-variables") or {}).get("outbox-id")
+    event = event_data.get("event")
+    if event == "failed":
+        status = "failed" if event_data.get("severity") == "permanent" else "deferred"
+    elif event in TRANSIENT_DELIVERY_STATUSES + FINAL_DELIVERY_STATUSES:
+        status = event
+    else:
+        return None
+    try:
+        return int(outbox_id), status
+    except (TypeError, ValueError):
+        return None
+
+
+class Outbox:
+    """
+    Durable SQLite queue of outgoing replies.
+
+    Each reply is enqueued under an idempotency key (one per source email),
+    so enqueueing the same reply twice is a no-op. Messages move from
+    'pending' to 'sending' when a dispatcher claims them and to 'sent' or
+    back to 'pending' (with backoff) afterwards; claims older than
+    `claim_timeout` are assumed to belong to a crashed dispatcher and are
+    released again.
+    """
+
+    def __init__(self, path="data/outbox.db", max_attempts=5, claim_timeout=300):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def enqueue(self, key, to, subject, text, html):
+        """Queues a reply; returns False if a reply with this key already exists"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, recipient, subject, text, html, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, to, subject, text, html, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, limit=100):
+        """Marks up to `limit` due messages as 'sending' and returns them"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+                (now - self.claim_timeout,)
+            )
+            rows = self._conn.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows]
+            )
+        return [dict(row) for row in rows]
+
+    def mark_sent(self, ids, provider_id):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE outbox SET status = 'sent', provider_id = ?, sent_at = ?, "
+                "attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                [(provider_id, time.time(), message_id) for message_id in ids]
+            )
+
+    def mark_failed(self, ids, error, base_delay=5.0, permanent=False):
+        """Schedules a retry with jittered exponential backoff, or gives up (always, when `permanent`)"""
+        now = time.time()
+        with self._lock, self._conn:
+            for message_id in ids:
+                attempts = self._conn.execute(
+                    "SELECT attempts FROM outbox WHERE id = ?", (message_id,)
+                ).fetchone()[0] + 1
+                if permanent or attempts >= self.max_attempts:
+                    status, next_attempt_at = "failed", now
+                else:
+                    status = "pending"
+                    next_attempt_at = now + random.uniform(0.5, 1.0) * base_delay * (2 ** attempts)
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (status, attempts, next_attempt_at, error, message_id)
+                )
+
+    def record_delivery(self, outbox_id, delivery_status):
+        """
+        Stores a delivery event (see delivery_status) for one message. Returns
+        False if the message is unknown or already has a final status that a
+        transient one must not replace.
+        """
+        transient = ", ".join("?" * len(TRANSIENT_DELIVERY_STATUSES))
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET delivery_status = ? WHERE id = ? AND ("
+                f"? NOT IN ({transient}) OR delivery_status IS NULL OR delivery_status IN ({transient}))",
+                (delivery_status, outbox_id, delivery_status,
+                 *TRANSIENT_DELIVERY_STATUSES, *TRANSIENT_DELIVERY_STATUSES)
+            )
+        return cursor.rowcount == 1
+
+    def status(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outbox WHERE idempotency_key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def due_count(self):
+        """Messages that are being sent or are ready to be sent right now"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = 'sending' "
+                "OR (status = 'pending' AND next_attempt_at <= ?)",
+                (time.time(),)
+            ).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _template_for(message):
+    """Returns the shared HTML template if the message uses the standard reply layout"""
+    if message["html"] == f"<p>{message['text']}</p>":
+        return "<p>%recipient.text%</p>"
+    return None
+
+
+def group_for_batch(messages):
+    """
+    Groups messages that can share one Mailgun batch send: same subject,
+    same HTML template, distinct recipients. Returns a list of lists.
+    """
+    groups = []
+    open_groups = {}
+    for message in messages:
+        template = _template_for(message)
+        if template is None:
+            groups.append([message])
+            continue
+        key = (message["subject"], template)
+        group = open_groups.get(key)
+        if group is None or len(group) >= MAX_BATCH_RECIPIENTS or \
+                any(m["recipient"] == message["recipient"] for m in group):
+            group = []
+            open_groups[key] = group
+            groups.append(group)
+        group.append(message)
+    return groups
+
+
+class MailgunSender:
+    """Sends outbox messages through the Mailgun messages endpoint"""
+
+    def __init__(self, api_key=None, domain=None):
+        self.api_key = api_key or os.getenv("MAILGUN_API_KEY", "")
+        self.domain = domain or os.getenv("MAILGUN_DOMAIN", "")
+
+    def send(self, group):
+        """Sends one group and returns the Mailgun message id"""
+        if not self.api_key or not self.domain:
+            raise RuntimeError("Mailgun config missing")
+
+        data = [("from", f"AI Assistant <mailgun@{self.domain}>"), ("subject", group[0]["subject"])]
+        if len(group) == 1:
+            message = group[0]
+            data += [
+                ("to", message["recipient"]),
+                ("text", message["text"]),
+                ("html", message["html"]),
+                ("v:outbox-id", str(message["id"])),
+                # A stable Message-Id lets receivers collapse a retried duplicate
+                ("h:Message-Id", f"<outbox-{message['idempotency_key']}@{self.domain}>"),
+            ]
+        else:
+            data += [("to", message["recipient"]) for message in group]
+            data += [
+                ("text", "%recipient.text%"),
+                ("html", _template_for(group[0])),
+                ("v:outbox-id", "%recipient.id%"),
+                ("recipient-variables", json.dumps({
+                    message["recipient"]: {"text": message["text"], "id": message["id"]}
+                    for message in group
+                }))
+            ]
+
+        response = get_mailgun_session().post(
+            mailgun_url(self.domain),
+            auth=("api", self.api_key),
+            data=data,
+            timeout=HTTP_TIMEOUT
+        )
+        if response.status_code >= 400:
+            error = f"Mailgun returned {response.status_code}: {response.text[:200]}"
+            # Other 4xx answers (bad address, auth, payload) fail the same way every time
+            if response.status_code < 500 and response.status_code != 429:
+                raise PermanentSendError(error)
+            raise RuntimeError(error)
+        return response.json().get("id")
+
+
+class OutboxDispatcher:
+    """
+    Background thread that drains the outbox concurrently, batching messages
+    that share a template into single Mailgun calls.
+    """
+
+    def __init__(self, outbox, sender=None, concurrency=4, batch_limit=500, poll_interval=1.0):
+        self.outbox = outbox
+        self.sender = sender or MailgunSender()
+        self.concurrency = concurrency
+        self.batch_limit = batch_limit
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats = {"groups": 0, "sent": 0, "failed": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def notify(self):
+        """Wakes the dispatcher early, e.g. right after an enqueue"""
+        self._wake.set()
+
+    def _send_group(self, group):
+        ids = [message["id"] for message in group]
+        try:
+            provider_id = self.sender.send(group)
+            self.outbox.mark_sent(ids, provider_id)
+            self.stats["sent"] += len(ids)
+        except Exception as e:
+            logger.error("Failed to send %d outbox messages: %s", len(ids), e)
+            self.outbox.mark_failed(ids, str(e), permanent=isinstance(e, PermanentSendError))
+            self.stats["failed"] += len(ids)
+
+    def dispatch_once(self, executor):
+        messages = self.outbox.claim(self.batch_limit)
+        if not messages:
+            return 0
+        groups = group_for_batch(messages)
+        self.stats["groups"] += len(groups)
+        list(executor.map(self._send_group, groups))
+        logger.debug("Dispatched %d messages in %d Mailgun calls", len(messages), len(groups))
+        return len(messages)
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox-send") as executor:
+            while not self._stop.is_set():
+                try:
+                    sent = self.dispatch_once(executor)
+                except Exception as e:
+                    logger.error("Outbox dispatcher error: %s", e)
+                    sent = 0
+                if not sent:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+
+    def stop(self, drain_timeout=None):
+        """
+        Stops the dispatcher. With `drain_timeout`, first waits up to that many
+        seconds for messages that are due now to be sent.
+        """
+        if drain_timeout:
+            deadline = time.monotonic() + drain_timeout
+            while time.monotonic() < deadline and self.outbox.due_count():
+                self.notify()
+                time.sleep(0.1)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """Returns the process-wide outbox, opening it on first use"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox(
+                os.getenv("MAILAGENT_OUTBOX_PATH", "data/outbox.db"),
+                max_attempts=int(os.getenv("MAILAGENT_OUTBOX_MAX_ATTEMPTS", "5"))
+            )
+        return _outbox
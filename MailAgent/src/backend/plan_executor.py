@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import span
+from tools import get_appointments, get_available_slots, read_knowledgebase
+from tools_schema import get_appointments_schema, get_available_slots_schema, read_knowledgebase_schema
+
+logger = logging.getLogger(__name__)
+
+# Read-only tools a plan may use, mapped to (schema, implementation).
+# Sending the reply is not a plan step; the pipeline does it after drafting.
+LOOKUP_TOOLS = {
+    "get_appointments": (get_appointments_schema, get_appointments),
+    "get_available_slots": (get_available_slots_schema, get_available_slots),
+    "read_knowledgebase": (read_knowledgebase_schema, read_knowledgebase),
+}
+
+STEP_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,40}$")
+REFERENCE_RE = re.compile(r"^\$(email|intent|query|steps)(?:\.(.+))?$")
+JSON_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool, "object": dict, "array": list}
+MAX_STEPS = 8
+
+
+class PlanError(ValueError):
+    """Raised when a plan does not parse or does not validate"""
+
+
+class StepFailed(Exception):
+    """Raised while resolving arguments that depend on a failed step"""
+
+
+def _references(value):
+    """Yields the step ids a (possibly nested) argument value refers to"""
+    if isinstance(value, str):
+        match = REFERENCE_RE.match(value)
+        if match and match.group(1) == "steps" and match.group(2):
+            yield match.group(2).split(".", 1)[0]
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _references(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _references(item)
+
+
+def _validate_arguments(step_id, tool, arguments):
+    schema = LOOKUP_TOOLS[tool][0]["parameters"]
+    properties = schema.get("properties", {})
+    unknown = set(arguments) - set(properties)
+    if unknown and schema.get("additionalProperties") is False:
+        raise PlanError(f"Step '{step_id}': unknown arguments for {tool}: {sorted(unknown)}")
+    missing = [name for name in schema.get("required", []) if name not in arguments]
+    if missing:
+        raise PlanError(f"Step '{step_id}': missing required arguments for {tool}: {missing}")
+    for name, value in arguments.items():
+        expected = JSON_TYPES.get(properties.get(name, {}).get("type"))
+        # References are checked once they are resolved
+        if isinstance(value, str) and value.startswith("$"):
+            continue
+        if expected and not isinstance(value, expected):
+            raise PlanError(f"Step '{step_id}': argument '{name}' for {tool} should be {properties[name]['type']}")
+
+
+def parse_plan(text):
+    """
+    Parses and validates a JSON plan of the form
+
+        {"steps": [{"id": "kb", "tool": "read_knowledgebase",
+                    "arguments": {"keyword": "$query"}, "depends_on": []}, ...]}
+
+    against the tool schemas. Step references ("$steps.<id>.<path>") add
+    an implicit dependency. Returns the steps in a valid execution order.
+    """
+    try:
+        data = json.loads(text) if isinstance(text, str) else text
+    except json.JSONDecodeError as e:
+        raise PlanError(f"Plan is not valid JSON: {str(e)}")
+    steps = data.get("steps") if isinstance(data, dict) else None
+    if not isinstance(steps, list) or not steps:
+        raise PlanError("Plan has no steps")
+    if len(steps) > MAX_STEPS:
+        raise PlanError(f"Plan has {len(steps)} steps, at most {MAX_STEPS} are allowed")
+
+    by_id = {}
+    for index, raw in enumerate(steps):
+        if not isinstance(raw, dict):
+            raise PlanError(f"Step {index} is not an object")
+        step_id = str(raw.get("id") or f"step{index + 1}")
+        if not STEP_ID_RE.match(step_id) or step_id in by_id:
+            raise PlanError(f"Step id '{step_id}' is invalid or duplicated")
+        tool = raw.get("tool")
+        if tool not in LOOKUP_TOOLS:
+            raise PlanError(f"Step '{step_id}' uses unknown tool '{tool}'")
+        arguments = raw.get("arguments") or {}
+        if not isinstance(arguments, dict):
+            raise PlanError(f"Step '{step_id}': arguments must be an object")
+        _validate_arguments(step_id, tool, arguments)
+        depends_on = set(raw.get("depends_on") or []) | set(_references(arguments))
+        by_id[step_id] = {"id": step_id, "tool": tool, "arguments": arguments, "depends_on": sorted(depends_on)}
+
+    for step in by_id.values():
+        unknown = [dep for dep in step["depends_on"] if dep not in by_id]
+        if unknown:
+            raise PlanError(f"Step '{step['id']}' depends on unknown steps {unknown}")
+
+    # Kahn's algorithm; anything left without a ready step is a cycle
+    ordered = []
+    remaining = dict(by_id)
+    while remaining:
+        ready = [step for step in remaining.values() if all(dep not in remaining for dep in step["depends_on"])]
+        if not ready:
+            raise PlanError(f"Plan has a dependency cycle between {sorted(remaining)}")
+        for step in ready:
+            ordered.append(step)
+            del remaining[step["id"]]
+    return ordered
+
+
+def default_plan():
+    """Used when the planner's output cannot be used: look up both sources at once"""
+    return parse_plan({"steps": [
+        {"id": "knowledgebase", "tool": "read_knowledgebase", "arguments": {"keyword": "$query", "top_k": 3}},
+        {"id": "available_slots", "tool": "get_available_slots", "arguments": {"after_date": "$email.date", "count": 5}},
+    ]})
+
+
+def _lookup(value, path):
+    for part in path.split(".") if path else []:
+        if isinstance(value, list):
+            try:
+                value = value[int(part)]
+            except (ValueError, IndexError):
+                return None
+        elif isinstance(value, dict):
+            value = value.get(part)
+        else:
+            return None
+    return value
+
+
+def resolve(value, context, results):
+    """Replaces $email.*, $intent, $query and $steps.<id>.* references with their values"""
+    if isinstance(value, dict):
+        return {key: resolve(item, context, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, context, results) for item in value]
+    if not isinstance(value, str):
+        return value
+    match = REFERENCE_RE.match(value)
+    if not match:
+        return value
+    root, path = match.groups()
+    if root == "steps":
+        step_id, _, rest = (path or "").partition(".")
+        result = results.get(step_id)
+        if result is None or "error" in result:
+            raise StepFailed(f"depends on failed step '{step_id}'")
+        return _lookup(result["result"], rest)
+    return _lookup(context.get(root), path)
+
+
+def _coerce(tool, arguments):
+    """Casts resolved references to the types the tool schema asks for"""
+    properties = LOOKUP_TOOLS[tool][0]["parameters"].get("properties", {})
+    coerced = {}
+    for name, value in arguments.items():
+        kind = properties.get(name, {}).get("type")
+        if value is None:
+            continue
+        if kind == "string" and not isinstance(value, str):
+            value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+        elif kind == "integer" and isinstance(value, str) and value.isdigit():
+            value = int(value)
+        coerced[name] = value
+    return coerced
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Shared pool for tool steps, sized by MAILAGENT_PLAN_WORKERS"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("MAILAGENT_PLAN_WORKERS", "16")),
+                thread_name_prefix="plan-step"
+            )
+        return _executor
+
+
+def _run_step(step, arguments):
+    with span("tool", tool=step["tool"]):
+        return LOOKUP_TOOLS[step["tool"]][1](arguments)
+
+
+def execute_plan(steps, context, step_timeout=10.0, executor=None):
+    """
+    Runs validated plan steps as a DAG: every step starts as soon as its
+    dependencies have finished, so independent lookups run in parallel and
+    the plan takes about as long as its slowest path. A step that fails or
+    exceeds `step_timeout` seconds is recorded as an error and its
+    dependents are skipped. Returns {step_id: {"tool", "result" | "error"}}.
+    """
+    executor = executor or get_executor()
+    results = {}
+    pending = {step["id"]: step for step in steps}
+    running = {}
+
+    def _record(step, **outcome):
+        results[step["id"]] = {"tool": step["tool"], **outcome}
+
+    while pending or running:
+        for step_id, step in list(pending.items()):
+            if any(dep not in results for dep in step["depends_on"]):
+                continue
+            del pending[step_id]
+            try:
+                arguments = _coerce(step["tool"], resolve(step["arguments"], context, results))
+            except StepFailed as e:
+                _record(step, error=f"skipped: {str(e)}")
+                continue
+            running[executor.submit(_run_step, step, arguments)] = (step, time.monotonic() + step_timeout)
+
+        if not running:
+            if pending:
+                # Only reachable with an unvalidated plan; nothing can make progress
+                for step in pending.values():
+                    _record(step, error="skipped: unmet dependencies")
+                pending.clear()
+            break
+
+        next_deadline = min(deadline for _, deadline in running.values())
+        done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            step, _ = running.pop(future)
+            try:
+                _record(step, result=future.result())
+            except Exception as e:
+                logger.error("Plan step %s (%s) failed: %s", step["id"], step["tool"], e)
+                _record(step, error=str(e))
+
+        now = time.monotonic()
+        for future, (step, deadline) in list(running.items()):
+            if deadline <= now and not future.done():
+                # The worker thread cannot be interrupted; its result is dropped
+                future.cancel()
+                del running[future]
+                logger.warning("Plan step %s (%s) timed out after %ss", step["id"], step["tool"], step_timeout)
+                _record(step, error=f"timed out after {step_timeout}s")
+
+    return results
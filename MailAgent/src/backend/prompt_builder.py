@@ -0,0 +1,185 @@
+"""
+Token-budgeted prompt assembly.
+
+Every prompt the pipeline sends is built here so it can be measured and
+kept under a per-call-site input budget. Tokens are counted with tiktoken
+when it is installed and estimated at about four characters per token
+otherwise. Budgets default to DEFAULT_BUDGETS and can be overridden with
+MAILAGENT_PROMPT_BUDGETS="finalize_response=1500,get_intent_and_extract_structured_data=800".
+"""
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+
+from metrics import get_metrics
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Input-token budgets per call site; completions are budgeted separately
+DEFAULT_BUDGETS = {
+    "get_intent_and_extract_structured_data": 1500,
+    "create_handling_plan": 1500,
+    "finalize_response": 2500,
+    "agent": 3000,
+}
+FALLBACK_BUDGET = 3000
+# Chat formatting overhead per message and for priming the reply (OpenAI's published counts)
+MESSAGE_OVERHEAD = 3
+REPLY_PRIMING = 3
+# A truncated item shorter than this is dropped instead
+MIN_TRUNCATED_TOKENS = 32
+TRUNCATION_MARK = " [...]"
+# Lists of at least this many same-shaped objects are sent as a table
+TABLE_MIN_ROWS = 3
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text, model):
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate(text, max_tokens, model):
+    """Cuts `text` to at most `max_tokens` tokens, marking the cut"""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARK, model))
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:keep * 4].rstrip() + TRUNCATION_MARK
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:keep]).rstrip() + TRUNCATION_MARK
+
+
+def parse_budgets(spec):
+    """Parses 'finalize_response=1500,agent=3000' into {'finalize_response': 1500, 'agent': 3000}"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, budget = item.partition("=")
+        budgets[name.strip()] = int(budget)
+    return budgets
+
+
+def budget_for(call_site):
+    overrides = parse_budgets(os.getenv("MAILAGENT_PROMPT_BUDGETS"))
+    return overrides.get(call_site, DEFAULT_BUDGETS.get(call_site, FALLBACK_BUDGET))
+
+
+def _tabulate(value):
+    """Turns lists of same-shaped objects into {"columns": [...], "rows": [[...]]} so keys are sent once"""
+    if isinstance(value, dict):
+        return {key: _tabulate(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        items = [_tabulate(item) for item in value]
+        if len(items) >= TABLE_MIN_ROWS and all(isinstance(item, dict) for item in items):
+            columns = list(items[0])
+            if all(list(item) == columns for item in items):
+                return {"columns": columns, "rows": [[item[c] for c in columns] for item in items]}
+        return items
+    return value
+
+
+def compact_json(value):
+    """Whitespace-free JSON with repeated record keys factored out"""
+    return json.dumps(_tabulate(value), ensure_ascii=False, separators=(",", ":"))
+
+
+def tool_result_items(tool_results):
+    """
+    Renders plan results ({step_id: {"tool", "result" | "error"}}) as prompt
+    items in priority order: errors and structured lookups first (they are
+    short and the reply depends on them), then knowledge base passages in
+    their retrieval order, one item per passage.
+    """
+    structured, passages = [], []
+    for step_id, outcome in tool_results.items():
+        label = f"{step_id} ({outcome.get('tool', 'tool')})"
+        if "error" in outcome:
+            structured.append(f"{label}: error: {outcome['error']}")
+            continue
+        result = outcome.get("result")
+        if isinstance(result, str):
+            chunks = [chunk for chunk in re.split(r"\n\s*\n", result) if chunk.strip()]
+            if not chunks:
+                structured.append(f"{label}: no results")
+            for position, chunk in enumerate(chunks):
+                passages.append(f"{label}:\n{chunk}" if position == 0 else chunk)
+        else:
+            structured.append(f"{label}: {compact_json(result)}")
+    return structured + passages
+
+
+class PromptBuilder:
+    """
+    Assembles one chat prompt for `call_site` under its token budget.
+
+    `add` appends a message that is always sent. `add_packed` appends a
+    message made of a fixed header plus as many ranked items as still fit;
+    the first item that does not fit is truncated (or dropped when too
+    little room is left) and everything after it is left out. `build`
+    records the prompt size and returns the messages.
+    """
+
+    def __init__(self, call_site, model, budget=None):
+        self.call_site = call_site
+        self.model = model
+        self.budget = budget if budget is not None else budget_for(call_site)
+        self.messages = []
+        self.tokens = REPLY_PRIMING
+        self.dropped = 0
+
+    def remaining(self):
+        return self.budget - self.tokens
+
+    def add(self, role, content):
+        self.messages.append({"role": role, "content": content})
+        self.tokens += MESSAGE_OVERHEAD + count_tokens(content, self.model)
+        return self
+
+    def add_packed(self, role, header, items, separator="\n\n"):
+        room = self.remaining() - MESSAGE_OVERHEAD - count_tokens(header, self.model)
+        separator_tokens = count_tokens(separator, self.model)
+        items = list(items)
+        packed = []
+        for position, item in enumerate(items):
+            cost = count_tokens(item, self.model) + (separator_tokens if packed else 0)
+            if cost <= room:
+                packed.append(item)
+                room -= cost
+                continue
+            room -= separator_tokens if packed else 0
+            truncated = room >= MIN_TRUNCATED_TOKENS
+            if truncated:
+                packed.append(truncate(item, room, self.model))
+            self.dropped += len(items) - position - truncated
+            get_metrics().inc("prompt_truncations_total", call_site=self.call_site)
+            break
+        return self.add(role, header + separator.join(packed))
+
+    def build(self):
+        metrics = get_metrics()
+        metrics.observe("prompt_tokens", self.tokens, call_site=self.call_site)
+        if self.dropped:
+            metrics.inc("prompt_items_dropped_total", self.dropped, call_site=self.call_site)
+            logger.debug("Prompt for %s: %d tokens, %d items left out", self.call_site, self.tokens, self.dropped)
+        if self.tokens > self.budget:
+            logger.warning("Prompt for %s is %d tokens, over its %d token budget",
+                           self.call_site, self.tokens, self.budget)
+        return self.messages
@@ -0,0 +1,92 @@
+"""
+Message builders for each stage of the email pipeline.
+
+Kept separate from main.py so the interactive pipeline and the bulk (batch)
+mode send byte-identical prompts.
+"""
+import json
+
+from prompt_builder import PromptBuilder, tool_result_items
+from tools_schema import get_appointments_schema, get_available_slots_schema, read_knowledgebase_schema
+
+MODEL = "gpt-4o"
+
+def _email_header(email):
+    return (
+        f"From: {email.get('from', '')}\n"
+        f"Subject: {email.get('subject', '')}\n"
+        f"Date: {email.get('date', '')}\n"
+        f"Body: "
+    )
+
+def format_email(email):
+    """Renders the email fields the model sees"""
+    return _email_header(email) + email.get('body', '')
+
+def email_messages(call_site, system_prompt, email, model=MODEL):
+    """System prompt plus the email, with the body cut to fit the call site's budget"""
+    return (
+        PromptBuilder(call_site, model)
+        .add("system", system_prompt)
+        .add_packed("user", _email_header(email), [email.get('body', '')])
+        .build()
+    )
+
+def extraction_messages(email):
+    return email_messages(
+        "get_intent_and_extract_structured_data",
+        "You are a helpful assistant that reads an email and returns a JSON object "
+        "with 'email', 'date', and 'intent' fields. Example:\n"
+        '{ "email": "sender@example.com", "date": "2024-01-01", "intent": "Schedule Appointment" }',
+        email
+    )
+
+# Planner output is parsed and validated by plan_executor.parse_plan
+PLAN_RESPONSE_FORMAT = {"type": "json_object"}
+
+PLAN_TOOLS = (get_appointments_schema, get_available_slots_schema, read_knowledgebase_schema)
+
+def _tool_catalog():
+    return "\n".join(
+        f"- {schema['name']}: {schema['description']}. Arguments: "
+        + json.dumps(schema["parameters"]["properties"], separators=(",", ":"))
+        + f" (required: {', '.join(schema['parameters'].get('required', []))})"
+        for schema in PLAN_TOOLS
+    )
+
+def plan_messages(intent):
+    return (
+        PromptBuilder("create_handling_plan", MODEL)
+        .add(
+            "system",
+            "You are a helpful assistant that creates an execution plan of tool lookups needed to answer "
+            "a customer email. Reply with a JSON object only:\n"
+            '{"steps": [{"id": "kb", "tool": "read_knowledgebase", "arguments": {"keyword": "$query"}, '
+            '"depends_on": []}]}\n'
+            "Available tools:\n"
+            f"{_tool_catalog()}\n"
+            "Argument values may reference the email being answered: $email.date, $email.subject, "
+            "$email.from, $intent and $query (intent plus subject), or an earlier step's result, e.g. "
+            "$steps.slots.appointments.0.date (list the referenced step in depends_on). "
+            "Use only the steps that are needed; steps without dependencies run in parallel. "
+            "Do not include a step for sending the reply."
+        )
+        .add("user", f"The intent of the user is: {intent}. Please create a plan.")
+        .build()
+    )
+
+def finalize_messages(intent, tool_results):
+    """
+    Tool results go in as compact JSON and knowledge base passages, most
+    important first, packed into the finalize budget.
+    """
+    return (
+        PromptBuilder("finalize_response", MODEL)
+        .add(
+            "system",
+            "You are responding to a customer's request. You have the user's intent and any extra data from "
+            "tools. Provide a concise, friendly response suitable for an email body."
+        )
+        .add_packed("user", f"Intent: {intent}\n\nTool Results:\n", tool_result_items(tool_results))
+        .build()
+    )
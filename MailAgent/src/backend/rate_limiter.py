@@ -0,0 +1,237 @@
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def parse_duration(value):
+    """Parses OpenAI reset headers such as '1s', '6m0s' or '20ms' into seconds"""
+    if not value:
+        return None
+    matches = DURATION_RE.findall(value)
+    if not matches:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in matches)
+
+
+def _retry_after(error):
+    """Reads the server's retry hint from a failed response, in seconds"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return parse_duration(response.headers.get("retry-after"))
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Rough prompt + completion estimate (about four characters per token)"""
+    chars = sum(len(str(message.get("content") or "")) for message in messages)
+    return chars // 4 + len(messages) * 4 + (max_tokens or 512)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at capacity per `period` seconds"""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.period = period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        rate = self.capacity / self.period
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, amount, now, reserve=0.0):
+        """Seconds until `amount` tokens are available with `reserve` of the capacity left over (0 if they are now)"""
+        self._refill(now)
+        needed = min(amount + self.capacity * reserve, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) * self.period / self.capacity
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def sync(self, limit, remaining, now):
+        """Adopts the server's view of the limit and what is left of it"""
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+
+
+class RateLimitScheduler:
+    """
+    Admission control for chat completions under RPM and TPM quotas.
+
+    Each call waits, first come first served, until both buckets have room.
+    Buckets are re-synchronised from the x-ratelimit-* response headers,
+    token charges are settled against the real usage, and rate-limit and
+    transient errors are retried with jittered exponential backoff.
+
+    The mail pipeline is background work. The translator service shares the
+    same OpenAI quota from its own process, so `reserve` (a fraction of each
+    bucket, 20% by default) is never spent here: interactive translations
+    still find room while bulk email runs saturate the rest. The translator
+    admits its own calls (interactive before batch) and backs off on 429s
+    with PidginTranslator's rate_limiter.py; both sync from the same
+    x-ratelimit-* headers.
+    """
+
+    def __init__(self, rpm=500, tpm=30000, max_retries=5, base_delay=1.0, max_delay=60.0, reserve=0.0):
+        if not 0 <= reserve < 1:
+            raise ValueError("reserve must be in [0, 1)")
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0
+        self.stats = {"admitted": 0, "retries": 0, "rate_limited": 0, "waited_seconds": 0.0}
+
+    def acquire(self, estimated_tokens):
+        """Blocks until the request may be sent"""
+        ticket = next(self._sequence)
+        started = time.monotonic()
+        with self._cond:
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiters[0] == ticket:
+                        wait = max(
+                            self.requests.wait_time(1, now, self.reserve),
+                            self.tokens.wait_time(estimated_tokens, now, self.reserve),
+                            self._blocked_until - now
+                        )
+                        if wait <= 0:
+                            self.requests.consume(1)
+                            self.tokens.consume(estimated_tokens)
+                            self.stats["admitted"] += 1
+                            self.stats["waited_seconds"] += now - started
+                            return
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait(timeout=1.0)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Corrects the TPM bucket once the real usage is known"""
+        with self._cond:
+            bucket = self.tokens
+            bucket.tokens = min(bucket.capacity, bucket.tokens + estimated_tokens - actual_tokens)
+
+    def update_from_headers(self, headers):
+        now = time.monotonic()
+
+        def _number(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        with self._cond:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = _number(f"x-ratelimit-remaining-{kind}")
+                bucket.sync(_number(f"x-ratelimit-limit-{kind}"), remaining, now)
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if remaining is not None and remaining <= 0 and reset:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+
+    def _backoff(self, attempt, error):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        # Full jitter keeps many workers from retrying in lockstep
+        delay = random.uniform(0, delay)
+        retry_after = _retry_after(error)
+        if retry_after:
+            delay = max(delay, retry_after)
+        with self._cond:
+            self.stats["retries"] += 1
+            if isinstance(error, openai.RateLimitError):
+                self.stats["rate_limited"] += 1
+                # Pause everyone, not just this caller, until the window resets
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                self._cond.notify_all()
+        return delay
+
+    def call(self, send, estimated_tokens):
+        """
+        Runs `send()` under admission control and retries.
+
+        `send` must return a raw response (client.with_raw_response...) so the
+        rate-limit headers can be read; the parsed result is returned.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(estimated_tokens)
+            # A failed request is refunded; one without usage stays charged at the estimate
+            used = 0
+            try:
+                raw = send()
+                self.update_from_headers(raw.headers)
+                response = raw.parse()
+                usage = getattr(response, "usage", None)
+                used = usage.total_tokens if usage is not None else estimated_tokens
+                return response
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                self.settle(estimated_tokens, used)
+
+            delay = self._backoff(attempt, error)
+            logger.warning("OpenAI call failed (%s), retrying in %.1fs", type(error).__name__, delay)
+            time.sleep(delay)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide scheduler configured from the environment"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler(
+                rpm=int(os.getenv("MAILAGENT_OPENAI_RPM", "500")),
+                tpm=int(os.getenv("MAILAGENT_OPENAI_TPM", "30000")),
+                max_retries=int(os.getenv("MAILAGENT_OPENAI_RETRIES", "5")),
+                reserve=float(os.getenv("MAILAGENT_OPENAI_INTERACTIVE_RESERVE", "0.2"))
+            )
+        return _scheduler
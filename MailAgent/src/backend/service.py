@@ -0,0 +1,476 @@
+"""
+Long-running MailAgent service.
+
+Accepts inbound mail on a Mailgun-style inbound-route webhook (POST
+/inbound), optionally picks up emails appended to the inbox by other
+processes, and runs the regular pipeline on a warm worker pool, so a reply
+starts seconds after the email arrives instead of at the next cron run.
+
+Every accepted email is appended to the inbox log before the webhook
+answers 200, and moves from the log into a bounded in-memory queue in id
+order. When the queue is full the webhook answers 429 with Retry-After and
+Mailgun retries later. Mailgun event webhooks (POST /events) report
+delivery, bounces and complaints for sent replies back into the outbox.
+SIGTERM / SIGINT stop intake, let the workers finish what is queued (up to
+MAILAGENT_SERVICE_DRAIN_TIMEOUT seconds), then save the checkpoint and
+flush the stores; anything left over is picked up from the log on the next
+start.
+
+    cd MailAgent && python src/backend/service.py
+"""
+import hashlib
+import heapq
+import hmac
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email import message_from_bytes
+from email.policy import HTTP
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import main
+from engine import IDLE, ProcessingEngine, Watermark, email_ids
+from inbox_store import open_inbox
+from metrics import get_metrics
+from outbox import delivery_status, get_outbox
+
+logger = logging.getLogger(__name__)
+
+# Mailgun rejects webhook timestamps older than this to stop replays
+SIGNATURE_MAX_AGE = 15 * 60
+
+
+class InboundRejected(Exception):
+    """Raised for webhook requests that must not be retried as they are"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_form(content_type, body):
+    """Parses an urlencoded or multipart/form-data body into {field: value}, skipping files"""
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return dict(parse_qsl(body.decode("utf-8", errors="replace"), keep_blank_values=True))
+    if content_type.startswith("multipart/form-data"):
+        message = message_from_bytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body, policy=HTTP
+        )
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name and not part.get_filename():
+                payload = part.get_payload(decode=True) or b""
+                fields[name] = payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+        return fields
+    raise InboundRejected(415, f"Unsupported content type '{content_type}'")
+
+
+def verify_signature(signing_key, fields, max_age=SIGNATURE_MAX_AGE):
+    """Checks Mailgun's HMAC-SHA256 of timestamp + token against `signature`"""
+    timestamp, token, signature = fields.get("timestamp", ""), fields.get("token", ""), fields.get("signature", "")
+    if not (timestamp and token and signature):
+        return False
+    try:
+        if abs(time.time() - float(timestamp)) > max_age:
+            return False
+    except ValueError:
+        return False
+    expected = hmac.new(signing_key.encode("utf-8"), (timestamp + token).encode("utf-8"), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def inbound_email(fields):
+    """Maps Mailgun inbound-route fields onto the inbox email format"""
+    sender = fields.get("from") or fields.get("sender")
+    if not sender:
+        raise InboundRejected(400, "Inbound email has no sender")
+    try:
+        date = parsedate_to_datetime(fields["Date"]).isoformat() if fields.get("Date") else None
+    except (TypeError, ValueError):
+        date = None
+    if date is None:
+        try:
+            received = float(fields.get("timestamp") or time.time())
+        except ValueError:
+            received = time.time()
+        date = datetime.fromtimestamp(received, timezone.utc).isoformat(timespec="seconds")
+    email = {
+        "from": sender,
+        "date": date,
+        "subject": fields.get("subject") or fields.get("Subject") or "",
+        "body": fields.get("stripped-text") or fields.get("body-plain") or "",
+    }
+    if fields.get("Message-Id"):
+        email["message_id"] = fields["Message-Id"]
+    if fields.get("In-Reply-To"):
+        email["in_reply_to"] = fields["In-Reply-To"]
+    return email
+
+
+class MailAgentService:
+    """
+    Webhook intake, inbox watcher and worker pool around one InboxStore.
+
+    Ids only ever move from the inbox log into the queue through
+    `_feed()`, under one lock and in ascending order, so the watermark
+    never sees a later id finish before an earlier one was read.
+
+    An email that fails or times out is handed to the workers again after
+    `retry_delay` seconds (growing with each attempt); after `max_attempts`
+    it is moved to the checkpoint's dead-letter list so it stops holding
+    back `last_processed_id`. Attempts are counted per process, so a
+    restart gives failed emails a fresh set of attempts.
+    """
+
+    def __init__(self, store, handler, max_workers=4, queue_size=100, timeout=None, signing_key=None,
+                 watch_interval=None, idle_wait=0.1, retry_after=5, recent_message_ids=10000, outbox=None,
+                 max_attempts=3, retry_delay=30.0, checkpoint_every=100, checkpoint_interval=5.0):
+        self.store = store
+        self.outbox = outbox
+        self.signing_key = signing_key
+        self.watch_interval = watch_interval
+        self.idle_wait = idle_wait
+        self.retry_after = retry_after
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.engine = ProcessingEngine(handler, max_workers=max_workers, timeout=timeout)
+        checkpoint = store.load_checkpoint()
+        self.watermark = Watermark(
+            checkpoint["last_processed_id"], checkpoint["processed_ids"], checkpoint["dead_letter_ids"]
+        )
+        self.stats = {"accepted": 0, "duplicates": 0, "rejected": 0, "throttled": 0, "delivery_events": 0,
+                      "retried": 0, "dead_lettered": 0}
+        # Failed emails waiting for another attempt: heap of (due, id, email),
+        # and attempts so far by id. Both are only touched by the engine thread.
+        self._retries = []
+        self._attempts = {}
+        self.summary = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._feed_lock = threading.Lock()
+        self._last_queued_id = checkpoint["last_processed_id"]
+        # Message-Ids seen lately; Mailgun re-posts when an answer is slow
+        self._recent = OrderedDict()
+        self._recent_limit = recent_message_ids
+        self._stopping = threading.Event()
+        self._server = None
+        self._threads = []
+
+    def backlog(self):
+        """Emails stored but not yet handed to a worker"""
+        return self._queue.qsize() + self.store.count_after(self._last_queued_id)
+
+    def _feed(self):
+        """Moves stored emails into the queue, oldest first, while it has room. Caller holds _feed_lock."""
+        if self._queue.full():
+            return 0
+        moved = 0
+        for email in self.store.iter_after(self._last_queued_id):
+            if self._queue.full():
+                break
+            self._queue.put_nowait(email)
+            self._last_queued_id = email["id"]
+            moved += 1
+        return moved
+
+    def ingest(self, fields):
+        """
+        Verifies, stores and queues one inbound email. Returns (status, payload);
+        429 means the queue is full and nothing was stored.
+        """
+        if self._stopping.is_set():
+            return 503, {"error": "Service is shutting down"}
+        if self.signing_key and not verify_signature(self.signing_key, fields):
+            self.stats["rejected"] += 1
+            return 403, {"error": "Invalid signature"}
+        try:
+            email = inbound_email(fields)
+        except InboundRejected as e:
+            self.stats["rejected"] += 1
+            return e.status, {"error": str(e)}
+
+        with self._feed_lock:
+            message_id = email.get("message_id")
+            if message_id and message_id in self._recent:
+                self.stats["duplicates"] += 1
+                return 200, {"id": self._recent[message_id], "status": "duplicate"}
+            if self.backlog() >= self.queue_size:
+                self.stats["throttled"] += 1
+                get_metrics().inc("service_throttled_total")
+                return 429, {"error": "Queue is full", "retry_after": self.retry_after}
+            email_id = self.store.append(email)
+            if message_id:
+                self._recent[message_id] = email_id
+                if len(self._recent) > self._recent_limit:
+                    self._recent.popitem(last=False)
+            self._feed()
+            self.stats["accepted"] += 1
+        get_metrics().inc("service_accepted_total")
+        logger.info("Accepted inbound email %s from %s", email_id, email["from"])
+        return 200, {"id": email_id, "status": "queued"}
+
+    def delivery_event(self, payload):
+        """
+        Records one Mailgun event webhook ({"signature": {...}, "event-data": {...}})
+        on the outbox message it refers to. Returns (status, payload); events
+        about other messages or of other kinds are acknowledged and ignored.
+        """
+        if self.signing_key and not verify_signature(self.signing_key, payload.get("signature") or {}):
+            self.stats["rejected"] += 1
+            return 403, {"error": "Invalid signature"}
+        event = delivery_status(payload.get("event-data") or {})
+        if event is None:
+            return 200, {"status": "ignored"}
+        outbox_id, status = event
+        recorded = (self.outbox or get_outbox()).record_delivery(outbox_id, status)
+        self.stats["delivery_events"] += 1
+        get_metrics().inc("outbox_delivery_events_total", status=status)
+        logger.debug("Delivery event %s for outbox message %s (recorded: %s)", status, outbox_id, recorded)
+        return 200, {"status": "recorded" if recorded else "ignored"}
+
+    def health(self):
+        return {
+            "status": "stopping" if self._stopping.is_set() else "ok",
+            "queued": self._queue.qsize(),
+            "backlog": self.backlog(),
+            "retrying": len(self._retries),
+            **self.stats,
+        }
+
+    def _emails(self):
+        """Open-ended email source for the engine; ends once stopping and the queue is empty"""
+        while True:
+            if self._retries and self._retries[0][0] <= time.monotonic() and not self._stopping.is_set():
+                yield heapq.heappop(self._retries)[2]
+                continue
+            try:
+                email = self._queue.get(timeout=self.idle_wait)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                yield IDLE
+                continue
+            # Top the queue up from the log now that there is room
+            with self._feed_lock:
+                self._feed()
+            if not self.watermark.is_done(email["id"]):
+                yield email
+
+    def _watch(self):
+        """Picks up emails appended to the inbox by other processes (and any startup backlog)"""
+        while not self._stopping.wait(self.watch_interval):
+            with self._feed_lock:
+                moved = self._feed()
+            if moved:
+                logger.info("Queued %d emails from the inbox log", moved)
+
+    def _on_result(self, email, outcome):
+        """Schedules a failed or timed-out email for another attempt, or dead-letters it"""
+        email_id = email["id"]
+        if outcome == "succeeded":
+            self._attempts.pop(email_id, None)
+            return
+        if outcome == "cancelled":
+            # Shutting down; the email is retried from the log on the next start
+            return
+        attempts = self._attempts.get(email_id, 0) + 1
+        if attempts < self.max_attempts:
+            self._attempts[email_id] = attempts
+            heapq.heappush(self._retries, (time.monotonic() + self.retry_delay * attempts, email_id, email))
+            self.stats["retried"] += 1
+            logger.warning("Email %s %s (attempt %d of %d), retrying", email_id, outcome, attempts,
+                           self.max_attempts)
+            return
+        self._attempts.pop(email_id, None)
+        for unit_id in email_ids(email):
+            self.watermark.dead_letter(unit_id)
+        self.stats["dead_lettered"] += 1
+        get_metrics().inc("service_dead_lettered_total")
+        logger.error("Email %s %s %d times, moved to the dead-letter list", email_id, outcome, attempts)
+
+    def _checkpoint(self, watermark):
+        self.store.save_checkpoint(*watermark.checkpoint(), dead_letter_ids=watermark.dead_letters)
+        main.get_extraction_store().flush()
+
+    def _work(self):
+        try:
+            self.summary = self.engine.run(
+                self._emails(),
+                self.watermark,
+                on_checkpoint=self._checkpoint,
+                checkpoint_every=self.checkpoint_every,
+                checkpoint_interval=self.checkpoint_interval,
+                on_result=self._on_result
+            )
+        except Exception as e:
+            logger.error("Service workers stopped: %s", e)
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            max_body = int(os.getenv("MAILAGENT_SERVICE_MAX_BODY", str(25 * 1024 * 1024)))
+
+            def log_message(self, format, *args):
+                logger.debug("%s - %s", self.address_string(), format % args)
+
+            def _reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/health":
+                    self._reply(200, service.health())
+                else:
+                    self._reply(404, {"error": "Not found"})
+
+            def do_POST(self):
+                path = self.path.rstrip("/")
+                if path not in ("/inbound", "/messages", "/events"):
+                    self._reply(404, {"error": "Not found"})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > self.max_body:
+                    self.close_connection = True
+                    self._reply(413, {"error": "Request body too large"})
+                    return
+                try:
+                    body = self.rfile.read(length)
+                    if path == "/events":
+                        try:
+                            status, payload = service.delivery_event(json.loads(body))
+                        except (ValueError, AttributeError):
+                            raise InboundRejected(400, "Event webhook body is not a JSON object")
+                    else:
+                        fields = parse_form(self.headers.get("Content-Type", ""), body)
+                        status, payload = service.ingest(fields)
+                except InboundRejected as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    logger.error("Failed to handle %s webhook: %s", path, e)
+                    status, payload = 500, {"error": "Internal error"}
+                headers = {"Retry-After": str(service.retry_after)} if status in (429, 503) else None
+                self._reply(status, payload, headers)
+
+        return Handler
+
+    def start(self, host="127.0.0.1", port=8080):
+        """Starts the workers, the webhook server and (with watch_interval) the inbox watcher"""
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        with self._feed_lock:
+            self._feed()
+        self._threads.append(threading.Thread(target=self._work, name="service-engine", daemon=True))
+        if self.watch_interval:
+            self._threads.append(threading.Thread(target=self._watch, name="inbox-watcher", daemon=True))
+        self._threads.append(threading.Thread(target=self._server.serve_forever, name="webhook", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logger.info("MailAgent service listening on http://%s:%s/inbound", host, self._server.server_address[1])
+        return self
+
+    @property
+    def port(self):
+        return self._server.server_address[1] if self._server else None
+
+    def stop(self, drain_timeout=60.0):
+        """
+        Stops intake, waits up to `drain_timeout` seconds for queued and
+        in-flight emails, cancels whatever is still running and saves the
+        checkpoint. Emails left in the log are processed on the next start.
+        """
+        logger.info("Stopping service; draining %d queued emails", self._queue.qsize())
+        self._stopping.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        engine_thread = self._threads[0] if self._threads else None
+        if engine_thread is not None:
+            engine_thread.join(drain_timeout)
+            if engine_thread.is_alive():
+                logger.warning("Drain exceeded %ss, cancelling in-flight emails", drain_timeout)
+                self.engine.cancel()
+                engine_thread.join()
+        for thread in self._threads[1:]:
+            thread.join()
+        self._checkpoint(self.watermark)
+        return self.summary
+
+
+def run_service():
+    """Runs the service until SIGTERM / SIGINT"""
+    store = open_inbox(
+        os.getenv("MAILAGENT_INBOX_DIR", "customer_req"),
+        legacy_path=os.getenv("MAILAGENT_LEGACY_INBOX", "customer_req/incoming_emails.json")
+    )
+    mode = os.getenv("MAILAGENT_MODE", "pipeline")
+    if mode == "pipeline":
+        main.load_intent_classifier()
+    main.start_outbox_dispatcher()
+
+    timeout = os.getenv("MAILAGENT_EMAIL_TIMEOUT")
+    watch_interval = os.getenv("MAILAGENT_SERVICE_WATCH_INTERVAL", "5")
+    service = MailAgentService(
+        store,
+        main.process_email_agent if mode == "agent" else main.process_email,
+        max_workers=int(os.getenv("MAILAGENT_MAX_WORKERS", "4")),
+        queue_size=int(os.getenv("MAILAGENT_SERVICE_QUEUE_SIZE", "100")),
+        timeout=float(timeout) if timeout else None,
+        signing_key=os.getenv("MAILGUN_WEBHOOK_SIGNING_KEY"),
+        watch_interval=float(watch_interval) if float(watch_interval) > 0 else None,
+        retry_after=int(os.getenv("MAILAGENT_SERVICE_RETRY_AFTER", "5")),
+        max_attempts=int(os.getenv("MAILAGENT_SERVICE_MAX_ATTEMPTS", "3")),
+        retry_delay=float(os.getenv("MAILAGENT_SERVICE_RETRY_DELAY", "30")),
+        checkpoint_every=int(os.getenv("MAILAGENT_SERVICE_CHECKPOINT_EVERY", "100")),
+        checkpoint_interval=float(os.getenv("MAILAGENT_SERVICE_CHECKPOINT_INTERVAL", "5"))
+    )
+    if not service.signing_key:
+        logger.warning("MAILGUN_WEBHOOK_SIGNING_KEY is not set; inbound webhooks are not verified")
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    summary = None
+    try:
+        service.start(
+            os.getenv("MAILAGENT_SERVICE_HOST", "127.0.0.1"),
+            int(os.getenv("MAILAGENT_SERVICE_PORT", "8080"))
+        )
+        stop.wait()
+    finally:
+        summary = service.stop(drain_timeout=float(os.getenv("MAILAGENT_SERVICE_DRAIN_TIMEOUT", "60")))
+        logger.info("Service summary: %s, intake: %s", summary, service.stats)
+        if service.watermark.failed:
+            logger.warning("Emails to retry on next start: %s", service.watermark.failed)
+        if service.stats["dead_lettered"]:
+            logger.warning("Emails moved to the dead-letter list: %s", service.watermark.dead_letters)
+        main.stop_outbox_dispatcher()
+        main.write_run_metrics("service", summary)
+        main.close_clients()
+
+
+if __name__ == "__main__":
+    try:
+        run_service()
+    except Exception as e:
+        logger.critical("Service failed: %s", e)
+        raise
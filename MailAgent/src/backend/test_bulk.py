@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from batch import BulkJob, LocalBatchBackend
+from engine import Watermark
+from extraction_store import ExtractionStore
+
+
+class Interrupted(BaseException):
+    """Stands in for a crash: not caught by the job's per-email error handling"""
+
+
+def responder(body):
+    system = body["messages"][0]["content"]
+    if "response_format" in body:
+        content = json.dumps({"steps": []})
+    elif "JSON object with 'email'" in system:
+        sender = body["messages"][1]["content"].split("From: ")[1].split("\n")[0]
+        content = json.dumps({"email": sender, "date": "2024-01-01", "intent": "Refund"})
+    else:
+        content = "Your refund is on its way."
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def make_emails(count):
+    return [
+        {"id": i, "from": f"user{i}@example.com", "subject": f"Refund {i}", "body": "Please refund me"}
+        for i in range(1, count + 1)
+    ]
+
+
+def make_job(tmp_path):
+    return BulkJob(str(tmp_path / "bulk"), LocalBatchBackend(responder, str(tmp_path / "local")), poll_interval=0)
+
+
+def test_bulk_job_runs_every_stage(tmp_path):
+    sent = []
+    emails = make_emails(3)
+    outcome = make_job(tmp_path).run(
+        emails,
+        execute_plan=lambda plan, query, email, intent: {},
+        save_extraction=lambda data, email: None,
+        send=lambda email, extracted, text: sent.append((email["id"], extracted["email"], text))
+    )
+    assert outcome == {1: None, 2: None, 3: None}
+    assert sent == [(i, f"user{i}@example.com", "Your refund is on its way.") for i in (1, 2, 3)]
+
+
+def execute_plan(plan, query, email, intent):
+    return {}
+
+
+def test_resume_after_a_crash_in_extraction_keeps_one_record_per_email(tmp_path):
+    store = ExtractionStore(str(tmp_path / "extractions.db"), batch_size=1)
+    emails = make_emails(4)
+
+    def save(data, email):
+        store.add(data, email_id=email["id"], subject=email["subject"])
+
+    def save_crashing_on_third(data, email):
+        save(data, email)
+        if email["id"] == 3:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        make_job(tmp_path).run(emails, execute_plan, save_crashing_on_third, lambda *args: None)
+    # Emails 1-3 were committed before the crash; resuming extracts them again
+    outcome = make_job(tmp_path).run(emails, execute_plan, save, lambda *args: None)
+    assert outcome == {1: None, 2: None, 3: None, 4: None}
+    assert sorted(record["email_id"] for record in store.query()) == [1, 2, 3, 4]
+    store.close()
+
+
+def test_resume_after_a_crash_in_sending_sends_each_reply_once(tmp_path):
+    emails = make_emails(4)
+    sent = []
+
+    def send_crashing_on_third(email, extracted, text):
+        if email["id"] == 3:
+            raise Interrupted()
+        sent.append(email["id"])
+
+    with pytest.raises(Interrupted):
+        make_job(tmp_path).run(emails, execute_plan, lambda *args: None, send_crashing_on_third)
+    assert sent == [1, 2]
+    make_job(tmp_path).run(emails, execute_plan, lambda *args: None, lambda email, *args: sent.append(email["id"]))
+    assert sent == [1, 2, 3, 4]
+
+
+def test_resume_with_newer_emails_settles_the_saved_ones_and_defers_the_rest(tmp_path):
+    emails = make_emails(3)
+
+    def send_crashing_on_second(email, extracted, text):
+        if email["id"] == 2:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        make_job(tmp_path).run(emails, execute_plan, lambda *args: None, send_crashing_on_second)
+
+    # Two more emails arrived before the job was resumed
+    watermark = Watermark()
+    job = make_job(tmp_path)
+    units = job.track(make_emails(5), watermark)
+    assert units == {1: [1], 2: [2], 3: [3]}
+    outcome = job.run(make_emails(5), execute_plan, lambda *args: None, lambda *args: None)
+    for email_id, error in outcome.items():
+        (watermark.succeed if error is None else watermark.fail)(email_id)
+    # Nothing is left pending, and 4 and 5 are not skipped
+    assert watermark.checkpoint() == (3, [])
+    assert not watermark.is_done(4)
+
+    fresh = Watermark(*watermark.checkpoint())
+    assert make_job(tmp_path).track(make_emails(5)[3:], fresh) == {4: [4], 5: [5]}
+    assert fresh._exhausted
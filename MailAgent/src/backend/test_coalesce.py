@@ -0,0 +1,46 @@
+from coalesce import coalesce
+
+
+def make_email(email_id, subject, minute, sender="alice@example.com", **extra):
+    return {
+        "id": email_id,
+        "from": f"Alice <{sender}>",
+        "subject": subject,
+        "date": f"2024-01-01T10:{minute:02d}:00",
+        "body": f"Body {email_id}",
+        **extra
+    }
+
+
+def units(emails, **kwargs):
+    return [unit.get("ids", [unit["id"]]) for unit in coalesce(emails, **kwargs)]
+
+
+def test_unrelated_emails_from_one_sender_stay_separate():
+    emails = [make_email(1, "Book appointment", 0), make_email(2, "Refund for order 55", 1)]
+    assert units(emails) == [[1], [2]]
+
+
+def test_follow_ups_on_the_same_subject_or_thread_are_merged():
+    emails = [
+        make_email(1, "Refund for order 55", 0, message_id="<a@x>"),
+        make_email(2, "Book appointment", 1, sender="bob@example.com"),
+        make_email(3, "Re: Refund for order 55", 2),
+        make_email(4, "One more thing", 3, in_reply_to="<a@x>"),
+    ]
+    merged = list(coalesce(emails))
+    assert [unit.get("ids", [unit["id"]]) for unit in merged] == [[2], [1, 3, 4]]
+    assert merged[1]["id"] == 1 and "--- Message 3 of 3" in merged[1]["body"]
+
+
+def test_groups_idle_past_the_window_are_not_extended():
+    emails = [
+        make_email(1, "Refund for order 55", 0),
+        make_email(2, "Unrelated", 40, sender="bob@example.com"),
+        make_email(3, "Refund for order 55", 45),
+    ]
+    assert units(emails, window=600) == [[1], [2], [3]]
+
+
+def test_empty_subjects_do_not_match():
+    assert units([make_email(1, "", 0), make_email(2, "Re:", 1)]) == [[1], [2]]
@@ -0,0 +1,147 @@
+import threading
+import time
+
+from engine import EmailCancelled, ProcessingEngine, Watermark
+
+
+def emails(*ids):
+    return [{"id": email_id} for email_id in ids]
+
+
+def test_watermark_stops_at_a_gap():
+    watermark = Watermark()
+    for email_id in (1, 2, 3, 4):
+        watermark.track(email_id)
+    watermark.mark_exhausted()
+    watermark.succeed(1)
+    watermark.fail(2)
+    watermark.succeed(3)
+    watermark.succeed(4)
+    assert watermark.checkpoint() == (1, [3, 4])
+    assert watermark.failed == [2]
+
+
+def test_watermark_does_not_pass_untracked_ids_before_exhausted():
+    watermark = Watermark(last_processed_id=5, processed_ids=[3, 7])
+    assert watermark.is_done(3) and watermark.is_done(7) and not watermark.is_done(6)
+    watermark.track(6)
+    watermark.succeed(6)
+    # 8 and beyond were never read, so 7 must stay listed
+    assert watermark.checkpoint() == (6, [7])
+    watermark.mark_exhausted()
+    assert watermark.checkpoint() == (7, [])
+
+
+def test_engine_records_failures_without_skipping_them():
+    def handler(email, cancel_event):
+        if email["id"] == 2:
+            raise RuntimeError("boom")
+
+    watermark = Watermark()
+    summary = ProcessingEngine(handler, max_workers=2, poll_interval=0.01).run(emails(1, 2, 3), watermark)
+    assert summary["succeeded"] == 2 and summary["failed"] == 1
+    assert summary["failed_ids"] == [2]
+    assert watermark.checkpoint() == (1, [3])
+
+
+def test_timed_out_email_is_counted_once():
+    def handler(email, cancel_event):
+        if not cancel_event.wait(2):
+            return
+        raise EmailCancelled("timed out")
+
+    summary = ProcessingEngine(handler, max_workers=1, timeout=0.05, poll_interval=0.01).run(emails(1), Watermark())
+    assert summary["timed_out"] == 1
+    assert summary["cancelled"] == 0
+    assert summary["failed_ids"] == [1]
+
+
+def test_late_success_after_timeout_counts_as_success():
+    def handler(email, cancel_event):
+        time.sleep(0.1)
+
+    watermark = Watermark()
+    summary = ProcessingEngine(handler, max_workers=1, timeout=0.02, poll_interval=0.01).run(emails(1), watermark)
+    assert summary["succeeded"] == 1 and summary["timed_out"] == 0
+    assert watermark.checkpoint() == (1, [])
+
+
+def test_cancel_stops_in_flight_and_queued_emails():
+    started = threading.Event()
+
+    def handler(email, cancel_event):
+        started.set()
+        cancel_event.wait(2)
+        raise EmailCancelled("shutdown")
+
+    engine = ProcessingEngine(handler, max_workers=1, poll_interval=0.01)
+    threading.Thread(target=lambda: started.wait(2) and engine.cancel()).start()
+    watermark = Watermark()
+    summary = engine.run(emails(1, 2, 3), watermark)
+    assert summary["succeeded"] == 0
+    # Email 2 may or may not have been queued before the cancel; either way nothing is lost
+    assert summary["cancelled"] == len(summary["failed_ids"]) >= 1
+    assert watermark.checkpoint() == (0, [])
+
+
+def test_checkpoint_compacts_the_watermark():
+    watermark = Watermark()
+    for email_id in range(1, 1001):
+        watermark.track(email_id)
+        watermark.succeed(email_id)
+    assert watermark.checkpoint() == (1000, [])
+    assert not watermark._done and not watermark._pending
+    assert watermark.is_done(500) and not watermark.is_done(1001)
+
+
+def test_dead_lettered_ids_stop_blocking_the_checkpoint():
+    watermark = Watermark(dead_letter_ids=[0])
+    for email_id in (1, 2, 3):
+        watermark.track(email_id)
+    watermark.mark_exhausted()
+    watermark.fail(1)
+    watermark.succeed(2)
+    watermark.succeed(3)
+    assert watermark.checkpoint() == (0, [2, 3])
+    watermark.dead_letter(1)
+    assert watermark.checkpoint() == (3, [])
+    assert watermark.failed == [] and watermark.dead_letters == [0, 1]
+
+
+def test_engine_reports_results_and_checkpoints_on_a_timer():
+    results = []
+    checkpoints = []
+
+    def handler(email, cancel_event):
+        if email["id"] == 2:
+            raise RuntimeError("boom")
+        time.sleep(0.03)
+
+    watermark = Watermark()
+    summary = ProcessingEngine(handler, max_workers=1, poll_interval=0.01).run(
+        emails(1, 2, 3),
+        watermark,
+        on_checkpoint=lambda wm: checkpoints.append(wm.checkpoint()),
+        checkpoint_every=100,
+        checkpoint_interval=0.02,
+        on_result=lambda email, outcome: results.append((email["id"], outcome))
+    )
+    # Emails finishing in the same wait() may be reported in any order
+    assert sorted(results) == [(1, "succeeded"), (2, "failed"), (3, "succeeded")]
+    assert summary["succeeded"] == 2
+    # Far fewer than 100 emails finished, yet progress was saved
+    assert checkpoints and all(checkpoint in ((0, []), (1, []), (1, [3])) for checkpoint in checkpoints)
+    assert watermark.checkpoint() == (1, [3])
+
+
+def test_timed_out_result_is_reported_as_timed_out():
+    results = []
+
+    def handler(email, cancel_event):
+        cancel_event.wait(2)
+        raise EmailCancelled("timed out")
+
+    ProcessingEngine(handler, max_workers=1, timeout=0.05, poll_interval=0.01).run(
+        emails(1), Watermark(), on_result=lambda email, outcome: results.append((email["id"], outcome))
+    )
+    assert results == [(1, "timed_out")]
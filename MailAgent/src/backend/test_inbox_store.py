@@ -0,0 +1,56 @@
+import multiprocessing
+
+import pytest
+
+from inbox_store import InboxStore, fcntl
+
+
+def append_emails(directory, writer, count):
+    store = InboxStore(directory)
+    for i in range(count):
+        store.append({"from": f"writer{writer}@example.com", "subject": f"Message {i}", "body": ""})
+
+
+def test_append_and_read_after(tmp_path):
+    store = InboxStore(str(tmp_path))
+    assert store.extend([{"subject": "a"}, {"subject": "b"}]) == [1, 2]
+    assert store.append({"id": 10, "subject": "c"}) == 10
+    with pytest.raises(ValueError):
+        store.append({"id": 5})
+    assert [email["id"] for email in store.iter_after(1)] == [2, 10]
+    assert store.count_after(2) == 1 and store.get(10)["subject"] == "c"
+
+
+@pytest.mark.skipif(fcntl is None, reason="inter-process locking needs fcntl")
+def test_concurrent_processes_never_reuse_an_id(tmp_path):
+    writers = [
+        multiprocessing.Process(target=append_emails, args=(str(tmp_path), writer, 50))
+        for writer in range(4)
+    ]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join(30)
+        assert process.exitcode == 0
+
+    store = InboxStore(str(tmp_path))
+    ids = [email["id"] for email in store.iter_after(0)]
+    assert ids == list(range(1, 201))
+    assert store.count_after(100) == 100 and store.get(150)["id"] == 150
+
+
+def test_checkpoint_keeps_dead_letters_unless_replaced(tmp_path):
+    store = InboxStore(str(tmp_path))
+    store.save_checkpoint(3, [5], dead_letter_ids=[4])
+    store.save_checkpoint(5, [])
+    assert store.load_checkpoint() == {"last_processed_id": 5, "processed_ids": [], "dead_letter_ids": [4]}
+
+
+def test_readers_stop_at_the_indexed_records(tmp_path):
+    store = InboxStore(str(tmp_path))
+    store.extend([{"subject": "a"}, {"subject": "b"}])
+    # Another process is half-way through appending: log written, index not yet
+    with open(store.log_path, 'ab') as log_file:
+        log_file.write(b'{"id":3,"subject":"c"}\n{"id":4,"subj')
+    assert [email["id"] for email in store.iter_after(0)] == [1, 2]
+    assert store.get(2)["subject"] == "b"
@@ -0,0 +1,58 @@
+from intent_classifier import SOURCE, IntentClassifier, load_or_train
+
+EXAMPLES = (
+    [(f"Book an appointment for {day}", "Book Appointment") for day in ("Monday", "Tuesday", "Friday")] * 4
+    + [(f"Refund request for order {n}", "Refund Request") for n in range(12)]
+    # Spelling variants are merged into the most common form
+    + [("book appointment please", "book appointment")]
+)
+
+
+class Store:
+    def __init__(self, examples):
+        self.examples = examples
+
+    def training_examples(self, limit, exclude_source):
+        assert exclude_source == SOURCE
+        return self.examples[:limit]
+
+
+def email(subject):
+    return {"from": "Ada <ada@example.com>", "date": "Tue, 06 Feb 2024 09:30:00 +0000", "subject": subject}
+
+
+def test_confident_prediction_is_answered_locally():
+    model = IntentClassifier.train(EXAMPLES, threshold=0.9)
+    assert model.labels == ["Book Appointment", "Refund Request"]
+
+    data = model.classify(email("Re: book an appointment"))
+    assert data["intent"] == "Book Appointment"
+    assert data["confidence"] >= 0.9
+    assert data == {
+        "email": "ada@example.com", "date": "2024-02-06", "intent": "Book Appointment",
+        "source": SOURCE, "confidence": data["confidence"]
+    }
+
+
+def test_uncertain_or_unparseable_emails_fall_back_to_the_llm():
+    model = IntentClassifier.train(EXAMPLES, threshold=0.9)
+    # classify() returning None is what sends the email to the LLM extraction
+    intent, confidence = model.predict("appointment refund")
+    assert confidence < 0.9
+    assert model.classify(email("appointment refund")) is None
+    assert model.classify(email("Quarterly newsletter")) is None
+    assert model.classify({**email("Book an appointment"), "from": "not an address"}) is None
+
+    # The same prediction is answered locally once the threshold allows it
+    model.threshold = confidence
+    assert model.classify(email("appointment refund"))["intent"] == intent
+
+
+def test_model_trains_once_enough_extractions_exist_and_reloads(tmp_path):
+    path = str(tmp_path / "intent_model.json")
+    assert load_or_train(Store(EXAMPLES[:3]), path, min_examples=10) is None
+
+    trained = load_or_train(Store(EXAMPLES), path, min_examples=10)
+    loaded = load_or_train(Store([]), path, min_examples=10)
+    subject = "Book an appointment for Monday"
+    assert loaded.predict(subject) == trained.predict(subject)
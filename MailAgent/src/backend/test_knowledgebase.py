@@ -0,0 +1,57 @@
+import os
+
+from knowledgebase import KnowledgeBaseIndex, tokenize
+
+KNOWLEDGEBASE = """# Appointments
+
+Appointments can be booked Monday to Friday. Rescheduling an appointment is free.
+
+Appointments last thirty minutes.
+
+# Refunds
+
+Refunds are paid within five working days of cancelling an appointment.
+
+# Pricing
+
+A consultation costs 50 euros.
+"""
+
+
+def write(tmp_path, text):
+    path = tmp_path / "knowledgebase.md"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_tokenize_stems_and_drops_stopwords():
+    assert tokenize("The appointments and pricing") == tokenize("appointment price")
+
+
+def test_search_ranks_by_bm25_and_cuts_off_at_top_k(tmp_path):
+    index = KnowledgeBaseIndex(write(tmp_path, KNOWLEDGEBASE))
+
+    results = index.search("reschedule appointment", top_k=10)
+    # The paragraph matching both terms wins; the rarer term outweighs repeats of the common one
+    assert [result["text"][:20] for result in results] == [
+        "Appointments can be ", "Appointments last th", "Refunds are paid wit",
+    ]
+    scores = [result["score"] for result in results]
+    assert scores == sorted(scores, reverse=True)
+
+    assert index.search("reschedule appointment", top_k=2) == results[:2]
+    assert [result["heading"] for result in index.search("refund", top_k=1)] == ["Refunds"]
+    assert index.search("parking") == []
+
+
+def test_edited_file_is_reindexed(tmp_path):
+    path = write(tmp_path, KNOWLEDGEBASE)
+    index = KnowledgeBaseIndex(path)
+    assert index.search("parking") == []
+
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("\n# Parking\n\nFree parking is available behind the building.\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert [result["heading"] for result in index.search("parking")] == ["Parking"]
+    assert len(index.all_chunks()) == 5
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+from inbox_store import InboxStore
+from lease_store import LeaseStore
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    store = InboxStore(str(tmp_path / "inbox"))
+    store.extend([{"subject": f"Email {i}"} for i in range(1, 21)])
+    return store
+
+
+@pytest.fixture
+def connect(tmp_path):
+    """Opens LeaseStores on one database, each with its own connection, as separate workers would"""
+    opened = []
+
+    def _connect(**kwargs):
+        leases = LeaseStore(str(tmp_path / "leases.db"), **kwargs)
+        opened.append(leases)
+        return leases
+
+    yield _connect
+    for leases in opened:
+        leases.close()
+
+
+def test_concurrent_claims_never_share_an_email(inbox, connect):
+    first, second = connect(), connect()
+    assert first.sync(inbox) == 20 and second.sync(inbox) == 0
+    claimed = {"first": [], "second": []}
+
+    def claim_all(leases, name):
+        while True:
+            ids = leases.claim(name, limit=3)
+            if not ids:
+                return
+            claimed[name].extend(ids)
+
+    threads = [threading.Thread(target=claim_all, args=(first, "first")),
+               threading.Thread(target=claim_all, args=(second, "second"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed["first"] + claimed["second"]) == list(range(1, 21))
+    assert first.counts() == {"leased": 20}
+
+
+def test_expired_lease_is_reclaimed_and_the_old_owner_cannot_settle_it(inbox, connect):
+    crashed, survivor = connect(lease_seconds=0.05), connect(lease_seconds=60)
+    crashed.sync(inbox)
+    assert crashed.claim("crashed", limit=2) == [1, 2]
+    # Live leases are not handed out twice
+    assert survivor.claim("survivor", limit=2) == [3, 4]
+
+    time.sleep(0.1)
+    assert survivor.claim("survivor", limit=2) == [1, 2]
+    assert crashed.renew("crashed") == 0
+    assert not crashed.complete("crashed", 1)
+    assert not crashed.fail("crashed", 2, "boom")
+    assert survivor.complete("survivor", 1)
+    assert survivor.fail("survivor", 2, "boom")
+    assert survivor.counts() == {"done": 1, "pending": 17, "leased": 2}
+
+
+def test_lease_given_up_after_max_attempts(inbox, connect):
+    leases = connect(lease_seconds=0.01, max_attempts=2)
+    leases.sync(inbox, limit=1)
+    for _ in range(2):
+        assert leases.claim("worker", limit=1) == [1]
+        time.sleep(0.02)
+    assert leases.claim("worker", limit=1) == []
+    assert leases.counts() == {"failed": 1}
+
+
+def test_guard_send_refuses_after_the_lease_was_lost(inbox, connect):
+    slow, fast = connect(lease_seconds=0.05), connect(lease_seconds=60)
+    slow.sync(inbox, limit=1)
+    assert slow.claim("slow", limit=1) == [1]
+    time.sleep(0.1)
+    assert fast.claim("fast", limit=1) == [1]
+    assert fast.guard_send(1, "fast")
+    assert fast.complete("fast", 1)
+    # The slow worker finishes its stale copy: its reply is refused
+    assert not slow.guard_send(1, "slow")
+    assert not slow.complete("slow", 1)
+
+
+def test_checkpoint_reflects_the_lease_table(inbox, connect):
+    leases = connect()
+    leases.sync(inbox)
+    leases.claim("worker", limit=4)
+    for email_id in (1, 2, 4):
+        leases.complete("worker", email_id)
+    assert leases.write_checkpoint(inbox) == (2, [4])
+    assert inbox.load_checkpoint()["processed_ids"] == [4]
+    # A fresh lease table starts from the inbox checkpoint
+    inbox.extend([{"subject": "Email 21"}])
+    other = LeaseStore(str(inbox.directory) + "/other.db")
+    try:
+        assert other.sync(inbox) == 19
+        assert other.claim("worker", limit=2) == [3, 5]
+    finally:
+        other.close()
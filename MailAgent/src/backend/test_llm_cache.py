@@ -0,0 +1,85 @@
+import pytest
+from openai.types.chat import ChatCompletion
+
+import llm
+from llm_cache import LLMCache, make_key
+
+MESSAGES = [{"role": "system", "content": "Plan"}, {"role": "user", "content": "Can I book a slot?"}]
+
+
+def completion(content):
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    })
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    """Points llm at a fresh cache and a fake upstream that counts its calls"""
+    calls = []
+
+    def create(client, call_site, params):
+        calls.append(call_site)
+        return completion(f"reply {len(calls)}")
+
+    monkeypatch.delenv("MAILAGENT_LLM_CACHE", raising=False)
+    monkeypatch.setattr(llm, "_cache", LLMCache(str(tmp_path / "llm_cache.db")))
+    monkeypatch.setattr(llm, "get_openai_client", lambda: None)
+    monkeypatch.setattr(llm, "_create", create)
+    return calls
+
+
+def test_key_is_stable_across_key_order_and_whitespace():
+    key = make_key("gpt-4o", MESSAGES, temperature=0.2, max_tokens=100)
+    reordered = [{"content": " Plan\n", "role": "system"}, {"content": "Can I book a slot?  ", "role": "user"}]
+    assert make_key("gpt-4o", reordered, max_tokens=100, temperature=0.2) == key
+    assert make_key("gpt-4o", MESSAGES, temperature=0.7, max_tokens=100) != key
+    assert make_key("gpt-4o-mini", MESSAGES, temperature=0.2, max_tokens=100) != key
+
+
+def test_cache_hits_from_memory_and_disk_and_misses_after_expiry(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    cache = LLMCache(path)
+    assert cache.get("k", label="plan") is None
+    cache.set("k", "value", latency=1.5, tokens=40)
+    cache.set("old", "value", ttl=0)
+    assert cache.get("k", label="plan") == "value"
+    assert cache.get("old", label="plan") is None
+
+    # A new process only has the disk tier
+    reopened = LLMCache(path)
+    assert reopened.get("k", label="plan") == "value"
+    assert reopened.get("k", label="plan") == "value"
+
+    assert cache.stats()["plan"] == {
+        "hits_memory": 1, "hits_disk": 0, "misses": 2, "saved_seconds": 1.5, "saved_tokens": 40
+    }
+    assert reopened.stats()["plan"]["hits_disk"] == 1
+    assert reopened.stats()["plan"]["hits_memory"] == 1
+
+
+def test_cacheable_call_site_is_served_from_cache(upstream):
+    params = {"model": "gpt-4o", "messages": MESSAGES, "temperature": 0.2}
+    first = llm.chat_completion("create_handling_plan", **params)
+    second = llm.chat_completion("create_handling_plan", **params)
+
+    assert upstream == ["create_handling_plan"]
+    assert second.choices[0].message.content == first.choices[0].message.content == "reply 1"
+    assert llm.get_cache().stats()["create_handling_plan"]["hits_memory"] == 1
+
+
+def test_call_sites_outside_cache_policy_always_go_upstream(upstream):
+    params = {"model": "gpt-4o", "messages": MESSAGES, "temperature": 0.2}
+    assert llm.CACHE_POLICY["get_intent_and_extract_structured_data"] is False
+    for call_site in ("get_intent_and_extract_structured_data", "agent", "unlisted"):
+        llm.chat_completion(call_site, **params)
+        llm.chat_completion(call_site, **params)
+
+    assert len(upstream) == 6
+    assert llm.get_cache().stats()["total"]["hits_memory"] == 0
+    # An explicit opt-in overrides the policy
+    llm.chat_completion("agent", use_cache=True, **params)
+    llm.chat_completion("agent", use_cache=True, **params)
+    assert len(upstream) == 7
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import clients
+from mailgun_stub import MailgunStub
+from outbox import MailgunSender, Outbox, OutboxDispatcher, delivery_status
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = MailgunStub(port=0).start()
+    monkeypatch.setattr(clients, "MAILGUN_API_BASE", stub.url)
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    yield outbox
+    outbox.close()
+
+
+def enqueue_replies(outbox, count):
+    for i in range(1, count + 1):
+        text = f"Reply {i}"
+        outbox.enqueue(f"email-{i}", f"user{i}@example.com", "Re: Your Inquiry", text, f"<p>{text}</p>")
+
+
+def dispatch(outbox):
+    dispatcher = OutboxDispatcher(outbox, MailgunSender(api_key="key", domain="example.com"))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return dispatcher.dispatch_once(executor)
+
+
+def test_replies_sharing_a_template_go_out_in_one_batch(stub, outbox):
+    enqueue_replies(outbox, 3)
+    assert not outbox.enqueue("email-1", "user1@example.com", "Re: Your Inquiry", "Again", "<p>Again</p>")
+    assert dispatch(outbox) == 3
+    assert len(stub.calls) == 1
+    fields = stub.calls[0]["fields"]
+    assert [value for name, value in fields if name == "to"] == [f"user{i}@example.com" for i in (1, 2, 3)]
+    assert outbox.counts() == {"sent": 3}
+
+
+def test_client_errors_fail_permanently_but_rate_limits_retry(stub, outbox):
+    enqueue_replies(outbox, 1)
+    stub.forced_status = 429
+    dispatch(outbox)
+    assert outbox.status("email-1")["status"] == "pending"
+
+    enqueue_replies(outbox, 2)
+    stub.forced_status = 400
+    outbox.enqueue("email-3", "bad-address", "Custom", "Hi", "<div>Hi</div>")
+    dispatch(outbox)
+    row = outbox.status("email-3")
+    assert row["status"] == "failed" and row["attempts"] == 1
+    assert "400" in row["last_error"]
+
+
+def test_delivery_events_update_the_outbox(stub, outbox):
+    enqueue_replies(outbox, 2)
+    dispatch(outbox)
+    first, second = outbox.status("email-1")["id"], outbox.status("email-2")["id"]
+    assert stub.calls[0]["fields"].count(("v:outbox-id", "%recipient.id%")) == 1
+
+    def event(outbox_id, name, **extra):
+        return {"event": name, "user-variables": {"outbox-id": str(outbox_id)}, **extra}
+
+    def record(event_data):
+        return outbox.record_delivery(*delivery_status(event_data))
+
+    assert record(event(first, "delivered"))
+    # A late 'accepted' does not overwrite the final status
+    assert not record(event(first, "accepted"))
+    assert record(event(second, "failed", severity="temporary"))
+    assert outbox.status("email-2")["delivery_status"] == "deferred"
+    assert record(event(second, "failed", severity="permanent"))
+    assert delivery_status(event(second, "opened")) is None
+    assert delivery_status({"event": "delivered"}) is None
+
+    assert outbox.status("email-1")["delivery_status"] == "delivered"
+    assert outbox.status("email-2")["delivery_status"] == "failed"
@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import plan_executor
+from plan_executor import PlanError, execute_plan, parse_plan
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    """Replaces the lookup tools with fakes that record their calls"""
+    calls = []
+    lock = threading.Lock()
+
+    def fake(name, handler):
+        def run(arguments):
+            with lock:
+                calls.append((name, arguments, time.monotonic()))
+            return handler(arguments)
+        schema = plan_executor.LOOKUP_TOOLS[name][0]
+        monkeypatch.setitem(plan_executor.LOOKUP_TOOLS, name, (schema, run))
+
+    return fake, calls
+
+
+def run(steps, context=None, step_timeout=2.0):
+    """Runs a plan and returns (results, seconds execute_plan took)"""
+    executor = ThreadPoolExecutor(max_workers=4)
+    try:
+        started = time.monotonic()
+        results = execute_plan(parse_plan({"steps": steps}), context or {}, step_timeout, executor)
+        return results, time.monotonic() - started
+    finally:
+        # A timed-out step's thread is left to finish on its own
+        executor.shutdown(wait=False)
+
+
+def test_independent_steps_run_in_parallel(tools):
+    fake, calls = tools
+    barrier = threading.Barrier(2, timeout=1)
+
+    def meet(arguments):
+        # Only returns if both steps are running at the same time
+        barrier.wait()
+        return arguments
+
+    fake("read_knowledgebase", meet)
+    fake("get_available_slots", meet)
+    results, _ = run([
+        {"id": "kb", "tool": "read_knowledgebase", "arguments": {"keyword": "refund"}},
+        {"id": "slots", "tool": "get_available_slots", "arguments": {"after_date": "2024-01-01"}},
+    ])
+    assert results["kb"]["result"] == {"keyword": "refund"}
+    assert results["slots"]["result"] == {"after_date": "2024-01-01"}
+
+
+def test_dependent_step_waits_and_receives_earlier_results(tools):
+    fake, calls = tools
+
+    def slots(arguments):
+        time.sleep(0.05)
+        return [{"date": "2024-02-03", "time": "10:00"}]
+
+    fake("get_available_slots", slots)
+    fake("get_appointments", lambda arguments: {"booked": arguments["date"]})
+    results, _ = run([
+        {"id": "booked", "tool": "get_appointments", "arguments": {"date": "$steps.slots.0.date"}},
+        {"id": "slots", "tool": "get_available_slots", "arguments": {"after_date": "$email.date", "count": 2}},
+    ], context={"email": {"date": "2024-02-01"}})
+
+    assert [name for name, _, _ in calls] == ["get_available_slots", "get_appointments"]
+    assert calls[0][1] == {"after_date": "2024-02-01", "count": 2}
+    assert results["booked"]["result"] == {"booked": "2024-02-03"}
+
+
+def test_timed_out_step_is_recorded_and_its_dependents_skipped(tools):
+    fake, calls = tools
+    release = threading.Event()
+    fake("get_available_slots", lambda arguments: release.wait(2))
+    fake("get_appointments", lambda arguments: "never")
+    fake("read_knowledgebase", lambda arguments: "policy")
+
+    results, elapsed = run([
+        {"id": "slots", "tool": "get_available_slots", "arguments": {"after_date": "2024-01-01"}},
+        {"id": "booked", "tool": "get_appointments", "arguments": {"date": "$steps.slots.0.date"}},
+        {"id": "kb", "tool": "read_knowledgebase", "arguments": {"keyword": "hours"}},
+    ], step_timeout=0.1)
+    release.set()
+
+    assert elapsed < 1
+    assert results["slots"]["error"] == "timed out after 0.1s"
+    assert results["booked"]["error"].startswith("skipped")
+    assert results["kb"]["result"] == "policy"
+    assert "get_appointments" not in [name for name, _, _ in calls]
+
+
+def test_failing_step_does_not_stop_the_others(tools):
+    fake, calls = tools
+
+    def boom(arguments):
+        raise RuntimeError("schedule unavailable")
+
+    fake("get_available_slots", boom)
+    fake("read_knowledgebase", lambda arguments: "policy")
+    results, _ = run([
+        {"id": "slots", "tool": "get_available_slots", "arguments": {"after_date": "2024-01-01"}},
+        {"id": "kb", "tool": "read_knowledgebase", "arguments": {"keyword": "hours"}},
+    ])
+    assert results["slots"] == {"tool": "get_available_slots", "error": "schedule unavailable"}
+    assert results["kb"]["result"] == "policy"
+
+
+def test_invalid_plans_are_rejected():
+    with pytest.raises(PlanError, match="cycle"):
+        parse_plan({"steps": [
+            {"id": "a", "tool": "read_knowledgebase", "arguments": {"keyword": "$steps.b.x"}},
+            {"id": "b", "tool": "read_knowledgebase", "arguments": {"keyword": "$steps.a.x"}},
+        ]})
+    with pytest.raises(PlanError, match="unknown tool"):
+        parse_plan({"steps": [{"tool": "send_email", "arguments": {}}]})
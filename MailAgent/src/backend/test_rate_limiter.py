@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from rate_limiter import RateLimitScheduler, TokenBucket
+
+
+def test_failed_call_refunds_its_token_estimate():
+    scheduler = RateLimitScheduler(rpm=100, tpm=1000, max_retries=0)
+
+    def send():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.call(send, estimated_tokens=400)
+    assert scheduler.tokens.tokens == pytest.approx(1000, abs=1)
+
+
+def test_reserve_is_left_for_interactive_traffic():
+    bucket = TokenBucket(1000)
+    now = time.monotonic()
+    assert bucket.wait_time(700, now, reserve=0.2) == 0
+    bucket.consume(700)
+    # 300 left, 200 of them reserved: a 200-token background call must wait
+    assert bucket.wait_time(200, now, reserve=0.2) > 0
+    assert bucket.wait_time(100, now, reserve=0.2) == 0
+
+
+def test_reserve_must_leave_some_quota():
+    with pytest.raises(ValueError):
+        RateLimitScheduler(reserve=1.0)
@@ -1,49 +1,69 @@
-import json
 import os
 
-import requests
 from dotenv import load_dotenv
+from appointment_index import get_index
+from clients import HTTP_TIMEOUT, get_mailgun_session, mailgun_url
+from knowledgebase import format_chunks, get_index as get_kb_index
 
 # Load environment variables (Mailgun config, for example)
 load_dotenv()
 MAILGUN_API_KEY = os.getenv("MAILGUN_API_KEY", "")
 MAILGUN_DOMAIN = os.getenv("MAILGUN_DOMAIN", "")
-MAILGUN_API_URL = f"https://api.mailgun.net/v3/{MAILGUN_DOMAIN}/messages.mime"
+MAILGUN_API_URL = mailgun_url(MAILGUN_DOMAIN, "messages.mime")
+
+SCHEDULE_FILE = os.path.join("src", "data", "schedule.json")
 
 def get_appointments(parameters: dict) -> dict:
     """
     Retrieve list of appointment times for a specified date from schedule.json.
     parameters: 
       {
-        "date": "YYYY-MM-DD"
+        "date": "YYYY-MM-DD",
+        "end_date": "YYYY-MM-DD"  (optional, returns every date up to and including it)
       }
     """
     date_str = parameters.get("date")
-    schedule_file = os.path.join("src", "data", "schedule.json")
-    with open(schedule_file, 'r') as file:
-        schedule_data = json.load(file)
+    end_date = parameters.get("end_date")
+    index = get_index(SCHEDULE_FILE)
+
+    if end_date:
+        appointments_by_date = index.between(date_str, end_date)
+        return {"appointments": [appt for appts in appointments_by_date.values() for appt in appts]}
+
+    return {"appointments": index.for_date(date_str)}
+
+def get_available_slots(parameters: dict) -> dict:
+    """
+    Retrieve the next available appointment slots from schedule.json.
+    parameters:
+      {
+        "after_date": "YYYY-MM-DD",
+        "after_time": "HH:MM"  (optional),
+        "count": 5  (optional)
+      }
+    """
+    slots = get_index(SCHEDULE_FILE).next_available(
+        parameters.get("after_date"),
+        parameters.get("after_time", ""),
+        parameters.get("count", 5)
+    )
+    return {"appointments": slots}
 
-    appointments_for_date = [
-        appt for appt in schedule_data["appointments"] if appt["date"] == date_str
-    ]
-    return {"appointments": appointments_for_date}
+KB_FILE = os.path.join("docs", "company_secrets.md")
 
 def read_knowledgebase(parameters: dict) -> str:
     """
     Read data from company_secrets.md. 
-    Optionally search by keyword if given in 'parameters["keyword"]'.
+    If 'parameters["keyword"]' is given, only the 'top_k' (default 3) most
+    relevant sections are returned; otherwise the whole knowledgebase.
     """
     keyword = parameters.get("keyword", "")
-    kb_file = os.path.join("docs", "company_secrets.md")
-    with open(kb_file, 'r', encoding='utf-8') as file:
-        kb_data = file.read()
+    index = get_kb_index(KB_FILE)
 
     if keyword:
-        # In a real system, you might add logic to highlight or extract relevant sections
-        # For now, let's just ensure the data is returned.
-        pass
+        return format_chunks(index.search(keyword, parameters.get("top_k", 3)))
 
-    return kb_data
+    return format_chunks(index.all_chunks())
 
 def _create_mime_message(to: str, subject: str, html_content: str, text_content: str) -> str:
     """
@@ -84,10 +104,11 @@ def send_email(parameters: dict) -> dict:
         return {"status": "error", "message": "Mailgun config missing"}
 
     mime_msg = _create_mime_message(to, subject, html_content, text_content)
-    response = requests.post(
+    response = get_mailgun_session().post(
         MAILGUN_API_URL,
         auth=("api", MAILGUN_API_KEY),
         files={"message": ("message.mime", mime_msg, "application/octet-stream")},
-        data={"to": to}
+        data={"to": to},
+        timeout=HTTP_TIMEOUT
     )
     return response.json() 
\ No newline at end of file
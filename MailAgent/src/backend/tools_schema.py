@@ -30,6 +30,10 @@ get_appointments_schema = {
             "date": {
                 "type": "string",
                 "description": "Date for which we want to retrieve available appointments, format YYYY-MM-DD"
+            },
+            "end_date": {
+                "type": "string",
+                "description": "Optional last date (inclusive) to retrieve a whole range of dates, format YYYY-MM-DD"
             }
         },
         "required": ["date"],
@@ -37,15 +41,43 @@ get_appointments_schema = {
     }
 }
 
+get_available_slots_schema = {
+    "name": "get_available_slots",
+    "description": "Retrieve the next available appointment slots on or after a date from schedule.json",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "after_date": {
+                "type": "string",
+                "description": "Earliest date to consider, format YYYY-MM-DD"
+            },
+            "after_time": {
+                "type": "string",
+                "description": "Earliest time on after_date to consider, format HH:MM"
+            },
+            "count": {
+                "type": "integer",
+                "description": "Maximum number of slots to return"
+            }
+        },
+        "required": ["after_date"],
+        "additionalProperties": False
+    }
+}
+
 read_knowledgebase_schema = {
     "name": "read_knowledgebase",
-    "description": "Read data from company_secrets.md",
+    "description": "Search company_secrets.md and return the most relevant sections",
     "parameters": {
         "type": "object",
         "properties": {
             "keyword": {
                 "type": "string",
                 "description": "Any keyword or phrase to search within the knowledgebase; can be empty if not relevant"
+            },
+            "top_k": {
+                "type": "integer",
+                "description": "Maximum number of sections to return (default 3)"
             }
         },
         "required": ["keyword"],
@@ -81,4 +113,28 @@ send_email_schema = {
     }
 }
 
+record_extraction_schema = {
+    "name": "record_extraction",
+    "description": "Record the sender address, the date and the customer's intent extracted from the email",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "email": {
+                "type": "string",
+                "description": "The email address of the sender"
+            },
+            "date": {
+                "type": "string",
+                "description": "The date of the email, format YYYY-MM-DD"
+            },
+            "intent": {
+                "type": "string",
+                "description": "Short description of what the customer wants, e.g. 'Schedule Appointment'"
+            }
+        },
+        "required": ["email", "date", "intent"],
+        "additionalProperties": False
+    }
+}
+
 # Add any additional tool schemas here as needed. 
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Sharded MailAgent worker.
+
+Any number of these processes, on one host or on several hosts sharing
+the inbox directory and the lease database, cooperate on one inbox. Each
+one claims emails through leases in MAILAGENT_LEASE_DB (see
+lease_store.py), keeps them alive with a heartbeat while it works, and
+records every reply in the shared send guard before queueing it, so no
+email is answered twice. Leases of a crashed worker expire after
+MAILAGENT_LEASE_SECONDS and are picked up by the others.
+
+    cd MailAgent && python src/backend/worker.py                  # one worker
+    cd MailAgent && python src/backend/worker.py --processes 4    # four, one per core
+    cd MailAgent && python src/backend/worker.py --exit-when-idle # drain the inbox, then stop
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import uuid
+
+import main
+from engine import IDLE, ProcessingEngine, Watermark
+from inbox_store import open_inbox
+from lease_store import LeaseStore
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id():
+    """Unique per process, and readable in the lease table"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class ShardedWorker:
+    """Feeds leased emails to a ProcessingEngine and settles each lease with the outcome"""
+
+    def __init__(self, store, leases, handler, owner=None, max_workers=4, timeout=None,
+                 poll_interval=1.0, exit_when_idle=False):
+        self.store = store
+        self.leases = leases
+        self.handler = handler
+        self.owner = owner or worker_id()
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.exit_when_idle = exit_when_idle
+        self.engine = ProcessingEngine(self._handle, max_workers=max_workers, timeout=timeout)
+        self.stats = {"claimed": 0, "completed": 0, "failed": 0, "lost_leases": 0}
+        self._stop = threading.Event()
+
+    def _handle(self, email, cancel_event):
+        try:
+            self.handler(email, cancel_event)
+        except BaseException as e:
+            self.leases.fail(self.owner, email["id"], str(e) or type(e).__name__)
+            self.stats["failed"] += 1
+            raise
+        if self.leases.complete(self.owner, email["id"]):
+            self.stats["completed"] += 1
+        else:
+            # Another worker reclaimed it; the send guard kept the reply single
+            self.stats["lost_leases"] += 1
+            logger.warning("Lease on email %s was lost before it completed", email["id"])
+
+    def _claim(self, limit):
+        ids = self.leases.claim(self.owner, limit)
+        if len(ids) < limit and self.leases.sync(self.store):
+            ids += self.leases.claim(self.owner, limit - len(ids))
+        self.stats["claimed"] += len(ids)
+        return ids
+
+    def _emails(self):
+        """Open-ended email source for the engine, claiming a few leases at a time"""
+        while not self._stop.is_set():
+            ids = self._claim(self.max_workers)
+            if not ids:
+                if self.exit_when_idle and not self.leases.counts().get("leased"):
+                    return
+                self._stop.wait(self.poll_interval)
+                yield IDLE
+                continue
+            for email_id in ids:
+                email = self.store.get(email_id)
+                if email is None:
+                    self.leases.fail(self.owner, email_id, "missing from inbox")
+                    continue
+                yield email
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.leases.lease_seconds / 3):
+            try:
+                self.leases.renew(self.owner)
+            except Exception as e:
+                logger.error("Lease heartbeat failed: %s", e)
+
+    def stop(self):
+        """Stops claiming; emails already claimed are finished, leases never started are released"""
+        self._stop.set()
+
+    def run(self):
+        heartbeat = threading.Thread(target=self._heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            # Outcomes live in the lease table; the watermark is only the engine's bookkeeping
+            summary = self.engine.run(self._emails(), Watermark())
+        finally:
+            self._stop.set()
+            heartbeat.join()
+            released = self.leases.release(self.owner)
+            if released:
+                logger.info("Released %s unstarted leases", released)
+            self.leases.write_checkpoint(self.store)
+        return summary
+
+
+def run_worker(exit_when_idle=False):
+    """Runs one worker process until SIGTERM / SIGINT (or until the inbox is drained)"""
+    store = open_inbox(
+        os.getenv("MAILAGENT_INBOX_DIR", "customer_req"),
+        legacy_path=os.getenv("MAILAGENT_LEGACY_INBOX", "customer_req/incoming_emails.json")
+    )
+    leases = LeaseStore(
+        os.getenv("MAILAGENT_LEASE_DB", "data/leases.db"),
+        lease_seconds=float(os.getenv("MAILAGENT_LEASE_SECONDS", "120")),
+        max_attempts=int(os.getenv("MAILAGENT_LEASE_MAX_ATTEMPTS", "3"))
+    )
+    mode = os.getenv("MAILAGENT_MODE", "pipeline")
+    timeout = os.getenv("MAILAGENT_EMAIL_TIMEOUT")
+    worker = ShardedWorker(
+        store,
+        leases,
+        main.process_email_agent if mode == "agent" else main.process_email,
+        max_workers=int(os.getenv("MAILAGENT_MAX_WORKERS", "4")),
+        timeout=float(timeout) if timeout else None,
+        exit_when_idle=exit_when_idle
+    )
+    main.set_send_guard(lambda email: leases.guard_send(email["id"], worker.owner))
+    if mode == "pipeline":
+        main.load_intent_classifier()
+    main.start_outbox_dispatcher()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stop())
+
+    logger.info("Worker %s started in %s mode with %s threads", worker.owner, mode, worker.max_workers)
+    summary = None
+    try:
+        summary = worker.run()
+    finally:
+        main.get_extraction_store().flush()
+        main.stop_outbox_dispatcher()
+        logger.info("Worker %s summary: %s, leases: %s, table: %s", worker.owner, summary, worker.stats, leases.counts())
+        main.write_run_metrics("worker", summary)
+        main.close_clients()
+        leases.close()
+
+
+def run_processes(count, exit_when_idle=False):
+    """Starts `count` worker processes on this host and waits for them, forwarding SIGTERM / SIGINT"""
+    # Migrate a legacy inbox once, before the workers race to do it
+    open_inbox(
+        os.getenv("MAILAGENT_INBOX_DIR", "customer_req"),
+        legacy_path=os.getenv("MAILAGENT_LEGACY_INBOX", "customer_req/incoming_emails.json")
+    )
+    command = [sys.executable, os.path.abspath(__file__)] + (["--exit-when-idle"] if exit_when_idle else [])
+    children = [subprocess.Popen(command) for _ in range(count)]
+
+    def _forward(signum, frame):
+        for child in children:
+            if child.poll() is None:
+                child.send_signal(signum)
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, _forward)
+    return max(child.wait() for child in children)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Sharded MailAgent worker")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start on this host")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop once no email is left to claim")
+    args = parser.parse_args()
+    if args.processes > 1:
+        sys.exit(run_processes(args.processes, args.exit_when_idle))
+    run_worker(args.exit_when_idle)
+
+
+if __name__ == "__main__":
+    try:
+        main_cli()
+    except Exception as e:
+        logger.critical("Worker failed: %s", e)
+        raise
@@ -1,7 +1,9 @@
 import os
 import json
 import logging
-import requests
+from src.backend.appointment_index import get_index
+from src.backend.clients import HTTP_TIMEOUT, get_mailgun_session, mailgun_url
+from src.backend.knowledgebase import format_chunks, get_index as get_kb_index
 
 logger = logging.getLogger(__name__)
 
@@ -10,15 +12,15 @@ def get_appointments(parameters: dict) -> dict:
     Retrieve list of appointment times for a specified date from schedule.json.
     parameters: 
       {
-        "date": "YYYY-MM-DD"
+        "date": "YYYY-MM-DD",
+        "end_date": "YYYY-MM-DD"  (optional, returns every date up to and including it)
       }
     """
     date_str = parameters.get("date")
     schedule_file = r"D:\Agents\schedule.json"
     
-    logger.debug(f"Looking for schedule file at: {schedule_file}")
-    logger.debug(f"File exists: {os.path.exists(schedule_file)}")
-    
+    logger.debug("Looking for schedule file at: %s", schedule_file)
+        
     # Create default data if file doesn't exist
     if not os.path.exists(schedule_file):
         logger.info("Schedule file not found, creating default data")
@@ -42,77 +44,69 @@ def get_appointments(parameters: dict) -> dict:
             logger.debug("Created new schedule file with default data")
             return default_data
         except Exception as e:
-            logger.error(f"Failed to create schedule file: {str(e)}")
+            logger.error("Failed to create schedule file: %s", e)
             raise
 
     try:
-        with open(schedule_file, 'r') as file:
-            content = file.read()
-            logger.debug(f"Raw file content: {content}")
-            schedule_data = json.loads(content)
-            
-        appointments_for_date = [
-            appt for appt in schedule_data["appointments"] if appt["date"] == date_str
-        ]
-        logger.debug(f"Found {len(appointments_for_date)} appointments for date {date_str}")
+        end_date = parameters.get("end_date")
+        index = get_index(schedule_file)
+        if end_date:
+            appointments_by_date = index.between(date_str, end_date)
+            logger.debug("Found appointments on %d dates between %s and %s", len(appointments_by_date), date_str, end_date)
+            return {"appointments": [appt for appts in appointments_by_date.values() for appt in appts]}
+
+        appointments_for_date = index.for_date(date_str)
+        logger.debug("Found %d appointments for date %s", len(appointments_for_date), date_str)
         return {"appointments": appointments_for_date}
     except Exception as e:
-        logger.error(f"Error reading or parsing schedule file: {str(e)}")
+        logger.error("Error reading or parsing schedule file: %s", e)
         raise 
 
 def read_knowledgebase(parameters: dict) -> str:
     """
     Read data from company_secrets.md. 
-    Optionally search by keyword if given in 'parameters["keyword"]'.
+    If 'parameters["keyword"]' is given, only the 'top_k' (default 3) most
+    relevant sections are returned; otherwise the whole knowledgebase.
     """
     keyword = parameters.get("keyword", "")
     kb_file = r"D:\Agents\company_secrets.md"  # Updated path
     
-    logger.debug(f"Looking for knowledgebase file at: {kb_file}")
-    logger.debug(f"File exists: {os.path.exists(kb_file)}")
-    
+    logger.debug("Looking for knowledgebase file at: %s", kb_file)
+        
     try:
-        with open(kb_file, 'r', encoding='utf-8') as file:
-            kb_data = file.read()
-            logger.info("Successfully read knowledgebase file")
-            logger.debug(f"Knowledgebase content length: {len(kb_data)}")
-
+        index = get_kb_index(kb_file)
         if keyword:
-            logger.debug(f"Searching for keyword: {keyword}")
-            # Add keyword search logic here if needed
-            pass
+            logger.debug("Searching for keyword: %s", keyword)
+            chunks = index.search(keyword, parameters.get("top_k", 3))
+            logger.debug("Found %d relevant knowledgebase sections", len(chunks))
+            return format_chunks(chunks)
 
-        return kb_data
+        return format_chunks(index.all_chunks())
 
     except FileNotFoundError:
-        logger.error(f"Knowledgebase file not found at: {kb_file}")
+        logger.error("Knowledgebase file not found at: %s", kb_file)
         raise
     except Exception as e:
-        logger.error(f"Error reading knowledgebase: {str(e)}")
+        logger.error("Error reading knowledgebase: %s", e)
         raise 
 
 def send_email(parameters: dict) -> dict:
     """Send an email via Mailgun"""
-    logger.info("=" * 50)
-    logger.info("SENDING EMAIL")
-    logger.info(f"To: {parameters.get('to')}")
-    logger.info(f"Subject: {parameters.get('subject')}")
-    logger.info(f"Text content: {parameters.get('text_content')}")
-    logger.info("=" * 50)
+    logger.info("Sending email to %s: %s", parameters.get('to'), parameters.get('subject'))
+    logger.debug("Email body", extra={"payload": parameters.get('text_content')})
     
     MAILGUN_API_KEY = os.getenv("MAILGUN_API_KEY")
     MAILGUN_DOMAIN = os.getenv("MAILGUN_DOMAIN")
     
     if not MAILGUN_API_KEY or not MAILGUN_DOMAIN:
         logger.error("Mailgun configuration missing")
-        logger.error(f"MAILGUN_API_KEY exists: {bool(MAILGUN_API_KEY)}")
-        logger.error(f"MAILGUN_DOMAIN exists: {bool(MAILGUN_DOMAIN)}")
+        logger.error("MAILGUN_API_KEY exists: %s", bool(MAILGUN_API_KEY))
+        logger.error("MAILGUN_DOMAIN exists: %s", bool(MAILGUN_DOMAIN))
         return {"status": "error", "message": "Mailgun config missing"}
 
     try:
-        logger.info("Attempting to send email via Mailgun")
-        response = requests.post(
-            f"https://api.mailgun.net/v3/{MAILGUN_DOMAIN}/messages",
+        response = get_mailgun_session().post(
+            mailgun_url(MAILGUN_DOMAIN),
             auth=("api", MAILGUN_API_KEY),
             data={
                 "from": f"AI Assistant <mailgun@{MAILGUN_DOMAIN}>",
@@ -120,17 +114,13 @@ def send_email(parameters: dict) -> dict:
                 "subject": parameters.get("subject"),
                 "text": parameters.get("text_content"),
                 "html": parameters.get("html_content")
-            }
+            },
+            timeout=HTTP_TIMEOUT
         )
-        logger.info("Mailgun API Response:")
-        logger.info("-" * 50)
-        logger.info(f"Status Code: {response.status_code}")
-        logger.info(f"Response: {response.text}")
-        logger.info("-" * 50)
-        
+        logger.info("Mailgun responded with status %d", response.status_code)
+        logger.debug("Mailgun response", extra={"payload": response.text})
+
         return response.json()
     except Exception as e:
-        logger.error(f"Failed to send email: {str(e)}")
-        logger.error(f"Exception type: {type(e)}")
-        logger.error("=" * 50)
+        logger.error("Failed to send email (%s): %s", type(e).__name__, e)
         raise 
\ No newline at end of file
@@ -0,0 +1,2 @@
+# Makes `src.*` importable in tests, as it is for the app (uvicorn src.main:app),
+# so modules such as src.engine and src.batch do not collide with MailAgent's
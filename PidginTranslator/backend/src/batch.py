@@ -0,0 +1,175 @@
+import asyncio
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    from src.engine import TranslationEngine
+    from src.memory import TranslationMemory, lookup, normalize
+    from src.translator import MODEL
+except ImportError:  # running from inside src/
+    from engine import TranslationEngine
+    from memory import TranslationMemory, lookup, normalize
+    from translator import MODEL
+
+# Limits on one /translate/batch request
+BATCH_MAX_TEXTS = int(os.getenv("TRANSLATOR_BATCH_MAX_TEXTS", "1000"))
+BATCH_MAX_LANGUAGES = int(os.getenv("TRANSLATOR_BATCH_MAX_LANGUAGES", "20"))
+# Input tokens and segment count per packed call; the reply is budgeted
+# from the input and capped at BATCH_OUTPUT_TOKENS
+BATCH_INPUT_TOKENS = int(os.getenv("TRANSLATOR_BATCH_INPUT_TOKENS", "1500"))
+BATCH_MAX_SEGMENTS = int(os.getenv("TRANSLATOR_BATCH_MAX_SEGMENTS", "50"))
+BATCH_OUTPUT_TOKENS = int(os.getenv("TRANSLATOR_BATCH_OUTPUT_TOKENS", "4096"))
+# Upstream calls one batch may have in flight at once
+BATCH_CONCURRENCY = int(os.getenv("TRANSLATOR_BATCH_CONCURRENCY", "4"))
+# A translation can run to about twice the tokens of its Pidgin source, and
+# each segment costs a few more for its JSON quoting and separators
+OUTPUT_RATIO = 2
+SEGMENT_OVERHEAD = 8
+REPLY_OVERHEAD = 32
+
+Result = Union[str, Exception]
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when it is installed, else estimate four characters per token"""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_segments(
+    segments: List[str], budget: int = BATCH_INPUT_TOKENS, max_segments: int = BATCH_MAX_SEGMENTS
+) -> List[List[int]]:
+    """
+    Group segment indexes into packs of at most `budget` input tokens and
+    `max_segments` segments, keeping input order. A segment over the budget
+    gets a pack of its own.
+    """
+    packs, current, used = [], [], 0
+    for index, segment in enumerate(segments):
+        tokens = count_tokens(segment) + SEGMENT_OVERHEAD
+        if current and (used + tokens > budget or len(current) >= max_segments):
+            packs.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def reply_budget(segments: List[str]) -> int:
+    """Completion tokens to allow for translating `segments` in one call"""
+    needed = sum(count_tokens(segment) * OUTPUT_RATIO + SEGMENT_OVERHEAD for segment in segments)
+    return min(BATCH_OUTPUT_TOKENS, needed + REPLY_OVERHEAD)
+
+
+async def translate_batch(
+    engine: TranslationEngine,
+    texts: List[str],
+    target_languages: List[str],
+    memory: Optional[TranslationMemory] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> Tuple[List[Dict[str, Result]], dict]:
+    """
+    Translate every text into every target language with as few upstream calls as possible.
+
+    Repeated texts are translated once per language and texts found in the
+    translation memory are not sent at all. The rest are packed into
+    structured-output calls under the token budget. At most `concurrency`
+    calls of the batch run at once, as background work that waits for the
+    engine's slots rather than failing when they are busy. A pack whose
+    reply does not line up with its segments is split in half and retried,
+    down to single-segment calls.
+
+    Args:
+        engine: The engine that runs (and rate-limits) the upstream calls.
+        texts: The Pidgin English texts, in the order results are returned.
+        target_languages: The target languages.
+        memory: Translation memory to read from and fill, if any.
+        concurrency: Upstream calls this batch may have in flight at once.
+
+    Returns:
+        Tuple[List[Dict[str, Result]], dict]: For each text, its translation
+        or the exception that prevented it per target language; and counters
+        for the batch (upstream calls, remembered and translated segments).
+    """
+    stats = {"calls": 0, "split_retries": 0, "remembered": 0, "translated": 0}
+    calls = asyncio.Semaphore(concurrency)
+    results: List[Dict[str, Result]] = [{} for _ in texts]
+
+    # One entry per distinct text; blank texts need no translation
+    unique: Dict[str, List[int]] = {}
+    for index, text in enumerate(texts):
+        if not text.strip():
+            for language in target_languages:
+                results[index][language] = ""
+            continue
+        unique.setdefault(normalize(text) or text.strip(), []).append(index)
+    sources = [texts[indexes[0]] for indexes in unique.values()]
+    targets = list(unique.values())
+
+    def settle(language: str, position: int, result: Result) -> None:
+        for index in targets[position]:
+            results[index][language] = result
+
+    async def run_pack(language: str, positions: List[int]) -> None:
+        segments = [sources[position] for position in positions]
+        stats["calls"] += 1
+        try:
+            # Only the call holds the semaphore, so split retries cannot deadlock on it
+            async with calls:
+                if len(segments) == 1:
+                    translations = [await engine.translate(segments[0], language, background=True)]
+                else:
+                    translations = await engine.translate_segments(segments, language, reply_budget(segments))
+        except Exception as e:
+            if isinstance(e, ValueError) and len(segments) > 1:
+                # The reply did not line up with the segments
+                stats["split_retries"] += 1
+                middle = len(positions) // 2
+                await asyncio.gather(run_pack(language, positions[:middle]), run_pack(language, positions[middle:]))
+                return
+            for position in positions:
+                settle(language, position, e)
+            return
+        stats["translated"] += len(translations)
+        for position, translation in zip(positions, translations):
+            settle(language, position, translation)
+        if memory is not None:
+            def remember():
+                for segment, translation in zip(segments, translations):
+                    memory.put(segment, language, translation)
+            await asyncio.to_thread(remember)
+
+    async def run_language(language: str) -> None:
+        pending = []
+        for position, source in enumerate(sources):
+            remembered = await lookup(memory, source, language) if memory is not None else None
+            if remembered is None:
+                pending.append(position)
+            else:
+                stats["remembered"] += 1
+                settle(language, position, remembered)
+        packs = pack_segments([sources[position] for position in pending])
+        await asyncio.gather(*(run_pack(language, [pending[i] for i in pack]) for pack in packs))
+
+    await asyncio.gather(*(run_language(language) for language in target_languages))
+    return results, stats
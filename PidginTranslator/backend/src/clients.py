@@ -0,0 +1,62 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+import openai
+
+# Pool sizes and timeouts for calls to OpenAI
+HTTP_POOL_SIZE = int(os.getenv("TRANSLATOR_HTTP_POOL_SIZE", "100"))
+OPENAI_TIMEOUT = float(os.getenv("TRANSLATOR_OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("TRANSLATOR_OPENAI_MAX_RETRIES", "2"))
+
+_lock = threading.Lock()
+_openai_client = None
+_async_openai_clients = weakref.WeakKeyDictionary()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=60
+    )
+
+
+def get_openai_client() -> openai.OpenAI:
+    """
+    Return the process-wide OpenAI client.
+
+    The client keeps a pool of keep-alive connections, so TCP and TLS
+    handshakes stay off the per-request path. It is safe to share between threads.
+    """
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            _openai_client = openai.OpenAI(
+                timeout=OPENAI_TIMEOUT,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.Client(limits=_limits(), timeout=OPENAI_TIMEOUT)
+            )
+        return _openai_client
+
+
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    """
+    Return the AsyncOpenAI client for the running event loop.
+
+    Async connection pools belong to the loop that created them, so one
+    client is kept per loop (one per uvicorn worker in practice).
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_openai_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                timeout=OPENAI_TIMEOUT,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=OPENAI_TIMEOUT)
+            )
+            _async_openai_clients[loop] = client
+        return client
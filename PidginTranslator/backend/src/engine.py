@@ -0,0 +1,191 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+try:
+    from src.clients import HTTP_POOL_SIZE
+    from src.rate_limiter import BACKGROUND, priority
+    from src.translator import stream_pidgin_to_target, translate_pidgin_to_target_async, translate_segments_async
+except ImportError:  # running from inside src/
+    from clients import HTTP_POOL_SIZE
+    from rate_limiter import BACKGROUND, priority
+    from translator import stream_pidgin_to_target, translate_pidgin_to_target_async, translate_segments_async
+
+# How many translations may wait on OpenAI at once, and how long a request
+# may spend waiting for a slot and then for the model
+MAX_CONCURRENCY = int(os.getenv("TRANSLATOR_MAX_CONCURRENCY", str(HTTP_POOL_SIZE)))
+QUEUE_TIMEOUT = float(os.getenv("TRANSLATOR_QUEUE_TIMEOUT", "5"))
+REQUEST_TIMEOUT = float(os.getenv("TRANSLATOR_REQUEST_TIMEOUT", "30"))
+# Packed batch calls produce many translations at once, so they get longer
+BATCH_TIMEOUT = float(os.getenv("TRANSLATOR_BATCH_TIMEOUT", "120"))
+# Slots that background (batch) work may hold or queue for at once; the
+# rest stay free for interactive requests
+BACKGROUND_CONCURRENCY = int(os.getenv("TRANSLATOR_BACKGROUND_CONCURRENCY", str(max(1, MAX_CONCURRENCY // 2))))
+
+
+class EngineBusy(Exception):
+    """Raised when no translation slot frees up within the queue timeout"""
+
+
+class TranslationEngine:
+    """
+    Runs translations on the event loop with a cap on concurrent upstream calls.
+
+    Each request waits at most `queue_timeout` seconds for one of
+    `max_concurrency` slots and then at most `timeout` seconds for the model.
+    Cancelling the awaiting task (e.g. because the client went away) cancels
+    the upstream request and frees its slot.
+
+    Background work (batch translation) waits for a slot as long as it takes
+    instead, but at most `background_concurrency` background calls hold or
+    queue for slots at once, so interactive requests are never stuck behind
+    a large batch.
+    """
+
+    def __init__(
+        self,
+        translate: Callable[[str, str], Awaitable[str]] = translate_pidgin_to_target_async,
+        stream: Callable[[str, str], AsyncIterator[str]] = stream_pidgin_to_target,
+        translate_segments: Callable[[List[str], str, int], Awaitable[List[str]]] = translate_segments_async,
+        max_concurrency: int = MAX_CONCURRENCY,
+        timeout: float = REQUEST_TIMEOUT,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        batch_timeout: float = BATCH_TIMEOUT,
+        background_concurrency: int = BACKGROUND_CONCURRENCY,
+    ):
+        self.translate_fn = translate
+        self.stream_fn = stream
+        self.translate_segments_fn = translate_segments
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.batch_timeout = batch_timeout
+        self.background_concurrency = max(1, min(background_concurrency, max_concurrency))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._background: Optional[asyncio.Semaphore] = None
+        self.stats = {
+            "in_flight": 0, "waiting": 0, "completed": 0, "failed": 0,
+            "timed_out": 0, "rejected": 0, "cancelled": 0,
+        }
+
+    def _slots(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the serving loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def _background_slot(self):
+        """
+        Hold one of the background allowances, waiting without a timeout. Work
+        inside runs at background priority in the rate limiter as well.
+        """
+        if self._background is None:
+            self._background = asyncio.Semaphore(self.background_concurrency)
+        async with self._background:
+            async with self._slot(background=True):
+                token = priority.set(BACKGROUND)
+                try:
+                    yield
+                finally:
+                    priority.reset(token)
+
+    @asynccontextmanager
+    async def _slot(self, background: bool = False):
+        """Hold one of the concurrency slots, counting how the work inside ends"""
+        slots = self._slots()
+        self.stats["waiting"] += 1
+        try:
+            if background:
+                await slots.acquire()
+            else:
+                await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise EngineBusy(f"All {self.max_concurrency} translation slots are busy")
+        finally:
+            self.stats["waiting"] -= 1
+
+        self.stats["in_flight"] += 1
+        try:
+            yield
+            self.stats["completed"] += 1
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.stats["cancelled"] += 1
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+            slots.release()
+
+    async def translate(self, text: str, target_language: str, background: bool = False) -> str:
+        """
+        Translate one text, waiting for a free slot first.
+
+        Args:
+            text: The Pidgin English text.
+            target_language: The target language.
+            background: Wait for a background slot without the queue timeout.
+
+        Raises:
+            EngineBusy: No slot became free within queue_timeout.
+            asyncio.TimeoutError: The model did not answer within timeout.
+        """
+        async with self._background_slot() if background else self._slot():
+            return await asyncio.wait_for(self.translate_fn(text, target_language), self.timeout)
+
+    async def translate_segments(self, segments: List[str], target_language: str, max_tokens: int) -> List[str]:
+        """
+        Translate several segments in one upstream call, holding one
+        background slot for as long as it takes to get one.
+
+        Raises:
+            asyncio.TimeoutError: The model did not answer within batch_timeout.
+        """
+        async with self._background_slot():
+            return await asyncio.wait_for(
+                self.translate_segments_fn(segments, target_language, max_tokens), self.batch_timeout
+            )
+
+    async def stream(self, text: str, target_language: str) -> AsyncIterator[str]:
+        """
+        Stream one translation, holding a slot until the last piece or until
+        the consumer stops (which closes the upstream stream).
+
+        Raises:
+            EngineBusy: No slot became free within queue_timeout.
+            asyncio.TimeoutError: The whole stream took longer than timeout.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._slot():
+            deadline = loop.time() + self.timeout
+            pieces = self.stream_fn(text, target_language)
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        piece = await asyncio.wait_for(pieces.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        return
+                    yield piece
+            finally:
+                await pieces.aclose()
+
+
+_engine: Optional[TranslationEngine] = None
+
+
+def get_engine() -> TranslationEngine:
+    """Return the process-wide translation engine"""
+    global _engine
+    if _engine is None:
+        _engine = TranslationEngine()
+    return _engine
@@ -1,8 +1,18 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import os
+
+import openai
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
-from src.translator import translate_yoruba_to_target
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from src.batch import BATCH_MAX_LANGUAGES, BATCH_MAX_TEXTS, translate_batch
+from src.engine import EngineBusy, get_engine
+from src.memory import get_memory, lookup, memory_enabled, translate_with_memory
+from src.singleflight import get_singleflight, translation_key
+from src.rate_limiter import get_rate_limiter
 
 app = FastAPI()
 
@@ -15,18 +25,159 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# How often a pending translation checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+# When set, /admin endpoints require it in the X-Admin-Token header
+ADMIN_TOKEN = os.getenv("TRANSLATOR_ADMIN_TOKEN")
+
 class TranslationRequest(BaseModel):
     text: str
     target_language: str
 
+class BatchTranslationRequest(BaseModel):
+    texts: List[str] = Field(min_length=1, max_length=BATCH_MAX_TEXTS)
+    target_languages: List[str] = Field(min_length=1, max_length=BATCH_MAX_LANGUAGES)
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before its translation finished"""
+
+async def run_until_disconnect(request: Request, coro):
+    """Await `coro`, cancelling it (and its upstream call) if the client disconnects"""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        # Also covers the server cancelling this handler
+        task.cancel()
+
+async def translate_remembered(text: str, target_language: str) -> str:
+    """
+    Translate through the translation memory when it is enabled. Concurrent
+    requests for the same text and language share one translation.
+    """
+    async def translate():
+        if not memory_enabled():
+            return await get_engine().translate(text, target_language)
+        return await translate_with_memory(get_memory(), text, target_language, get_engine().translate)
+
+    return await get_singleflight().do(translation_key(text, target_language), translate)
+
 @app.post("/translate")
-async def translate_text(request: TranslationRequest):
+async def translate_text(request: TranslationRequest, http_request: Request):
     try:
-        translation = translate_yoruba_to_target(request.text, request.target_language)
+        translation = await run_until_disconnect(
+            http_request, translate_remembered(request.text, request.target_language)
+        )
         return {"translation": translation}
+    except ClientDisconnected:
+        # Nobody is listening; 499 only shows up in access logs
+        return Response(status_code=499)
+    except EngineBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Translation timed out")
+    except openai.APIError as e:
+        raise HTTPException(status_code=502, detail=f"OpenAI API error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def error_detail(error: Exception) -> dict:
+    """The status and detail /translate would answer with for `error`"""
+    if isinstance(error, EngineBusy):
+        return {"status": 503, "detail": str(error)}
+    if isinstance(error, asyncio.TimeoutError):
+        return {"status": 504, "detail": "Translation timed out"}
+    if isinstance(error, openai.APIError):
+        return {"status": 502, "detail": f"OpenAI API error: {str(error)}"}
+    return {"status": 500, "detail": str(error)}
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/translate/stream")
+async def translate_text_stream(request: TranslationRequest):
+    """
+    Stream the translation as Server-Sent Events: a `data: {"delta": ...}`
+    event per piece, then `event: done` with the full translation, or
+    `event: error` with a status and detail. When the client disconnects
+    the stream is cancelled, and so is the upstream completion. A text
+    already in the translation memory arrives as a single delta.
+    """
+    async def events():
+        remembered = None
+        if memory_enabled():
+            remembered = await lookup(get_memory(), request.text, request.target_language)
+        if remembered is not None:
+            yield sse_event({"delta": remembered})
+            yield sse_event({"translation": remembered}, event="done")
+            return
+
+        pieces = []
+        try:
+            async for piece in get_engine().stream(request.text, request.target_language):
+                pieces.append(piece)
+                yield sse_event({"delta": piece})
+            translation = "".join(pieces).strip()
+            if memory_enabled():
+                await asyncio.to_thread(get_memory().put, request.text, request.target_language, translation)
+            yield sse_event({"translation": translation}, event="done")
+        except Exception as e:
+            yield sse_event(error_detail(e), event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/translate/batch")
+async def translate_text_batch(request: BatchTranslationRequest, http_request: Request):
+    """
+    Translate many texts into several languages at once. Results come back
+    in input order, one per text, with a translation or an error (status
+    and detail) per target language; one failed pack does not fail the rest.
+    """
+    target_languages = list(dict.fromkeys(language.strip() for language in request.target_languages))
+    memory = get_memory() if memory_enabled() else None
+    try:
+        results, stats = await run_until_disconnect(
+            http_request, translate_batch(get_engine(), request.texts, target_languages, memory)
+        )
+    except ClientDisconnected:
+        return Response(status_code=499)
+
+    items = []
+    for index, (text, result) in enumerate(zip(request.texts, results)):
+        translations = {language: value for language, value in result.items() if isinstance(value, str)}
+        errors = {
+            language: error_detail(value) for language, value in result.items() if isinstance(value, Exception)
+        }
+        items.append({"index": index, "text": text, "translations": translations, "errors": errors})
+    return {"results": items, **stats}
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "translations": get_engine().stats,
+        "coalescing": get_singleflight().stats,
+        "rate_limiter": get_rate_limiter().stats,
+    }
+
+@app.get("/admin/memory/stats")
+async def memory_stats(x_admin_token: Optional[str] = Header(default=None)):
+    """Translation memory counters and hit rates"""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not memory_enabled():
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(get_memory().summary)}
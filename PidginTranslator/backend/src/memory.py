@@ -0,0 +1,211 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+MEMORY_PATH = os.getenv("TRANSLATOR_MEMORY_PATH", "data/translation_memory.db")
+MEMORY_LRU_SIZE = int(os.getenv("TRANSLATOR_MEMORY_LRU_SIZE", "10000"))
+# Assemble a long input from remembered sentences only when at least this
+# share of them is already known; otherwise translate it whole for context
+MIN_SENTENCE_REUSE = float(os.getenv("TRANSLATOR_MEMORY_MIN_SENTENCE_REUSE", "0.5"))
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory (
+    source_key TEXT NOT NULL,
+    target TEXT NOT NULL,
+    source_text TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (source_key, target)
+);
+"""
+
+
+def normalize(text: str) -> str:
+    """
+    Fold text to its memory key: Unicode-normalized, case-folded, punctuation
+    removed and whitespace collapsed, so "How you dey?" and "how  you dey"
+    share one entry.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(char).startswith("P") else char for char in text)
+    return " ".join(text.split())
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split on sentence-ending punctuation followed by whitespace"""
+    return [sentence for sentence in SENTENCE_END.split(text.strip()) if sentence]
+
+
+class TranslationMemory:
+    """
+    Exact-match translation memory keyed on normalized text and target language.
+
+    An in-process LRU sits in front of a SQLite table in WAL mode, so entries
+    survive restarts and are shared by every uvicorn worker on the host.
+    """
+
+    def __init__(self, path: str = MEMORY_PATH, lru_size: int = MEMORY_LRU_SIZE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self.stats = {
+            "lookups": 0, "lru_hits": 0, "store_hits": 0, "misses": 0,
+            "assembled": 0, "sentence_hits": 0, "sentence_misses": 0,
+        }
+
+    @staticmethod
+    def _key(text: str, target_language: str) -> Tuple[str, str]:
+        return normalize(text), target_language.strip().casefold()
+
+    def _remember(self, key: Tuple[str, str], translation: str) -> None:
+        self._lru[key] = translation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def cached(self, text: str, target_language: str) -> Optional[str]:
+        """LRU lookup only; never touches the disk"""
+        key = self._key(text, target_language)
+        with self._lock:
+            translation = self._lru.get(key)
+            if translation is not None:
+                self._lru.move_to_end(key)
+        return translation
+
+    def get(self, text: str, target_language: str, record: bool = True) -> Optional[str]:
+        """Return the remembered translation, or None. `record=False` leaves the hit-rate counters alone."""
+        key = self._key(text, target_language)
+        if not key[0]:
+            return None
+        with self._lock:
+            self.stats["lookups"] += record
+            translation = self._lru.get(key)
+            if translation is not None:
+                self._lru.move_to_end(key)
+                self.stats["lru_hits"] += record
+                return translation
+            with self._conn:
+                row = self._conn.execute(
+                    "SELECT translation FROM memory WHERE source_key = ? AND target = ?", key
+                ).fetchone()
+                if row is None:
+                    self.stats["misses"] += record
+                    return None
+                self._conn.execute(
+                    "UPDATE memory SET hits = hits + 1 WHERE source_key = ? AND target = ?", key
+                )
+            self.stats["store_hits"] += record
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, text: str, target_language: str, translation: str) -> None:
+        key = self._key(text, target_language)
+        if not key[0] or not translation:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO memory (source_key, target, source_text, translation, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key[0], key[1], text, translation, time.time())
+                )
+            self._remember(key, translation)
+
+    def summary(self) -> dict:
+        """Counters plus hit rates, for the admin endpoint"""
+        with self._lock:
+            stats = dict(self.stats)
+            entries = self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+            stats["lru_entries"] = len(self._lru)
+        hits = stats["lru_hits"] + stats["store_hits"]
+        sentences = stats["sentence_hits"] + stats["sentence_misses"]
+        stats["entries"] = entries
+        stats["hit_rate"] = round(hits / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["sentence_hit_rate"] = round(stats["sentence_hits"] / sentences, 4) if sentences else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+async def lookup(
+    memory: TranslationMemory, text: str, target_language: str, record: bool = True
+) -> Optional[str]:
+    """Async lookup that only leaves the event loop when the LRU misses"""
+    if memory.cached(text, target_language) is not None:
+        # An LRU hit never reaches SQLite; get() is called so it is counted
+        return memory.get(text, target_language, record)
+    return await asyncio.to_thread(memory.get, text, target_language, record)
+
+
+async def translate_with_memory(
+    memory: TranslationMemory,
+    text: str,
+    target_language: str,
+    translate: Callable[[str, str], Awaitable[str]],
+) -> str:
+    """
+    Answer from memory when possible. A miss on a multi-sentence input is
+    assembled from remembered sentences when enough of them are known, and
+    only the unknown sentences are translated (concurrently). Anything
+    translated is stored for next time.
+    """
+    translation = await lookup(memory, text, target_language)
+    if translation is not None:
+        return translation
+
+    sentences = split_sentences(text)
+    if len(sentences) > 1:
+        known = [await lookup(memory, sentence, target_language, record=False) for sentence in sentences]
+        hits = sum(item is not None for item in known)
+        memory.stats["sentence_hits"] += hits
+        memory.stats["sentence_misses"] += len(sentences) - hits
+        if hits / len(sentences) >= MIN_SENTENCE_REUSE:
+            missing = [index for index, item in enumerate(known) if item is None]
+            fresh = await asyncio.gather(*(translate(sentences[index], target_language) for index in missing))
+            for index, item in zip(missing, fresh):
+                known[index] = item
+                await asyncio.to_thread(memory.put, sentences[index], target_language, item)
+            memory.stats["assembled"] += 1
+            translation = " ".join(known)
+            await asyncio.to_thread(memory.put, text, target_language, translation)
+            return translation
+
+    translation = await translate(text, target_language)
+    await asyncio.to_thread(memory.put, text, target_language, translation)
+    return translation
+
+
+_memory: Optional[TranslationMemory] = None
+_memory_lock = threading.Lock()
+
+
+def memory_enabled() -> bool:
+    return os.getenv("TRANSLATOR_MEMORY", "on").lower() not in ("0", "off", "false")
+
+
+def get_memory() -> TranslationMemory:
+    """Return the process-wide translation memory, opening it on first use"""
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory()
+        return _memory
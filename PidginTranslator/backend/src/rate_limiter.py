@@ -0,0 +1,192 @@
+import asyncio
+import contextvars
+import os
+import random
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import openai
+
+# Calls made on behalf of a waiting user go first; batch work (see
+# engine.TranslationEngine background slots) takes what is left
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+priority: contextvars.ContextVar = contextvars.ContextVar("translator_priority", default=INTERACTIVE)
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+# How often a caller that cannot be admitted yet looks again
+POLL_INTERVAL = 0.05
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset headers such as '1s', '6m0s' or '20ms' into seconds"""
+    if not value:
+        return None
+    matches = DURATION_RE.findall(value)
+    if not matches:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in matches)
+
+
+def estimate_tokens(messages: List[dict], max_tokens: int) -> int:
+    """Rough prompt + completion estimate (about four characters per token)"""
+    chars = sum(len(str(message.get("content") or "")) for message in messages)
+    return chars // 4 + len(messages) * 4 + max_tokens
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `capacity` per `period` seconds"""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.period = period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.period)
+        self.updated = now
+        needed = min(amount, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) * self.period / self.capacity
+
+    def sync(self, limit: Optional[float], remaining: Optional[float]) -> None:
+        """Adopt the server's view of the limit and what is left of it"""
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.tokens = min(self.tokens, remaining)
+
+
+class RateLimiter:
+    """
+    Admission control for the translator's chat completions under RPM and TPM quotas.
+
+    Every upstream call waits until both buckets have room; interactive
+    calls are admitted before any waiting background call. The buckets are
+    re-synchronised from the x-ratelimit-* response headers, so a quota
+    shared with other services (e.g. MailAgent) is seen as it really is.
+    A 429 pauses every caller until the server's retry hint has passed and
+    the call is retried with jittered exponential backoff.
+    """
+
+    def __init__(self, rpm: int = 500, tpm: int = 30000, max_retries: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 30.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._waiting: Dict[str, int] = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._blocked_until = 0.0
+        self.stats = {"admitted": 0, "rate_limited": 0, "waited_seconds": 0.0}
+
+    async def acquire(self, estimated_tokens: int, level: str = INTERACTIVE) -> None:
+        """Wait until a call of `estimated_tokens` at `level` may be sent"""
+        started = time.monotonic()
+        self._waiting[level] += 1
+        try:
+            while True:
+                now = time.monotonic()
+                wait = max(
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(estimated_tokens, now),
+                    self._blocked_until - now,
+                )
+                if level == BACKGROUND and self._waiting[INTERACTIVE]:
+                    wait = max(wait, POLL_INTERVAL)
+                if wait <= 0:
+                    self.requests.tokens -= 1
+                    self.tokens.tokens -= min(estimated_tokens, self.tokens.capacity)
+                    self.stats["admitted"] += 1
+                    self.stats["waited_seconds"] += now - started
+                    return
+                await asyncio.sleep(min(wait, POLL_INTERVAL))
+        finally:
+            self._waiting[level] -= 1
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the TPM bucket once the real usage is known"""
+        bucket = self.tokens
+        bucket.tokens = min(bucket.capacity, bucket.tokens + estimated_tokens - actual_tokens)
+
+    def update_from_headers(self, headers) -> None:
+        def number(name: str) -> Optional[float]:
+            try:
+                return float(headers[name]) if headers.get(name) is not None else None
+            except ValueError:
+                return None
+
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = number(f"x-ratelimit-remaining-{kind}")
+            bucket.sync(number(f"x-ratelimit-limit-{kind}"), remaining)
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and remaining <= 0 and reset:
+                self._blocked_until = max(self._blocked_until, now + reset)
+
+    def _backoff(self, attempt: int, error: openai.RateLimitError) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        headers = error.response.headers if getattr(error, "response", None) is not None else {}
+        retry_after = parse_duration(headers.get("retry-after"))
+        if headers.get("retry-after-ms"):
+            retry_after = parse_duration(headers["retry-after-ms"] + "ms")
+        if retry_after:
+            delay = max(delay, retry_after)
+        self.stats["rate_limited"] += 1
+        # Pause everyone, not just this caller, until the window resets
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        return delay
+
+    async def call(self, send: Callable[[], Awaitable], estimated_tokens: int):
+        """
+        Run `send()` under admission control, at the priority of the current context.
+
+        Args:
+            send: Makes the request and returns a raw response
+                (client.chat.completions.with_raw_response.create).
+            estimated_tokens: Prompt plus completion tokens to reserve.
+
+        Returns:
+            The parsed response (a completion, or a stream for stream=True).
+
+        Raises:
+            openai.RateLimitError: Still rate limited after max_retries retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(estimated_tokens, priority.get())
+            used = 0
+            try:
+                raw = await send()
+                self.update_from_headers(raw.headers)
+                response = await raw.parse()
+                usage = getattr(response, "usage", None)
+                used = usage.total_tokens if usage is not None else estimated_tokens
+                return response
+            except openai.RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self.settle(estimated_tokens, used)
+            await asyncio.sleep(delay)
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter configured from the environment"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(
+            rpm=int(os.getenv("TRANSLATOR_OPENAI_RPM", "500")),
+            tpm=int(os.getenv("TRANSLATOR_OPENAI_TPM", "30000")),
+            max_retries=int(os.getenv("TRANSLATOR_OPENAI_RETRIES", "3")),
+        )
+    return _limiter
@@ -0,0 +1,88 @@
+import asyncio
+import weakref
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    from src.memory import normalize
+except ImportError:  # running from inside src/
+    from memory import normalize
+
+
+def translation_key(text: str, target_language: str) -> Tuple[str, str]:
+    """Requests with equal keys get the same translation (the translation memory's key)"""
+    return normalize(text) or text.strip(), target_language.strip().casefold()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key onto one in-flight call.
+
+    The first caller for a key starts the call as its own task; callers
+    arriving before it finishes wait on that task and get its result or its
+    exception. The task is cancelled only when every caller waiting on it
+    has gone away, so one client disconnecting does not fail the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.stats = {"calls": 0, "collapsed": 0, "in_flight": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Return the result of `fn()`, sharing one call among concurrent callers with `key`.
+
+        Raises:
+            Exception: Whatever the shared call raised, for every caller.
+        """
+        task: Optional[asyncio.Task] = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            self.stats["calls"] += 1
+            self.stats["in_flight"] += 1
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.stats["collapsed"] += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters[key] == 1:
+                # Last one waiting; nobody needs the result any more, and
+                # callers arriving from now on start a fresh call
+                del self._calls[key]
+                del self._waiters[key]
+                task.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        self.stats["in_flight"] -= 1
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+        if not task.cancelled():
+            # Marks the exception retrieved when no caller is left to see it
+            task.exception()
+
+
+_groups = weakref.WeakKeyDictionary()
+
+
+def get_singleflight() -> SingleFlight:
+    """
+    Return the singleflight group for the running event loop.
+
+    Tasks belong to the loop that created them, so one group is kept per
+    loop (one per uvicorn worker in practice).
+    """
+    loop = asyncio.get_running_loop()
+    group = _groups.get(loop)
+    if group is None:
+        group = _groups[loop] = SingleFlight()
+    return group
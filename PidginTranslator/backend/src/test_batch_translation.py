@@ -0,0 +1,96 @@
+import asyncio
+
+try:
+    from src import batch
+    from src.engine import TranslationEngine
+except ImportError:  # running from inside src/
+    import batch
+    from engine import TranslationEngine
+
+
+def make_engine(delay=0.0, fail_over=None, **kwargs):
+    """Engine with fake upstream calls; packs larger than `fail_over` get a misaligned reply"""
+    calls = {"single": 0, "packed": 0, "active": 0, "peak": 0}
+
+    async def translate(text, target_language):
+        calls["single"] += 1
+        return f"{target_language}:{text}"
+
+    async def translate_segments(segments, target_language, max_tokens):
+        calls["packed"] += 1
+        calls["active"] += 1
+        calls["peak"] = max(calls["peak"], calls["active"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            calls["active"] -= 1
+        if fail_over is not None and len(segments) > fail_over:
+            raise ValueError("Reply does not line up with the segments")
+        return [f"{target_language}:{segment}" for segment in segments]
+
+    return TranslationEngine(translate=translate, stream=None, translate_segments=translate_segments, **kwargs), calls
+
+
+def small_packs(monkeypatch, size):
+    pack_segments = batch.pack_segments
+    monkeypatch.setattr(batch, "pack_segments", lambda segments: pack_segments(segments, max_segments=size))
+
+
+def test_pack_segments_respects_budget_and_order():
+    segments = ["a" * 40, "b" * 40, "c" * 40, "d" * 4000, "e"]
+    tokens = [batch.count_tokens(segment) + batch.SEGMENT_OVERHEAD for segment in segments]
+    budget = tokens[0] + tokens[1]
+    assert batch.pack_segments(segments, budget=budget) == [[0, 1], [2], [3], [4]]
+    assert batch.pack_segments(segments, budget=10 ** 6, max_segments=2) == [[0, 1], [2, 3], [4]]
+    assert batch.pack_segments([]) == []
+
+
+def test_reply_budget_scales_with_input_and_is_capped():
+    short = ["How you dey?"]
+    expected = batch.count_tokens(short[0]) * batch.OUTPUT_RATIO + batch.SEGMENT_OVERHEAD + batch.REPLY_OVERHEAD
+    assert batch.reply_budget(short) == expected
+    assert batch.reply_budget(short * 2) > expected
+    assert batch.reply_budget(["word " * 5000]) == batch.BATCH_OUTPUT_TOKENS
+
+
+def test_batch_dedupes_and_splits_misaligned_packs(monkeypatch):
+    small_packs(monkeypatch, 4)
+    engine, calls = make_engine(fail_over=2)
+    texts = ["How you dey?", "", "Wetin dey happen?", "how you DEY", "I wan chop", "Abeg come", "No wahala"]
+
+    results, stats = asyncio.run(batch.translate_batch(engine, texts, ["English"]))
+
+    assert [result["English"] for result in results] == [
+        "English:How you dey?", "", "English:Wetin dey happen?", "English:How you dey?",
+        "English:I wan chop", "English:Abeg come", "English:No wahala",
+    ]
+    # Five distinct texts: a pack of four is split into two pairs, the fifth goes alone
+    assert stats["split_retries"] == 1
+    assert stats["translated"] == 5
+    assert calls["packed"] == 3 and calls["single"] == 1
+
+
+def test_large_batch_waits_for_slots_and_leaves_room_for_interactive_calls(monkeypatch):
+    small_packs(monkeypatch, 2)
+    engine, calls = make_engine(delay=0.02, max_concurrency=2, queue_timeout=0.01, background_concurrency=1)
+    texts = [f"Text {i}" for i in range(12)]
+
+    async def scenario():
+        job = asyncio.create_task(batch.translate_batch(engine, texts, ["English", "French", "Yoruba"]))
+        await asyncio.sleep(0.05)
+        interactive = await engine.translate("How you dey?", "English")
+        return interactive, await job
+
+    interactive, (results, stats) = asyncio.run(scenario())
+    assert interactive == "English:How you dey?"
+    assert all(isinstance(value, str) for result in results for value in result.values())
+    assert stats["calls"] == 18 and calls["peak"] == 1
+    assert engine.stats["rejected"] == 0
+
+
+def test_each_batch_is_limited_by_its_own_concurrency(monkeypatch):
+    small_packs(monkeypatch, 2)
+    engine, calls = make_engine(delay=0.01, max_concurrency=10, background_concurrency=10)
+    texts = [f"Text {i}" for i in range(20)]
+    asyncio.run(batch.translate_batch(engine, texts, ["English", "French"], concurrency=3))
+    assert calls["packed"] == 20 and calls["peak"] == 3
@@ -0,0 +1,41 @@
+import asyncio
+
+try:
+    from src.memory import TranslationMemory, normalize, translate_with_memory
+except ImportError:  # running from inside src/
+    from memory import TranslationMemory, normalize, translate_with_memory
+
+
+def test_normalized_key():
+    assert normalize("How you dey?") == normalize("how  you DEY")
+    assert normalize("Wetin dey happen?") != normalize("Wetin happen?")
+
+
+def test_memory_persists_and_assembles(tmp_path):
+    path = str(tmp_path / "memory.db")
+    calls = []
+
+    async def fake_translate(text, target_language):
+        calls.append(text)
+        return f"<{text}>"
+
+    memory = TranslationMemory(path, lru_size=2)
+    assert asyncio.run(translate_with_memory(memory, "How you dey?", "English", fake_translate)) == "<How you dey?>"
+    assert asyncio.run(translate_with_memory(memory, "how you dey", "english", fake_translate)) == "<How you dey?>"
+    assert calls == ["How you dey?"]
+    memory.close()
+
+    # A new instance (another worker, or after a restart) reads the same store
+    memory = TranslationMemory(path, lru_size=2)
+    asyncio.run(translate_with_memory(memory, "Wetin dey happen?", "English", fake_translate))
+    text = "How you dey? Wetin dey happen? I wan chop."
+    translation = asyncio.run(translate_with_memory(memory, text, "English", fake_translate))
+    assert translation == "<How you dey?> <Wetin dey happen?> <I wan chop.>"
+    assert calls == ["How you dey?", "Wetin dey happen?", "I wan chop."]
+
+    summary = memory.summary()
+    assert summary["assembled"] == 1
+    assert summary["sentence_hits"] == 2 and summary["sentence_misses"] == 1
+    assert summary["hit_rate"] == 0.0
+    assert summary["entries"] == 4
+    memory.close()
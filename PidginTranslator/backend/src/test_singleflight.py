@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+try:
+    from src.singleflight import SingleFlight, translation_key
+except ImportError:  # running from inside src/
+    from singleflight import SingleFlight, translation_key
+
+
+def test_concurrent_calls_share_one_result():
+    group = SingleFlight()
+    calls = []
+
+    async def translate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "How are you?"
+
+    async def burst():
+        keys = [translation_key("How you dey?", "English"), translation_key("how you dey", " english")]
+        return await asyncio.gather(*(group.do(keys[i % 2], translate) for i in range(10)))
+
+    assert asyncio.run(burst()) == ["How are you?"] * 10
+    assert calls == [1]
+    assert group.stats == {"calls": 1, "collapsed": 9, "in_flight": 0}
+
+
+def test_errors_reach_every_caller():
+    group = SingleFlight()
+
+    async def translate():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream failed")
+
+    async def burst():
+        return await asyncio.gather(*(group.do("key", translate) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert [str(result) for result in results] == ["upstream failed"] * 3
+
+
+def test_one_caller_leaving_does_not_cancel_the_others():
+    group = SingleFlight()
+
+    async def translate():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def scenario():
+        first = asyncio.ensure_future(group.do("key", translate))
+        second = asyncio.ensure_future(group.do("key", translate))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
@@ -1,4 +1,4 @@
-from translator import translate_yoruba_to_target
+from translator import translate_pidgin_to_target
 
 def test_translation():
     # Test cases
@@ -14,7 +14,7 @@ def test_translation():
     
     for text in test_texts:
         try:
-            translation = translate_yoruba_to_target(text, target_language)
+            translation = translate_pidgin_to_target(text, target_language)
             print(f"Original: {text}")
             print(f"Translated: {translation}")
             print("-" * 50)
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import httpx
+import openai
+
+try:
+    from src.engine import TranslationEngine
+    from src.rate_limiter import BACKGROUND, INTERACTIVE, RateLimiter, priority
+except ImportError:  # running from inside src/
+    from engine import TranslationEngine
+    from rate_limiter import BACKGROUND, INTERACTIVE, RateLimiter, priority
+
+
+class FakeRaw:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+    async def parse(self):
+        return "completion"
+
+
+def rate_limited(retry_after_ms):
+    response = httpx.Response(
+        429, headers={"retry-after-ms": str(retry_after_ms)}, request=httpx.Request("POST", "https://api.test")
+    )
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_interactive_calls_are_admitted_before_waiting_background_calls():
+    # 600 requests per minute: one every 0.1s once the bucket is empty
+    limiter = RateLimiter(rpm=600)
+    limiter.requests.tokens = 0
+    admitted = []
+
+    async def caller(name, level, delay):
+        await asyncio.sleep(delay)
+        await limiter.acquire(10, level)
+        admitted.append(name)
+
+    async def scenario():
+        await asyncio.gather(
+            caller("background", BACKGROUND, 0),
+            caller("interactive", INTERACTIVE, 0.02),
+        )
+
+    asyncio.run(scenario())
+    assert admitted == ["interactive", "background"]
+
+
+def test_rate_limited_call_backs_off_for_every_caller_and_retries():
+    limiter = RateLimiter(max_retries=2, base_delay=0.01)
+    attempts = []
+
+    async def send():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise rate_limited(100)
+        return FakeRaw({"x-ratelimit-limit-requests": "1000", "x-ratelimit-remaining-requests": "999"})
+
+    assert asyncio.run(limiter.call(send, 100)) == "completion"
+    assert len(attempts) == 2 and attempts[1] - attempts[0] >= 0.1
+    assert limiter.stats["rate_limited"] == 1
+    assert limiter.requests.capacity == 1000
+    # The rate-limited attempt is refunded; the answer without usage stays charged at the estimate
+    assert limiter.tokens.tokens > limiter.tokens.capacity - 100 - 1
+
+
+def test_engine_background_work_runs_at_background_priority():
+    seen = []
+
+    async def translate(text, target_language):
+        seen.append(priority.get())
+        return text
+
+    engine = TranslationEngine(translate=translate, stream=None, translate_segments=None)
+
+    async def scenario():
+        await engine.translate("a", "English")
+        await engine.translate("b", "English", background=True)
+        await engine.translate("c", "English")
+
+    asyncio.run(scenario())
+    assert seen == [INTERACTIVE, BACKGROUND, INTERACTIVE]
@@ -1,12 +1,83 @@
+import json
+from typing import AsyncIterator, List
+
 import openai
 from dotenv import load_dotenv
 
+try:
+    from src.clients import get_async_openai_client, get_openai_client
+    from src.rate_limiter import estimate_tokens, get_rate_limiter
+except ImportError:  # running from inside src/, e.g. the CLI or test_translator.py
+    from clients import get_async_openai_client, get_openai_client
+    from rate_limiter import estimate_tokens, get_rate_limiter
+
 # ANSI escape codes for colors
 NEON_GREEN = "\033[92m"
 RED = "\033[91m"
 RESET = "\033[0m"
 BOLD = "\033[1m"
 
+MODEL = "gpt-4o"
+TEMPERATURE = 0.3
+MAX_TOKENS = 500
+
+def build_messages(text: str, target_language: str) -> list:
+    """
+    Build the chat messages for one translation, shared by the sync and async paths.
+
+    Args:
+        text: The Pidgin English text to translate.
+        target_language: The target language for translation.
+
+    Returns:
+        list: The system and user messages.
+    """
+    return [
+        {
+            "role": "system",
+            "content": "You are a professional translator specializing in translating Pidgin English to other languages. Provide accurate and natural-sounding translations while preserving the original meaning and context."
+        },
+        {
+            "role": "user",
+            "content": f"Translate the following text to {target_language}. Maintain the tone and context:\n\n{text}"
+        }
+    ]
+
+# Structured output for batch calls: one translation per input segment, in order
+SEGMENTS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "translations",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"translations": {"type": "array", "items": {"type": "string"}}},
+            "required": ["translations"],
+            "additionalProperties": False
+        }
+    }
+}
+
+def build_segment_messages(segments: List[str], target_language: str) -> list:
+    """
+    Build the chat messages for translating several segments in one call.
+
+    Args:
+        segments: The Pidgin English segments to translate.
+        target_language: The target language for translation.
+
+    Returns:
+        list: The system and user messages.
+    """
+    messages = build_messages("", target_language)
+    messages[1]["content"] = (
+        f"Translate each Pidgin English segment in the JSON array below to {target_language}. "
+        "Maintain the tone and context of each segment, and translate each one on its own. "
+        "Answer with exactly one translation per segment, in the same order.\n\n"
+        + json.dumps(segments, ensure_ascii=False)
+    )
+    return messages
+
 def translate_pidgin_to_target(text: str, target_language: str) -> str:
     """
     Translate Pidgin English text to the specified target language using OpenAI's GPT-4 model.
@@ -19,20 +90,11 @@ def translate_pidgin_to_target(text: str, target_language: str) -> str:
         str: The translated text or error message.
     """
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional translator specializing in translating Pidgin English to other languages. Provide accurate and natural-sounding translations while preserving the original meaning and context."
-                },
-                {
-                    "role": "user",
-                    "content": f"Translate the following text to {target_language}. Maintain the tone and context:\n\n{text}"
-                }
-            ],
-            temperature=0.3,
-            max_tokens=500
+        response = get_openai_client().chat.completions.create(
+            model=MODEL,
+            messages=build_messages(text, target_language),
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS
         )
         
         return response.choices[0].message.content.strip()
@@ -42,6 +104,98 @@ def translate_pidgin_to_target(text: str, target_language: str) -> str:
     except Exception as e:
         return f"An unexpected error occurred: {str(e)}"
 
+async def create_completion(messages: list, max_tokens: int, **kwargs):
+    """
+    Create a chat completion on the loop's AsyncOpenAI client, admitted by the
+    shared rate limiter at the priority of the calling context.
+
+    Args:
+        messages: The chat messages.
+        max_tokens: Completion token limit.
+        **kwargs: Further create() arguments, e.g. stream or response_format.
+
+    Returns:
+        The completion, or the stream when stream=True.
+    """
+    client = get_async_openai_client()
+    return await get_rate_limiter().call(
+        lambda: client.chat.completions.with_raw_response.create(
+            model=MODEL,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=max_tokens,
+            **kwargs
+        ),
+        estimate_tokens(messages, max_tokens)
+    )
+
+async def translate_pidgin_to_target_async(text: str, target_language: str) -> str:
+    """
+    Translate without blocking the event loop, using the loop's AsyncOpenAI client.
+
+    Unlike translate_pidgin_to_target, errors are raised rather than returned
+    as text, so the API can map them to status codes.
+
+    Args:
+        text: The Pidgin English text to translate.
+        target_language: The target language for translation.
+
+    Returns:
+        str: The translated text.
+    """
+    response = await create_completion(build_messages(text, target_language), MAX_TOKENS)
+    return response.choices[0].message.content.strip()
+
+async def translate_segments_async(segments: List[str], target_language: str, max_tokens: int) -> List[str]:
+    """
+    Translate several segments with one structured-output completion.
+
+    Args:
+        segments: The Pidgin English segments to translate.
+        target_language: The target language for translation.
+        max_tokens: Completion budget for all translations together.
+
+    Returns:
+        List[str]: One translation per segment, in input order.
+
+    Raises:
+        ValueError: The reply was cut off, empty or did not hold one translation per segment.
+    """
+    response = await create_completion(
+        build_segment_messages(segments, target_language),
+        max_tokens,
+        response_format=SEGMENTS_RESPONSE_FORMAT
+    )
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        raise ValueError("Batch translation was cut off by the token limit")
+    if not choice.message.content:
+        raise ValueError("Batch translation came back empty")
+    translations = json.loads(choice.message.content)["translations"]
+    if len(translations) != len(segments):
+        raise ValueError(f"Expected {len(segments)} translations, got {len(translations)}")
+    return [translation.strip() for translation in translations]
+
+async def stream_pidgin_to_target(text: str, target_language: str) -> AsyncIterator[str]:
+    """
+    Stream a translation as the model produces it.
+
+    Args:
+        text: The Pidgin English text to translate.
+        target_language: The target language for translation.
+
+    Yields:
+        str: Pieces of the translated text, in order.
+    """
+    stream = await create_completion(build_messages(text, target_language), MAX_TOKENS, stream=True)
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        # Closes the upstream connection when the caller stops early
+        await stream.close()
+
 def main():
     # Simple command-line interface
     print(f"{BOLD}Pidgin Translator{RESET}")
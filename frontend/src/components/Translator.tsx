@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import {
     Box,
     Button,
@@ -12,7 +12,7 @@ import {
     useToast,
     Flex,
     } from "@chakra-ui/react";
-import { translateText } from '../services/api';
+import { translateTextStream } from '../services/api';
 
 // Move interfaces to types file
 interface TranslationRequest {
@@ -51,8 +51,18 @@ export const Translator: React.FC = () => {
   const [targetLanguage, setTargetLanguage] = useState<Language>('English');
   const [translations, setTranslations] = useState<Translation[]>([]);
   const [isLoading, setIsLoading] = useState(false);
+  // The translation currently arriving from the stream, shown as it grows
+  const [pending, setPending] = useState<Translation | null>(null);
+  const abortRef = useRef<AbortController | null>(null);
   const toast = useToast();
 
+  // Stop any stream still running when the component goes away
+  useEffect(() => () => abortRef.current?.abort(), []);
+
+  const handleStop = () => {
+    abortRef.current?.abort();
+  };
+
   const handleTranslate = async () => {
     if (!text.trim()) {
       toast({
@@ -65,12 +75,19 @@ export const Translator: React.FC = () => {
       return;
     }
 
+    const controller = new AbortController();
+    abortRef.current = controller;
     setIsLoading(true);
+    setPending({ original: text, translated: '', targetLanguage, timestamp: new Date() });
     try {
-      const response = await translateText({
-        text,
-        target_language: targetLanguage,
-      });
+      const response = await translateTextStream(
+        {
+          text,
+          target_language: targetLanguage,
+        },
+        (delta) => setPending(prev => prev && { ...prev, translated: prev.translated + delta }),
+        controller.signal,
+      );
 
       const newTranslation: Translation = {
         original: text,
@@ -82,6 +99,9 @@ export const Translator: React.FC = () => {
       setTranslations(prev => [newTranslation, ...prev]);
       setText('');
     } catch (error) {
+      if (controller.signal.aborted) {
+        return;
+      }
       toast({
         title: 'Translation Error',
         description: error instanceof Error ? error.message : 'Failed to translate text',
@@ -90,6 +110,8 @@ export const Translator: React.FC = () => {
         isClosable: true,
       });
     } finally {
+      abortRef.current = null;
+      setPending(null);
       setIsLoading(false);
     }
   };
@@ -136,17 +158,42 @@ export const Translator: React.FC = () => {
           </FormControl>
         </Flex>
 
-        <Button
-          colorScheme="blue"
-          onClick={handleTranslate}
-          isLoading={isLoading}
-          size="lg"
-          width="full"
-        >
-          Translate
-        </Button>
+        <Flex width="full" gap={4}>
+          <Button
+            colorScheme="blue"
+            onClick={handleTranslate}
+            isLoading={isLoading && !pending?.translated}
+            isDisabled={isLoading}
+            size="lg"
+            flex={1}
+          >
+            Translate
+          </Button>
+          {isLoading && (
+            <Button onClick={handleStop} size="lg" variant="outline">
+              Stop
+            </Button>
+          )}
+        </Flex>
 
         <VStack spacing={4} width="full" align="stretch">
+          {pending && (
+            <Box
+              p={4}
+              bg="white"
+              shadow="md"
+              borderRadius="lg"
+              borderWidth="1px"
+              borderColor="blue.200"
+            >
+              <Text fontWeight="bold">
+                Original (Pidgin English): {pending.original}
+              </Text>
+              <Text mt={2}>
+                Translated ({pending.targetLanguage}): {pending.translated || '…'}
+              </Text>
+            </Box>
+          )}
           {translations.map((item, index) => (
             <Box
               key={index}
@@ -1,9 +1,89 @@
 import axios from 'axios';
-import { TranslationRequest, TranslationResponse } from '../types/translation';
+import { TranslationRequest, TranslationResponse, TranslationStreamEvent } from '../types/translation';
 
 const API_URL = 'http://localhost:8000';
 
 export const translateText = async (request: TranslationRequest): Promise<TranslationResponse> => {
   const response = await axios.post<TranslationResponse>(`${API_URL}/translate`, request);
   return response.data;
-};
\ No newline at end of file
+};
+
+const parseEvent = (block: string): TranslationStreamEvent | null => {
+  let name = 'message';
+  const data: string[] = [];
+  for (const line of block.split('\n')) {
+    if (line.startsWith('event:')) {
+      name = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      data.push(line.slice(5).trimStart());
+    }
+  }
+  if (!data.length) {
+    return null;
+  }
+  const payload = JSON.parse(data.join('\n'));
+  if (name === 'done') {
+    return { type: 'done', translation: payload.translation };
+  }
+  if (name === 'error') {
+    return { type: 'error', status: payload.status, detail: payload.detail };
+  }
+  return { type: 'delta', delta: payload.delta ?? '' };
+};
+
+/**
+ * Streams a translation from POST /translate/stream (Server-Sent Events),
+ * calling `onDelta` with each piece as it arrives. Resolves with the full
+ * translation; rejects with an AbortError when `signal` is aborted.
+ */
+export const translateTextStream = async (
+  request: TranslationRequest,
+  onDelta: (delta: string) => void,
+  signal?: AbortSignal,
+): Promise<TranslationResponse> => {
+  const response = await fetch(`${API_URL}/translate/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(request),
+    signal,
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Translation failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let finished = false;
+  try {
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        finished = true;
+        break;
+      }
+      // Normalised on the whole buffer so a CRLF split across chunks is still caught
+      buffer = (buffer + decoder.decode(value, { stream: true })).replace(/\r\n/g, '\n');
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const event = parseEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+        if (event?.type === 'delta') {
+          onDelta(event.delta);
+        } else if (event?.type === 'done') {
+          return { translation: event.translation };
+        } else if (event?.type === 'error') {
+          throw new Error(event.detail);
+        }
+      }
+    }
+  } finally {
+    if (!finished) {
+      // Returning or throwing mid-stream: close the connection instead of leaving it open
+      await reader.cancel().catch(() => undefined);
+    }
+    reader.releaseLock();
+  }
+  throw new Error('Translation stream ended unexpectedly');
+};
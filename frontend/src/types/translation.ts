@@ -5,4 +5,10 @@ export interface TranslationRequest {
 
 export interface TranslationResponse {
   translation: string;
-} 
\ No newline at end of file
+}
+
+// Events sent by POST /translate/stream
+export type TranslationStreamEvent =
+  | { type: 'delta'; delta: string }
+  | { type: 'done'; translation: string }
+  | { type: 'error'; status: number; detail: string };